@@ -0,0 +1,277 @@
+"""
+Bulk fertilizer advisory generation.
+Produces recommendations for many fields at once (whole e-panta datasets),
+grouping inputs by location/crop/stage so soil and weather lookups are shared,
+and persisting results with bulk inserts.
+"""
+
+import argparse
+import json
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from database import (
+    SessionLocal, Field, Recommendation, FarmerRecord, init_db, recommendation_summary
+)
+from reference_catalog import resolve_crop_name
+from write_behind import ID_ALLOCATOR
+from rules_engine import (
+    calculate_fertilizer_recommendation, get_crop_stage_for_crop,
+    get_soil_parameters, get_weather_context, WEATHER_UNAVAILABLE_NOTE
+)
+
+# Rows written per transaction when persisting
+INSERT_CHUNK_SIZE = 5000
+
+
+def iter_field_inputs_from_records(
+    db: Session,
+    district: str = None,
+    mandal: str = None,
+    village: str = None,
+    crop_name: str = None
+) -> Iterator[Dict[str, Any]]:
+    """Yield field inputs from e-panta farmer records matching a filter, in id order"""
+    query = db.query(
+        FarmerRecord.id, FarmerRecord.district, FarmerRecord.mandal, FarmerRecord.village,
+        FarmerRecord.crop_name, FarmerRecord.variety,
+        FarmerRecord.area_sown, FarmerRecord.date_of_sowing
+    )
+    if district:
+        query = query.filter(FarmerRecord.district == district)
+    if mandal:
+        query = query.filter(FarmerRecord.mandal == mandal)
+    if village:
+        query = query.filter(FarmerRecord.village == village)
+    if crop_name:
+        query = query.filter(FarmerRecord.crop_name == crop_name)
+
+    for record_id, rec_district, rec_mandal, rec_village, crop, variety, area, sowing in \
+            query.order_by(FarmerRecord.id).yield_per(1000):
+        yield {
+            "record_id": record_id,
+            "crop_name": resolve_crop_name(crop),
+            "variety": variety,
+            "sowing_date": sowing,
+            "district": rec_district,
+            "mandal": rec_mandal,
+            "village": rec_village,
+            "area_sown": area
+        }
+
+
+def field_inputs_from_records(
+    db: Session,
+    district: str = None,
+    mandal: str = None,
+    village: str = None,
+    crop_name: str = None
+) -> List[Dict[str, Any]]:
+    """Build field inputs from e-panta farmer records matching a filter"""
+    return list(iter_field_inputs_from_records(db, district, mandal, village, crop_name))
+
+
+def _parse_sowing_date(value: Any) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    return datetime.strptime(value, "%Y-%m-%d")
+
+
+def group_field_inputs(
+    items: Iterable[Dict[str, Any]],
+    current_date: datetime = None
+) -> Tuple[Dict[Tuple, List[Tuple[int, Dict]]], List[Dict]]:
+    """
+    Validate field inputs and group them by (district, mandal, crop, stage).
+
+    Returns:
+        Tuple of (groups, errors). Each group holds (index, item) pairs with the
+        sowing date parsed; errors describe rejected inputs by index.
+    """
+    if current_date is None:
+        current_date = datetime.now()
+
+    groups = defaultdict(list)
+    errors = []
+    for index, item in enumerate(items):
+        if not item.get("crop_name") or not item.get("district") or not item.get("mandal"):
+            errors.append({"index": index, "detail": "Missing crop, district or mandal"})
+            continue
+        if not item.get("area_sown") or item["area_sown"] <= 0:
+            errors.append({"index": index, "detail": "Area sown must be greater than 0"})
+            continue
+        try:
+            sowing_date = _parse_sowing_date(item.get("sowing_date"))
+        except (TypeError, ValueError):
+            errors.append({"index": index, "detail": "Invalid date format. Use YYYY-MM-DD"})
+            continue
+
+        stage = get_crop_stage_for_crop(item["crop_name"], sowing_date, current_date)["stage"]
+        key = (item["district"], item["mandal"], item["crop_name"], stage)
+        groups[key].append((index, dict(item, sowing_date=sowing_date)))
+
+    return groups, errors
+
+
+def generate_bulk_recommendations(
+    items: Iterable[Dict[str, Any]],
+    db: Session,
+    include_weather: bool = True,
+    persist: bool = True,
+    farmer_id: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Calculate fertilizer recommendations for many fields.
+
+    Args:
+        items: Field inputs with crop_name, variety, sowing_date, district, mandal, area_sown
+        db: Database session
+        include_weather: Whether to attach weather data to each recommendation
+        persist: Whether to store Field and Recommendation rows
+        farmer_id: Farmer to attribute persisted rows to (optional)
+
+    Returns:
+        Dictionary with recommendations (in input order), errors and counters
+    """
+    groups, errors = group_field_inputs(items)
+
+    soil_by_location = {}
+    weather_by_location = {}
+    # Per-acre results for this batch only, so a large batch does not evict
+    # the live entries of the shared recommendation cache
+    cores = {}
+    results = []
+
+    for (district, mandal, crop_name, stage), members in groups.items():
+        location = (district, mandal)
+        if include_weather and location not in weather_by_location:
+            try:
+                weather_by_location[location] = get_weather_context(district, mandal)
+            except Exception as e:
+                print(f"Error getting weather data for {mandal}, {district}: {e}")
+                weather_by_location[location] = None
+
+        weather_context = weather_by_location.get(location)
+        for index, item in members:
+            soil_location = (district, mandal, item.get("village"), item.get("survey_number"))
+            if soil_location not in soil_by_location:
+                soil_by_location[soil_location] = get_soil_parameters(db, *soil_location)
+            recommendation = calculate_fertilizer_recommendation(
+                crop_name=crop_name,
+                sowing_date=item["sowing_date"],
+                district=district,
+                mandal=mandal,
+                area_sown=item["area_sown"],
+                db=db,
+                variety=item.get("variety"),
+                include_weather=include_weather and weather_context is not None,
+                soil_params=soil_by_location[soil_location],
+                weather_context=weather_context,
+                core_cache=cores
+            )
+            if include_weather and weather_context is None:
+                # Same note as a single recommendation whose weather lookup failed
+                recommendation["notes"].insert(0, WEATHER_UNAVAILABLE_NOTE)
+            results.append((index, item, recommendation))
+
+    results.sort(key=lambda result: result[0])
+
+    persisted = 0
+    if persist and results:
+        persisted = persist_recommendations(db, [(item, rec) for _, item, rec in results], farmer_id)
+
+    return {
+        "total": len(results) + len(errors),
+        "generated": len(results),
+        "persisted": persisted,
+        "groups": len(groups),
+        "errors": errors,
+        "recommendations": [rec for _, _, rec in results]
+    }
+
+
+def persist_recommendations(
+    db: Session,
+    results: List[Tuple[Dict[str, Any], Dict[str, Any]]],
+    farmer_id: Optional[int] = None
+) -> int:
+    """Store (field input, recommendation) pairs using chunked bulk inserts"""
+    for start in range(0, len(results), INSERT_CHUNK_SIZE):
+        chunk = results[start:start + INSERT_CHUNK_SIZE]
+        now = datetime.utcnow()
+        # Ids come from the shared allocator so they never collide with queued API writes
+        first_field_id = ID_ALLOCATOR.allocate(Field, len(chunk))
+        first_recommendation_id = ID_ALLOCATOR.allocate(Recommendation, len(chunk))
+        field_ids = range(first_field_id, first_field_id + len(chunk))
+
+        db.execute(insert(Field), [
+            {
+                "id": field_id,
+                "farmer_id": farmer_id,
+                "location": f"{item['mandal']}, {item['district']}",
+                "crop_type": item["crop_name"],
+                "variety": item.get("variety"),
+                "sowing_date": item["sowing_date"],
+                "area_sown": item["area_sown"],
+                "source_record_id": item.get("record_id"),
+                "created_at": now
+            }
+            for field_id, (item, _) in zip(field_ids, chunk)
+        ])
+
+        db.execute(insert(Recommendation), [
+            {
+                "id": first_recommendation_id + offset,
+                "farmer_id": farmer_id,
+                "field_id": field_id,
+                "recommendation_json": json.dumps(rec, ensure_ascii=False),
+                "created_at": now,
+                **recommendation_summary(rec)
+            }
+            for offset, (field_id, (_, rec)) in enumerate(zip(field_ids, chunk))
+        ])
+        db.commit()
+
+    return len(results)
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Generate fertilizer advisories for e-panta farmer records")
+    parser.add_argument("--district", help="Only records from this district")
+    parser.add_argument("--mandal", help="Only records from this mandal")
+    parser.add_argument("--village", help="Only records from this village")
+    parser.add_argument("--crop", help="Only records for this crop name")
+    parser.add_argument("--no-weather", action="store_true", help="Skip weather lookups")
+    parser.add_argument("--no-persist", action="store_true", help="Do not store results in the database")
+    parser.add_argument("--output", help="Write recommendations to this JSON file")
+    args = parser.parse_args(argv)
+
+    init_db()
+    db = SessionLocal()
+    try:
+        started = datetime.now()
+        items = field_inputs_from_records(db, args.district, args.mandal, args.village, args.crop)
+        summary = generate_bulk_recommendations(
+            items, db,
+            include_weather=not args.no_weather,
+            persist=not args.no_persist
+        )
+        elapsed = (datetime.now() - started).total_seconds()
+
+        print(f"Generated {summary['generated']} recommendations in {summary['groups']} groups "
+              f"({summary['persisted']} persisted, {len(summary['errors'])} skipped) in {elapsed:.2f}s")
+
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(summary, f, ensure_ascii=False, indent=2)
+            print(f"Wrote {args.output}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
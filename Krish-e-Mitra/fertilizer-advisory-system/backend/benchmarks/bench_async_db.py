@@ -0,0 +1,104 @@
+"""
+Requests/sec for DB-bound endpoints with the old blocking session versus the
+async session, under concurrent load.
+
+Runs against a throwaway copy of the database. --db-latency adds a sleep to
+every statement to model a slower disk or a busy database:
+
+    python -m benchmarks.bench_async_db --requests 1000 --concurrency 10 --db-latency 0.002
+
+Keep --concurrency at or below the sync pool size (15): above it the blocking
+variant stalls the event loop while waiting for a pooled connection.
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+
+# Point both engines at a copy before the app modules are imported
+_tmp_dir = tempfile.mkdtemp()
+_db_path = os.path.join(_tmp_dir, "bench.db")
+shutil.copy(os.path.join(os.path.dirname(__file__), "..", "fertilizer_advisory.db"), _db_path)
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_path}"
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from database import get_db, engine, async_engine, Farmer, FarmerRecord
+from main import app as async_app
+
+
+def build_blocking_app() -> FastAPI:
+    """The pre-async handlers: synchronous Session used inside async def"""
+    blocking_app = FastAPI()
+
+    @blocking_app.get("/api/mandals")
+    async def get_mandals(district: str = None, db: Session = Depends(get_db)):
+        query = db.query(FarmerRecord.mandal).distinct()
+        if district:
+            query = query.filter(FarmerRecord.district == district)
+        return [{"name": m[0]} for m in query.all() if m[0]]
+
+    @blocking_app.post("/api/login")
+    async def login(body: dict, db: Session = Depends(get_db)):
+        farmer = db.query(Farmer).filter(Farmer.mobile == body["mobile"]).first()
+        return {"success": farmer is not None}
+
+    return blocking_app
+
+
+async def run_load(app: FastAPI, total: int, concurrency: int, mobile: str) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(i: int):
+            async with semaphore:
+                if i % 2:
+                    await client.get("/api/mandals", params={"district": "NTR"})
+                else:
+                    await client.post("/api/login", json={"mobile": mobile, "otp": "123456"})
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        return total / (time.perf_counter() - started)
+
+
+def add_statement_latency(seconds: float):
+    """Sleep inside sqlite3 itself, i.e. on whichever thread runs the statement"""
+    def on_connect(dbapi_connection, _record):
+        raw = getattr(dbapi_connection, "driver_connection", dbapi_connection)
+        raw = getattr(raw, "_conn", raw)  # aiosqlite wraps a sqlite3 connection
+        raw.set_trace_callback(lambda _statement: time.sleep(seconds))
+
+    for sync_engine in (engine, async_engine.sync_engine):
+        event.listen(sync_engine, "connect", on_connect)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--db-latency", type=float, default=0.0, help="Seconds added to each statement")
+    args = parser.parse_args()
+
+    if args.db_latency:
+        add_statement_latency(args.db_latency)
+
+    mobile = "9999999999"
+    print(f"{args.requests} requests, concurrency {args.concurrency}, "
+          f"{args.db_latency * 1000:.1f} ms added per statement")
+    for label, app in (("blocking Session", build_blocking_app()), ("AsyncSession", async_app)):
+        rps = asyncio.run(run_load(app, args.requests, args.concurrency, mobile))
+        print(f"{label:<20} {rps:10.1f} req/s")
+
+    shutil.rmtree(_tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
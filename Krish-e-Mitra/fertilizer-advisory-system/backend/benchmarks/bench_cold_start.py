@@ -0,0 +1,67 @@
+"""
+Cold start: time to import the app and time until the first request is
+answered, each in a fresh interpreter.
+
+"empty" starts from an empty database file (a new container with no volume);
+"existing" restarts against the database the empty run left behind.
+
+    python -m benchmarks.bench_cold_start --runs 3
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+CHILD = """
+import json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    client.get("/api/crops").raise_for_status()
+    first_response = time.perf_counter()
+print("BENCH " + json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "first_request_ms": (first_response - started) * 1000,
+    "pandas_loaded": "pandas" in __import__("sys").modules
+}))
+"""
+
+
+def run_child(database_url: str) -> dict:
+    env = dict(os.environ, DATABASE_URL=database_url)
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=BACKEND_DIR, env=env,
+        capture_output=True, text=True, check=True
+    ).stdout
+    line = next(line for line in output.splitlines() if line.startswith("BENCH "))
+    return json.loads(line[len("BENCH "):])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    results = {"empty": [], "existing": []}
+    for _ in range(args.runs):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            database_url = f"sqlite:///{os.path.join(tmp_dir, 'cold.db')}"
+            results["empty"].append(run_child(database_url))
+            results["existing"].append(run_child(database_url))
+
+    for name, runs in results.items():
+        print(f"{name:9s} import {statistics.median(r['import_ms'] for r in runs):7.0f} ms  "
+              f"first request {statistics.median(r['first_request_ms'] for r in runs):7.0f} ms  "
+              f"pandas imported: {runs[0]['pandas_loaded']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Stage lookup and fertilizer dose resolution: walking the raw crop_data.json
+dicts versus the compiled crop model, over every crop and day offset.
+
+    python -m benchmarks.bench_crop_model --repeat 20
+"""
+
+import argparse
+import time
+
+from crop_model import find_stage, stage_doses
+from knowledge_base import get_knowledge_base
+from rules_engine import DEFAULT_SOIL_PARAMS
+
+CROP_DATA = get_knowledge_base().crop_data
+CROP_MODEL = get_knowledge_base().model
+
+DAY_OFFSETS = range(-10, 200)
+
+
+def legacy_stage(crop_name: str, days: int, soil_params: dict) -> str:
+    for stage_name, stage_info in CROP_DATA['crops'][crop_name]['growth_stages'].items():
+        if stage_info['days'][0] <= days <= stage_info['days'][1]:
+            return stage_name
+    return "ripening"
+
+
+def compiled_stage(crop_name: str, days: int, soil_params: dict) -> str:
+    stage = find_stage(CROP_MODEL.crops[crop_name], days)
+    return stage.name if stage is not None else "ripening"
+
+
+def legacy_lookup(crop_name: str, days: int, soil_params: dict) -> list:
+    """The pre-compilation code path: nested dict walk plus per-call dose math"""
+    crop_info = CROP_DATA['crops'][crop_name]
+    stage = "ripening"
+    for stage_name, stage_info in crop_info['growth_stages'].items():
+        if stage_info['days'][0] <= days <= stage_info['days'][1]:
+            stage = stage_name
+            break
+
+    nutrient_req = crop_info['nutrient_requirements'].get(stage, {"N": 40, "P": 20, "K": 20})
+    thresholds = CROP_DATA['soil_thresholds']
+    fertilizers = []
+    for nutrient, name in (("N", "Urea"), ("P", "DAP"), ("K", "MOP")):
+        if soil_params[nutrient] < thresholds[nutrient]['medium']:
+            amount = (nutrient_req[nutrient] * 100) / CROP_DATA['fertilizer_types'][name]['percentage']
+            fertilizers.append((name, amount, amount * CROP_DATA['fertilizer_types'][name]['price_per_kg']))
+    return fertilizers
+
+
+def compiled_lookup(crop_name: str, days: int, soil_params: dict) -> list:
+    crop = CROP_MODEL.crops[crop_name]
+    stage = find_stage(crop, days)
+    thresholds = CROP_MODEL.thresholds
+    return [
+        (dose.fertilizer.name, dose.amount_per_acre, dose.cost_per_acre)
+        for dose in stage_doses(CROP_MODEL, crop, stage.name if stage else "ripening")
+        if soil_params[dose.nutrient] < thresholds[dose.nutrient]
+    ]
+
+
+def measure(lookup, repeat: int) -> float:
+    soil = dict(DEFAULT_SOIL_PARAMS)
+    crops = list(CROP_MODEL.crops)
+    calls = repeat * len(crops) * len(DAY_OFFSETS)
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for crop_name in crops:
+            for days in DAY_OFFSETS:
+                lookup(crop_name, days, soil)
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    soil = dict(DEFAULT_SOIL_PARAMS)
+    for crop_name in CROP_MODEL.crops:
+        for days in DAY_OFFSETS:
+            assert legacy_stage(crop_name, days, soil) == compiled_stage(crop_name, days, soil)
+            assert legacy_lookup(crop_name, days, soil) == compiled_lookup(crop_name, days, soil)
+
+    for name, legacy, compiled in (
+        ("stage lookup", legacy_stage, compiled_stage),
+        ("stage + doses", legacy_lookup, compiled_lookup)
+    ):
+        print(f"{name:14s} raw dicts {measure(legacy, args.repeat):6.2f} us   "
+              f"compiled {measure(compiled, args.repeat):6.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Weekly fertilizer demand for a synthetic season: a full build of the demand
+calendar over N farmer records, then an incremental refresh after new rows
+arrive. Totals are checked against summing the one-field recommendation
+schedules. Runs against a throwaway copy of the database:
+
+    python -m benchmarks.bench_demand_calendar --fields 1000000 --new-fields 10000
+"""
+
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+# Point the engines at a copy before the app modules are imported
+_tmp_dir = tempfile.mkdtemp()
+_db_path = os.path.join(_tmp_dir, "bench.db")
+shutil.copy(os.path.join(os.path.dirname(__file__), "..", "fertilizer_advisory.db"), _db_path)
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_path}"
+
+from sqlalchemy import delete, insert
+
+from data_loader import initialize_database
+from database import SessionLocal, FarmerRecord, Field, init_db
+from demand_calendar import aggregate_fields, build_demand_calendar, week_start
+from rules_engine import calculate_fertilizer_recommendation, get_soil_parameters
+from knowledge_base import get_knowledge_base
+
+
+def insert_records(db, count: int, seed: int) -> None:
+    """Synthetic records: real locations and crops with spread-out sowing dates"""
+    rng = random.Random(seed)
+    templates = db.query(
+        FarmerRecord.district, FarmerRecord.mandal, FarmerRecord.village, FarmerRecord.crop_name
+    ).all()
+    season_start = datetime(date.today().year, 6, 1)
+    for start in range(0, count, 100_000):
+        rows = []
+        for _ in range(min(100_000, count - start)):
+            district, mandal, village, crop_name = rng.choice(templates)
+            rows.append({
+                "district": district,
+                "mandal": mandal,
+                "village": village,
+                "crop_name": crop_name,
+                "area_sown": round(rng.uniform(0.25, 10), 2),
+                "date_of_sowing": season_start + timedelta(days=rng.randrange(0, 120))
+            })
+        db.execute(insert(FarmerRecord), rows)
+    db.commit()
+
+
+def check_against_schedules(db, sample: int) -> None:
+    """Bucket totals for a sample equal the summed per-field schedules"""
+    kb = get_knowledge_base()
+    today = date.today()
+    rows = [
+        row for row in db.query(
+            FarmerRecord.district, FarmerRecord.mandal, FarmerRecord.village, FarmerRecord.crop_name,
+            FarmerRecord.area_sown, FarmerRecord.date_of_sowing
+        ).limit(sample)
+        if all(row[:2]) and row[3] and row[4] and row[5]
+    ]
+    expected = defaultdict(float)
+    tolerance = defaultdict(float)
+    for district, mandal, village, crop_name, area, sowing in rows:
+        recommendation = calculate_fertilizer_recommendation(
+            crop_name, sowing, district, mandal, area, db=None, include_weather=False,
+            soil_params=get_soil_parameters(None, district, mandal, village)
+        )
+        for stage in recommendation["stage_schedule"]["stages"]:
+            week = date.fromordinal(int(week_start(date.fromisoformat(stage["application_date"]).toordinal())))
+            for fert in stage["fertilizers"]:
+                expected[(district, mandal, week, fert["name"])] += fert["amount_kg"]
+                # Schedules round the per-acre amount, then the scaled amount, to 0.01 kg
+                tolerance[(district, mandal, week, fert["name"])] += 0.005 * (area + 1)
+
+    totals = aggregate_fields(kb, rows, today)
+    assert set(expected) == set(totals)
+    for bucket, kg in expected.items():
+        assert abs(totals[bucket] - kg) <= tolerance[bucket] + 1e-6, bucket
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fields", type=int, default=1_000_000)
+    parser.add_argument("--new-fields", type=int, default=10_000)
+    parser.add_argument("--check-sample", type=int, default=2000)
+    args = parser.parse_args()
+
+    init_db()
+    initialize_database()
+    db = SessionLocal()
+    try:
+        db.execute(delete(Field))
+        insert_records(db, args.fields, seed=1)
+        check_against_schedules(db, args.check_sample)
+
+        started = time.perf_counter()
+        calendar = build_demand_calendar(db)
+        full = time.perf_counter() - started
+        print(f"full build:  {calendar.fields} fields -> {len(calendar.totals)} buckets in {full:.2f}s")
+
+        insert_records(db, args.new_fields, seed=2)
+        started = time.perf_counter()
+        updated = build_demand_calendar(db, base=calendar)
+        incremental = time.perf_counter() - started
+        print(f"incremental: +{updated.fields - calendar.fields} fields in {incremental:.2f}s")
+
+        rebuilt = build_demand_calendar(db)
+        assert rebuilt.totals.keys() == updated.totals.keys()
+        assert all(abs(rebuilt.totals[k] - v) < 1e-6 * max(1.0, v) for k, v in updated.totals.items())
+    finally:
+        db.close()
+        shutil.rmtree(_tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
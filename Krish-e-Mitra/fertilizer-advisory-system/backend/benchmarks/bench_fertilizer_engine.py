@@ -0,0 +1,82 @@
+"""
+Fertilizer amounts for many fields: the vectorized engine versus the
+per-field rules engine path (stage lookup + doses, one field at a time).
+
+    python -m benchmarks.bench_fertilizer_engine --fields 1000000 --scalar-fields 20000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from crop_model import find_stage
+from fertilizer_engine import compute_batch, fertilizer_set, field_doses
+from knowledge_base import get_knowledge_base
+
+CROP_MODEL = get_knowledge_base().model
+
+
+def random_fields(count: int, seed: int = 7) -> dict:
+    rng = np.random.default_rng(seed)
+    crop_names = list(CROP_MODEL.crops) + ["Unknown crop"]
+    return {
+        "crop_names": [crop_names[i] for i in rng.integers(0, len(crop_names), count)],
+        "days_after_sowing": rng.integers(-10, 200, count),
+        "area_sown": rng.uniform(0.25, 10, count).round(2),
+        "soil_n": rng.uniform(100, 800, count),
+        "soil_p": rng.uniform(5, 60, count),
+        "soil_k": rng.uniform(80, 600, count)
+    }
+
+
+def scalar_costs(fields: dict, count: int) -> np.ndarray:
+    """Total cost per field through the single-field functions"""
+    totals = np.zeros(count)
+    for i in range(count):
+        crop = CROP_MODEL.crops.get(fields["crop_names"][i], CROP_MODEL.default_crop)
+        days = int(fields["days_after_sowing"][i])
+        if fields["crop_names"][i] in CROP_MODEL.crops:
+            stage = find_stage(crop, days)
+            stage_name = stage.name if stage is not None else "ripening"
+        else:
+            stage_name = ("not_sown" if days < 0 else "vegetative" if days <= 30
+                          else "flowering" if days <= 60 else "ripening")
+        soil = {"N": fields["soil_n"][i], "P": fields["soil_p"][i], "K": fields["soil_k"][i]}
+        totals[i] = sum(
+            entry["cost_per_acre"] * fields["area_sown"][i]
+            for entry in field_doses(CROP_MODEL, crop, stage_name, soil)
+        )
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fields", type=int, default=1_000_000)
+    parser.add_argument("--scalar-fields", type=int, default=20_000)
+    args = parser.parse_args()
+
+    fields = random_fields(args.fields)
+
+    started = time.perf_counter()
+    result = compute_batch(CROP_MODEL, **fields)
+    vectorized = time.perf_counter() - started
+
+    started = time.perf_counter()
+    totals = scalar_costs(fields, args.scalar_fields)
+    scalar = (time.perf_counter() - started) / args.scalar_fields
+
+    assert np.allclose(totals, result.total_cost[:args.scalar_fields])
+    print(f"vectorized: {args.fields} fields in {vectorized:.2f}s "
+          f"({vectorized / args.fields * 1e6:.2f} us/field)")
+    print(f"per-field:  {scalar * 1e6:.2f} us/field "
+          f"(~{scalar * args.fields:.0f}s for {args.fields} fields)")
+
+    complex_plan = fertilizer_set(CROP_MODEL, [("19:19:19", "P"), ("MOP", "K"), ("Urea", "N")])
+    started = time.perf_counter()
+    compute_batch(CROP_MODEL, **fields, fertilizers=complex_plan)
+    print(f"19:19:19 + MOP + Urea plan: {time.perf_counter() - started:.2f}s for {args.fields} fields")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Cost of resolving a farmer by mobile number: async DB query versus the
+identity cache.
+
+    python -m benchmarks.bench_identity_cache --iterations 2000
+"""
+
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import select
+
+from database import AsyncSessionLocal, Farmer, async_engine
+from identity_cache import FARMER_CACHE, async_get_farmer_identity
+
+
+async def run(iterations: int):
+    async with AsyncSessionLocal() as db:
+        mobiles = (await db.scalars(select(Farmer.mobile))).all()
+        if not mobiles:
+            print("No farmers registered; register one first")
+            return
+
+        started = time.perf_counter()
+        for i in range(iterations):
+            await db.scalar(select(Farmer).where(Farmer.mobile == mobiles[i % len(mobiles)]))
+            db.expunge_all()
+        uncached = (time.perf_counter() - started) / iterations * 1e6
+
+        FARMER_CACHE.clear()
+        started = time.perf_counter()
+        for i in range(iterations):
+            await async_get_farmer_identity(db, mobiles[i % len(mobiles)])
+        cached = (time.perf_counter() - started) / iterations * 1e6
+
+    await async_engine.dispose()
+    print(f"DB lookup:    {uncached:8.1f} us/request")
+    print(f"cache lookup: {cached:8.1f} us/request  {FARMER_CACHE.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=2000)
+    asyncio.run(run(parser.parse_args().iterations))
@@ -0,0 +1,55 @@
+"""
+Latency of calculate_fertilizer_recommendation with a cold versus warm
+recommendation cache (weather excluded).
+
+    python -m benchmarks.bench_recommendation_cache --iterations 20000
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import rules_engine
+from knowledge_base import get_knowledge_base
+
+
+def run(iterations: int, inputs) -> float:
+    started = time.perf_counter()
+    for i in range(iterations):
+        crop_name, sowing_date, area = inputs[i % len(inputs)]
+        rules_engine.calculate_fertilizer_recommendation(
+            crop_name, sowing_date, "NTR", "TIRUVURU", area, db=None,
+            include_weather=False, soil_params=dict(rules_engine.DEFAULT_SOIL_PARAMS)
+        )
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    today = datetime.now()
+    inputs = [
+        (crop_name, today - timedelta(days=days), area)
+        for crop_name in get_knowledge_base().model.crops
+        for days in (5, 40, 90)
+        for area in (0.5, 1.0, 2.5)
+    ]
+
+    # Every call a miss: cache too small to hold anything useful
+    rules_engine.RECOMMENDATION_CACHE.maxsize = 0
+    cold = run(args.iterations, inputs)
+
+    rules_engine.RECOMMENDATION_CACHE.maxsize = 10000
+    rules_engine.RECOMMENDATION_CACHE.clear()
+    run(len(inputs), inputs)  # warm up
+    warm = run(args.iterations, inputs)
+
+    print(f"cold cache: {cold:8.1f} us/recommendation")
+    print(f"warm cache: {warm:8.1f} us/recommendation")
+    print(rules_engine.get_cache_stats()["recommendation"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Recommendation throughput with weather included, without network access:
+weather comes from the synthetic and replay providers (weather_providers)
+with injected latency, timeouts, errors and 429s. Short cache TTLs keep
+cells expiring during the run, so upstream behaviour shows in the tail.
+
+    python -m benchmarks.bench_recommendation_weather --requests 3000 --workers 16 --mandals 100
+"""
+
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+# Keep the persistent weather cache out of the working directory
+_tmp_dir = tempfile.mkdtemp()
+os.environ["WEATHER_STORE_PATH"] = os.path.join(_tmp_dir, "weather_cache.db")
+
+import numpy as np
+
+import rules_engine
+import weather_service
+from knowledge_base import get_knowledge_base
+from weather_providers import ReplayProvider, SyntheticProvider
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "weather_ntr_july.json")
+
+
+def register_mandals(count: int) -> list:
+    """Synthetic NTR mandals, each in its own grid cell"""
+    grid = weather_service.WEATHER_GRID_DEGREES
+    mandals = []
+    for i in range(count):
+        mandal = f"LOAD MANDAL {i}"
+        weather_service.LOCATION_COORDS["NTR"][mandal] = {"lat": 16 + (i // 20) * grid, "lon": 80.4 + (i % 20) * grid}
+        mandals.append(mandal)
+    return mandals
+
+
+def reset(ttl: float) -> None:
+    weather_service.WEATHER_CACHE.clear()
+    weather_service.LAST_GOOD.clear()
+    weather_service.get_weather_store().clear()
+    rules_engine.WEATHER_CONTEXT_CACHE.clear()
+    weather_service.WEATHER_BREAKER.record_success()
+    # Cells expire during the run, as they would over hours of real traffic
+    weather_service.CACHE_DURATION = ttl
+    weather_service.WEATHER_CACHE.ttl = ttl
+    rules_engine.WEATHER_CONTEXT_CACHE.ttl = ttl
+
+
+def run(label: str, provider, inputs: list, workers: int, ttl: float) -> None:
+    reset(ttl)
+    weather_service.set_provider(provider)
+    opened = weather_service.WEATHER_BREAKER.opened
+
+    def recommend(request):
+        crop_name, sowing_date, mandal, area = request
+        started = time.perf_counter()
+        result = rules_engine.calculate_fertilizer_recommendation(
+            crop_name, sowing_date, "NTR", mandal, area, db=None,
+            soil_params=dict(rules_engine.DEFAULT_SOIL_PARAMS)
+        )
+        return time.perf_counter() - started, result
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(recommend, inputs))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for latency, _ in results]
+    outcomes = Counter()
+    for _, result in results:
+        weather = result["weather"] or {}
+        outcomes["stale" if weather.get("is_stale") else "mock" if weather.get("is_mock") else "fresh"] += 1
+        outcomes["hold"] += not (result["weather_analysis"] or {}).get("can_apply", True)
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    print(f"{label:<40} {len(inputs) / elapsed:7.0f} req/s  p50 {p50:7.1f} ms  p99 {p99:7.1f} ms  "
+          f"fresh {outcomes['fresh']}  stale {outcomes['stale']}  mock {outcomes['mock']}  "
+          f"hold {outcomes['hold']}  upstream {provider.calls} ({provider.errors} failed)  "
+          f"breaker opened {weather_service.WEATHER_BREAKER.opened - opened}x")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--mandals", type=int, default=100)
+    parser.add_argument("--ttl", type=float, default=2.0, help="Weather cache TTL in seconds during the run")
+    parser.add_argument("--fixtures", default=FIXTURES, help="Replay fixture file")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    mandals = register_mandals(args.mandals)
+    rng = random.Random(args.seed)
+    crops = list(get_knowledge_base().crop_data["crops"])
+    today = datetime.now()
+    inputs = [
+        (rng.choice(crops), today - timedelta(days=rng.randint(1, 110)), rng.choice(mandals), rng.choice((0.5, 1.0, 2.5)))
+        for _ in range(args.requests)
+    ]
+    print(f"{args.requests} recommendations, {args.workers} workers, {args.mandals} mandals, "
+          f"weather TTL {args.ttl:g}s, budget {weather_service.WEATHER_LATENCY_BUDGET:g}s")
+
+    monsoon = date(today.year, 7, 15)
+    run("synthetic, monsoon, 60-100 ms", SyntheticProvider(as_of=monsoon, latency=0.06, jitter=0.04, seed=args.seed),
+        inputs, args.workers, args.ttl)
+    run("synthetic, pre-monsoon heat, 60-100 ms", SyntheticProvider(as_of=date(today.year, 5, 10), latency=0.06,
+        jitter=0.04, seed=args.seed), inputs, args.workers, args.ttl)
+    run("replay, 100-200 ms, 2% errors", ReplayProvider(args.fixtures, latency=0.1, jitter=0.1,
+        error_rate=0.02, seed=args.seed), inputs, args.workers, args.ttl)
+    # Some calls run past the latency budget, many fail: stale and mock fallbacks, breaker trips
+    run("replay, 0.3-3 s, 30% errors, 5% 429", ReplayProvider(args.fixtures, latency=0.3, jitter=2.7,
+        error_rate=0.3, throttle_rate=0.05, seed=args.seed), inputs, args.workers, args.ttl)
+
+    weather_service.set_provider(None)
+    shutil.rmtree(_tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Serialization time and bytes on the wire for a typical advisory response.
+
+    python -m benchmarks.bench_serialization --iterations 5000
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+
+from compression import BrotliEncoder, GzipEncoder, brotli
+from models import RecommendationResponse
+from responses import FastJSONResponse
+from rules_engine import calculate_fertilizer_recommendation, DEFAULT_SOIL_PARAMS
+
+
+def stdlib_render(content) -> bytes:
+    """What starlette's JSONResponse does"""
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def timed(func, content, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func(content)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    data = calculate_fertilizer_recommendation(
+        "వరి", datetime.now() - timedelta(days=20), "NTR", "TIRUVURU", 2.5,
+        db=None, variety="MTU-1061", soil_params=dict(DEFAULT_SOIL_PARAMS)
+    )
+    content = jsonable_encoder(RecommendationResponse(**data))
+    orjson_render = FastJSONResponse(content).render
+
+    print(f"stdlib json: {timed(stdlib_render, content, args.iterations):8.1f} us")
+    print(f"orjson:      {timed(orjson_render, content, args.iterations):8.1f} us")
+
+    body = orjson_render(content)
+    print(f"\nidentity:    {len(body):6d} bytes")
+    encoders = [GzipEncoder] + ([BrotliEncoder] if brotli is not None else [])
+    for encoder_class in encoders:
+        compressed = encoder_class().compress(body, final=True)
+        per_call = timed(lambda b: encoder_class().compress(b, final=True), body, args.iterations // 10)
+        print(f"{encoder_class.name + ':':<12} {len(compressed):6d} bytes "
+              f"({len(compressed) / len(body):.0%}), {per_call:.1f} us to compress")
+
+
+if __name__ == "__main__":
+    main()
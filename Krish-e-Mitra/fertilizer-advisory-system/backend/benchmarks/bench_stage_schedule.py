@@ -0,0 +1,164 @@
+"""
+Stage schedules for many fields: rebuilding each schedule from the stage
+tables (the previous calculate_stage_schedule) versus rendering the cached
+per-crop template.
+
+    python -m benchmarks.bench_stage_schedule --fields 100000 --legacy-fields 20000
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from crop_model import SCHEDULE_CROP_NAMES
+from fertilizer_engine import field_doses
+from knowledge_base import get_knowledge_base
+from stage_calculator import calculate_stage_schedule, get_nutrient_from_fertilizer
+
+SPLIT_FERTILIZERS = {"N": ("Urea", "యూరియా", 0.46), "P": ("DAP", "డిఎపి", 0.46), "K": ("MOP", "ఎంఓపి", 0.60)}
+
+
+def legacy_schedule(crop, sowing_date, total_fertilizers, area_sown, tables):
+    """Per-call schedule construction as done before templates"""
+    crop_lower = crop.lower()
+    if crop_lower in tables.stages:
+        crop_key = crop_lower
+    elif "paddy" in crop_lower or "rice" in crop_lower or "వరి" in crop_lower:
+        crop_key = "paddy"
+    elif "cotton" in crop_lower or "పత్తి" in crop_lower:
+        crop_key = "cotton"
+    elif "maize" in crop_lower or "corn" in crop_lower or "మొక్కజొన్న" in crop_lower:
+        crop_key = "maize"
+    else:
+        crop_key = "paddy"
+    stages_info = tables.stages.get(crop_key, tables.stages["paddy"])
+    npk_splits = tables.npk_splits.get(crop_key, tables.npk_splits["paddy"])
+    sow_date = datetime.strptime(sowing_date, "%Y-%m-%d")
+
+    total_npk = {"N": 0, "P": 0, "K": 0}
+    for fert in total_fertilizers:
+        content = get_nutrient_from_fertilizer(fert.get("name", fert.get("type", "")))
+        for nutrient in ["N", "P", "K"]:
+            total_npk[nutrient] += fert["amount_kg"] * content[nutrient]
+
+    stages = []
+    for stage_info in stages_info:
+        stage_name = stage_info["name"]
+        application_date = sow_date + timedelta(days=stage_info["days"])
+        stage_fertilizers = []
+        for nutrient in ["N", "P", "K"]:
+            if stage_name in npk_splits[nutrient]:
+                ratio = npk_splits[nutrient][stage_name]
+                nutrient_amount = total_npk[nutrient] * ratio
+                if nutrient_amount > 0:
+                    name, name_te, fraction = SPLIT_FERTILIZERS[nutrient]
+                    amount = nutrient_amount / fraction
+                    stage_fertilizers.append({
+                        "name": name,
+                        "name_te": name_te,
+                        "amount_kg": round(amount, 2),
+                        "amount_per_acre": round(amount / area_sown, 2),
+                        "nutrient": nutrient,
+                        "percentage": f"{ratio * 100:.0f}% of total {nutrient}"
+                    })
+        instructions = tables.instructions.get(stage_name, {
+            "en": "Apply as recommended by agricultural expert.",
+            "te": "వ్యవసాయ నిపుణుల సిఫార్సు ప్రకారం వర్తించండి."
+        })
+        stages.append({
+            "stage_name": stage_name,
+            "stage_name_te": stage_info["name_te"],
+            "icon": stage_info["icon"],
+            "days_after_sowing": stage_info["days"],
+            "duration_days": stage_info["duration"],
+            "application_date": application_date.strftime("%Y-%m-%d"),
+            "application_date_formatted": application_date.strftime("%b %d, %Y"),
+            "fertilizers": stage_fertilizers,
+            "instructions_en": instructions["en"],
+            "instructions_te": instructions["te"],
+        })
+
+    return {
+        "crop": crop,
+        "crop_key": crop_key,
+        "sowing_date": sowing_date,
+        "sowing_date_formatted": sow_date.strftime("%b %d, %Y"),
+        "total_duration_days": stages_info[-1]["days"] + stages_info[-1]["duration"],
+        "area_sown": area_sown,
+        "stages": stages,
+        "total_stages": len(stages)
+    }
+
+
+def random_fields(count: int, seed: int = 7) -> list:
+    """(schedule crop name, sowing date, area, fertilizer totals) per field"""
+    rng = random.Random(seed)
+    model = get_knowledge_base().model
+    crops = list(model.crops.values())
+    today = datetime.now()
+    fields = []
+    for _ in range(count):
+        crop = rng.choice(crops)
+        stage = rng.choice(crop.stages).name
+        soil = {"N": rng.uniform(100, 400), "P": rng.uniform(5, 40), "K": rng.uniform(80, 300)}
+        area = round(rng.uniform(0.25, 10), 2)
+        fields.append((
+            SCHEDULE_CROP_NAMES.get(crop.name, crop.name),
+            (today - timedelta(days=rng.randrange(0, 120))).strftime("%Y-%m-%d"),
+            area,
+            [{"name": dose["name"], "amount_kg": dose["amount_per_acre"] * area}
+             for dose in field_doses(model, crop, stage, soil)]
+        ))
+    return fields
+
+
+def same_schedule(legacy: dict, rendered: dict) -> bool:
+    """Equal up to last-digit rounding of amounts (per-acre values are scaled, not divided)"""
+    for a, b in zip(legacy["stages"], rendered["stages"]):
+        for fa, fb in zip(a["fertilizers"], b["fertilizers"]):
+            if abs(fa["amount_kg"] - fb["amount_kg"]) > 0.011 or \
+                    abs(fa["amount_per_acre"] - fb["amount_per_acre"]) > 0.011:
+                return False
+        strip = lambda stage: {k: v for k, v in stage.items() if k != "fertilizers"}
+        if strip(a) != strip(b) or len(a["fertilizers"]) != len(b["fertilizers"]):
+            return False
+    strip = lambda schedule: {k: v for k, v in schedule.items() if k != "stages"}
+    return strip(legacy) == strip(rendered)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fields", type=int, default=100_000)
+    parser.add_argument("--legacy-fields", type=int, default=20_000)
+    args = parser.parse_args()
+
+    tables = get_knowledge_base().stage_tables
+    fields = random_fields(args.fields)
+
+    for crop, sowing, area, ferts in fields[:1000]:
+        assert same_schedule(
+            legacy_schedule(crop, sowing, ferts, area, tables),
+            calculate_stage_schedule(crop, sowing, ferts, area, tables=tables)
+        )
+
+    # Schedules are generated and dropped, as when streaming them out
+    started = time.perf_counter()
+    for crop, sowing, area, ferts in fields:
+        calculate_stage_schedule(crop, sowing, ferts, area, tables=tables)
+    templated = time.perf_counter() - started
+
+    legacy_fields = fields[:args.legacy_fields]
+    started = time.perf_counter()
+    for crop, sowing, area, ferts in legacy_fields:
+        legacy_schedule(crop, sowing, ferts, area, tables)
+    rebuilt = (time.perf_counter() - started) / len(legacy_fields)
+
+    print(f"templates: {args.fields} schedules in {templated:.2f}s "
+          f"({templated / args.fields * 1e6:.1f} us/schedule)")
+    print(f"rebuilt:   {rebuilt * 1e6:.1f} us/schedule "
+          f"(~{rebuilt * args.fields:.2f}s for {args.fields} schedules)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Weather section latency during a provider outage, against the local stub
+server: healthy upstream, then a hanging upstream without the breaker and
+latency budget (each call waits for the full request timeout), then with
+them (fail fast to last-known-good data marked stale).
+
+    python -m benchmarks.bench_weather_breaker --mandals 200
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+# Keep the persistent weather cache out of the working directory
+_tmp_dir = tempfile.mkdtemp()
+os.environ["WEATHER_STORE_PATH"] = os.path.join(_tmp_dir, "weather_cache.db")
+
+import numpy as np
+
+import rules_engine
+import weather_service
+from benchmarks.weather_stub_server import start_stub_server
+
+
+def register_mandals(count: int) -> list:
+    """Synthetic mandals, each in its own grid cell"""
+    grid = weather_service.WEATHER_GRID_DEGREES
+    locations = []
+    for i in range(count):
+        mandal = f"OUTAGE MANDAL {i}"
+        weather_service.LOCATION_COORDS["NTR"][mandal] = {"lat": 12 + (i // 50) * grid, "lon": 76 + (i % 50) * grid}
+        locations.append(("NTR", mandal))
+    return locations
+
+
+def run(label: str, locations: list) -> None:
+    # Last-known-good payloads stay in memory (LAST_GOOD)
+    weather_service.WEATHER_CACHE.clear()
+    weather_service.get_weather_store().clear()
+    rules_engine.WEATHER_CONTEXT_CACHE.clear()
+    latencies = []
+    stale = 0
+    for district, mandal in locations:
+        started = time.perf_counter()
+        context = rules_engine.get_weather_context(district, mandal)
+        latencies.append(time.perf_counter() - started)
+        stale += bool(context["weather"].get("is_stale"))
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    print(f"{label:<34} n={len(locations):<4} p50 {p50:8.1f} ms  p99 {p99:8.1f} ms  "
+          f"max {max(latencies) * 1000:8.1f} ms  stale {stale}  breaker {weather_service.WEATHER_BREAKER.state}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mandals", type=int, default=200)
+    parser.add_argument("--legacy-mandals", type=int, default=3, help="Outage requests without the breaker (slow)")
+    parser.add_argument("--delay", type=float, default=0.02, help="Healthy stub response delay in seconds")
+    args = parser.parse_args()
+
+    server = start_stub_server(delay=args.delay)
+    weather_service.BASE_URL = f"http://127.0.0.1:{server.server_address[1]}"
+    weather_service.API_KEY = "stub"
+    locations = register_mandals(args.mandals)
+    breaker = weather_service.WEATHER_BREAKER
+    budget = weather_service.WEATHER_LATENCY_BUDGET
+    threshold = breaker.failure_threshold
+
+    run("healthy", locations)
+
+    # The provider hangs: every call runs into its timeout
+    server.RequestHandlerClass.delay = 60
+    weather_service.WEATHER_LATENCY_BUDGET = 2 * weather_service.REQUEST_TIMEOUT
+    breaker.failure_threshold = 10 ** 9
+    run("outage, no breaker or budget", locations[:args.legacy_mandals])
+
+    weather_service.WEATHER_LATENCY_BUDGET = budget
+    breaker.failure_threshold = threshold
+    breaker.record_success()
+    run("outage, breaker and budget", locations)
+
+    server.RequestHandlerClass.delay = args.delay
+    time.sleep(breaker.reset_timeout)
+    run("recovered (half-open probe)", locations[:20])
+
+    server.shutdown()
+    shutil.rmtree(_tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Weather for many mandals against the local stub server (rate limited): one
+location at a time through get_current_weather/get_weather_forecast versus
+the bulk fetch with /weather + /forecast and with One Call.
+
+    python -m benchmarks.bench_weather_bulk --mandals 400 --per-cell 4 --delay 0.05 --rate-limit 100
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+# Keep the persistent weather cache out of the working directory
+_tmp_dir = tempfile.mkdtemp()
+os.environ["WEATHER_STORE_PATH"] = os.path.join(_tmp_dir, "weather_cache.db")
+
+import weather_service
+from benchmarks.weather_stub_server import start_stub_server
+from weather_bulk import BulkFetcher, fetch_locations
+
+
+def synthetic_mandals(count: int, per_cell: int) -> list:
+    """Mandals registered in LOCATION_COORDS, `per_cell` of them sharing each grid cell"""
+    locations = []
+    grid = weather_service.WEATHER_GRID_DEGREES
+    for i in range(count):
+        cell = i // per_cell
+        mandal = f"BULK MANDAL {i}"
+        weather_service.LOCATION_COORDS["NTR"][mandal] = {
+            "lat": 12 + (cell // 50) * grid + (i % per_cell) * grid / 10,
+            "lon": 76 + (cell % 50) * grid
+        }
+        locations.append(("NTR", mandal))
+    return locations
+
+
+def reset(server) -> None:
+    weather_service.WEATHER_CACHE.clear()
+    weather_service.get_weather_store().clear()
+    server.calls.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mandals", type=int, default=400)
+    parser.add_argument("--per-cell", type=int, default=4, help="Mandals sharing a grid cell")
+    parser.add_argument("--delay", type=float, default=0.05, help="Stub response delay in seconds")
+    parser.add_argument("--rate-limit", type=int, default=100, help="Stub requests per second before 429")
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    server = start_stub_server(delay=args.delay, rate_limit=args.rate_limit)
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    weather_service.BASE_URL = url
+    weather_service.API_KEY = "stub"
+    locations = synthetic_mandals(args.mandals, args.per_cell)
+    print(f"{args.mandals} mandals, {args.per_cell} per grid cell, stub delay {args.delay * 1000:.0f} ms, "
+          f"limit {args.rate_limit} req/s")
+
+    reset(server)
+    started = time.perf_counter()
+    for district, mandal in locations:
+        weather_service.get_current_weather(district, mandal)
+        weather_service.get_weather_forecast(district, mandal)
+    elapsed = time.perf_counter() - started
+    print(f"{'per location, blocking':<28} {elapsed:7.2f}s  upstream {dict(server.calls)}")
+
+    # Paced just under the stub's limit, as WEATHER_RATE_LIMIT would be for the provider quota
+    for label, onecall_url in (("bulk, /weather + /forecast", ""), ("bulk, one call", url)):
+        reset(server)
+        fetcher = BulkFetcher(
+            args.concurrency, per_minute=args.rate_limit * 60 * 0.95,
+            provider=weather_service.LiveProvider(onecall_url=onecall_url)
+        )
+        started = time.perf_counter()
+        results = fetch_locations(locations, fetcher=fetcher)
+        elapsed = time.perf_counter() - started
+        assert len(results) == len(locations)
+        assert not any(weather["is_mock"] for weather, _ in results.values())
+        assert all(forecast for _, forecast in results.values())
+        print(f"{label:<28} {elapsed:7.2f}s  upstream {dict(server.calls)}  {fetcher.stats()}")
+
+    server.shutdown()
+    shutil.rmtree(_tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
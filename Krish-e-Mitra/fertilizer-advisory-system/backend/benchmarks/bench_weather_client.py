@@ -0,0 +1,128 @@
+"""
+Compare blocking and async weather fetching against the local stub server.
+
+    python -m benchmarks.bench_weather_client --locations 50 --delay 0.1
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Keep the persistent weather cache out of the working directory
+_tmp_dir = tempfile.mkdtemp()
+os.environ["WEATHER_STORE_PATH"] = os.path.join(_tmp_dir, "weather_cache.db")
+
+import requests
+
+import weather_service
+from benchmarks.weather_stub_server import start_stub_server
+
+
+def fetch_blocking_fresh_connections(locations):
+    """Baseline: one new connection per call, current and forecast in sequence"""
+    for district, mandal in locations:
+        coords = weather_service.get_coordinates(district, mandal)
+        params = weather_service.get_request_params(coords)
+        requests.get(f"{weather_service.BASE_URL}/weather", params=params, timeout=5).json()
+        requests.get(f"{weather_service.BASE_URL}/forecast", params=params, timeout=5).json()
+
+
+def fetch_blocking_pooled(locations):
+    for district, mandal in locations:
+        weather_service.get_current_weather(district, mandal)
+        weather_service.get_weather_forecast(district, mandal)
+
+
+async def fetch_async_pooled(locations):
+    await asyncio.gather(*(
+        weather_service.async_get_weather_bundle(district, mandal)
+        for district, mandal in locations
+    ))
+    await weather_service.close_async_client()
+
+
+def stampede(server, requests_per_mandal: int) -> None:
+    """Many concurrent requests for the known mandals on a cold cache"""
+    weather_service.WEATHER_CACHE.clear()
+    weather_service.get_weather_store().clear()
+    server.calls.clear()
+    mandals = [("NTR", mandal) for mandal in weather_service.LOCATION_COORDS["NTR"]]
+    cells = {weather_service.grid_cell(weather_service.get_coordinates(*loc)) for loc in mandals}
+
+    def fetch(location):
+        weather_service.get_current_weather(*location)
+        weather_service.get_weather_forecast(*location)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=64) as pool:
+        list(pool.map(fetch, mandals * requests_per_mandal))
+    elapsed = time.perf_counter() - started
+    print(f"stampede: {len(mandals) * requests_per_mandal} requests for {len(mandals)} mandals "
+          f"({len(cells)} grid cells) -> upstream calls {dict(server.calls)} in {elapsed:.3f}s")
+
+
+def first_request_latency(location) -> None:
+    """One location's first request: cold, after a restart (store only) and warm"""
+    def first_call() -> float:
+        started = time.perf_counter()
+        weather_service.get_current_weather(*location)
+        weather_service.get_weather_forecast(*location)
+        return time.perf_counter() - started
+
+    weather_service.WEATHER_CACHE.clear()
+    weather_service.get_weather_store().clear()
+    cold = first_call()
+    weather_service.WEATHER_CACHE.clear()
+    restarted = weather_service.warm_weather_cache()
+    after_restart = first_call()
+    warm = first_call()
+    print(f"first request: cold {cold * 1000:.1f} ms, after restart ({restarted} stored entries) "
+          f"{after_restart * 1000:.2f} ms, warm {warm * 1000:.2f} ms")
+
+
+def timed(label, func, *args):
+    weather_service.WEATHER_CACHE.clear()
+    weather_service.get_weather_store().clear()
+    started = time.perf_counter()
+    result = func(*args)
+    if asyncio.iscoroutine(result):
+        asyncio.run(result)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<40} {elapsed:8.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--locations", type=int, default=50)
+    parser.add_argument("--delay", type=float, default=0.1, help="Stub response delay in seconds")
+    parser.add_argument("--stampede", type=int, default=100, help="Concurrent requests per known mandal")
+    args = parser.parse_args()
+
+    server = start_stub_server(delay=args.delay)
+    weather_service.BASE_URL = f"http://127.0.0.1:{server.server_address[1]}"
+    weather_service.API_KEY = "stub"
+
+    # Synthetic mandals a grid cell apart, so every location misses the cache
+    locations = []
+    for i in range(args.locations):
+        weather_service.LOCATION_COORDS["NTR"][f"MANDAL {i}"] = {"lat": 10 + i * 0.5, "lon": 75.0}
+        locations.append(("NTR", f"MANDAL {i}"))
+    print(f"{args.locations} locations, stub delay {args.delay * 1000:.0f} ms per call")
+    timed("blocking, new connection per call", fetch_blocking_fresh_connections, locations)
+    timed("blocking, shared session", fetch_blocking_pooled, locations)
+    timed("async, pooled client, concurrent", fetch_async_pooled, locations)
+    for location in locations:
+        del weather_service.LOCATION_COORDS["NTR"][location[1]]
+    stampede(server, args.stampede)
+    first_request_latency(("NTR", "TIRUVURU"))
+
+    server.shutdown()
+    shutil.rmtree(_tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
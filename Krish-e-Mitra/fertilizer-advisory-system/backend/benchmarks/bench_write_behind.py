@@ -0,0 +1,108 @@
+"""
+Persisting advisories: two commits per request (the old handler) versus the
+group-commit writer at several batch sizes.
+
+Reports the time a request spends persisting (what the caller waits for) and
+the rows/sec actually committed once the queue is drained. Runs against a
+throwaway copy of the database:
+
+    python -m benchmarks.bench_write_behind --rows 2000 --batch-sizes 1,16,64,256
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+# Point the engines at a copy before the app modules are imported
+_tmp_dir = tempfile.mkdtemp()
+_db_path = os.path.join(_tmp_dir, "bench.db")
+shutil.copy(os.path.join(os.path.dirname(__file__), "..", "fertilizer_advisory.db"), _db_path)
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_path}"
+
+import json
+
+from database import SessionLocal, Field, Recommendation, init_db, recommendation_summary
+from rules_engine import calculate_fertilizer_recommendation, DEFAULT_SOIL_PARAMS
+from write_behind import RecommendationWriter
+
+FIELD_VALUES = {
+    "location": "VIJAYAWADA RURAL, NTR",
+    "crop_type": "వరి",
+    "variety": None,
+    "sowing_date": datetime(2024, 7, 1),
+    "area_sown": 2.5
+}
+
+
+def sample_recommendation():
+    return calculate_fertilizer_recommendation(
+        crop_name="వరి",
+        sowing_date=FIELD_VALUES["sowing_date"],
+        district="NTR",
+        mandal="VIJAYAWADA RURAL",
+        area_sown=FIELD_VALUES["area_sown"],
+        db=None,
+        include_weather=False,
+        soil_params=dict(DEFAULT_SOIL_PARAMS)
+    )
+
+
+def run_per_request_commits(rows: int, data) -> tuple:
+    db = SessionLocal()
+    started = time.perf_counter()
+    for _ in range(rows):
+        field = Field(farmer_id=None, **FIELD_VALUES)
+        db.add(field)
+        db.commit()
+        db.refresh(field)
+        db.add(Recommendation(
+            farmer_id=None,
+            field_id=field.id,
+            recommendation_json=json.dumps(data, ensure_ascii=False),
+            **recommendation_summary(data)
+        ))
+        db.commit()
+    elapsed = time.perf_counter() - started
+    db.close()
+    return elapsed / rows * 1e6, rows / elapsed
+
+
+def run_write_behind(rows: int, data, batch_size: int) -> tuple:
+    writer = RecommendationWriter(batch_size=batch_size, flush_interval=0.05)
+    writer.start()
+    started = time.perf_counter()
+    for _ in range(rows):
+        writer.submit(None, FIELD_VALUES, data)
+    enqueued = time.perf_counter() - started
+    writer.stop()
+    elapsed = time.perf_counter() - started
+    assert writer.rows_written == rows, writer.stats()
+    return enqueued / rows * 1e6, rows / elapsed, writer.batches
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--batch-sizes", default="1,16,64,256")
+    args = parser.parse_args()
+
+    init_db()
+    data = sample_recommendation()
+
+    per_request, throughput = run_per_request_commits(args.rows, data)
+    print(f"{'per-request commits':22s} {per_request:9.1f} us/request on the request path  "
+          f"{throughput:8.0f} rows/s committed")
+
+    for batch_size in (int(size) for size in args.batch_sizes.split(",")):
+        per_request, throughput, batches = run_write_behind(args.rows, data, batch_size)
+        print(f"{'write-behind b=' + str(batch_size):22s} {per_request:9.1f} us/request on the request path  "
+              f"{throughput:8.0f} rows/s committed ({batches} transactions)")
+
+    shutil.rmtree(_tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Local stand-in for the OpenWeatherMap API.
+Serves canned /weather, /forecast and One Call (/onecall) payloads with a
+configurable delay, and optionally answers 429 above a request rate, so the
+weather client can be benchmarked without network access.
+
+Usage:
+    python -m benchmarks.weather_stub_server --port 8090 --delay 0.2 --rate-limit 50
+    OPENWEATHER_BASE_URL=http://127.0.0.1:8090 OPENWEATHER_API_KEY=stub uvicorn main:app
+    (add OPENWEATHER_ONECALL_URL=http://127.0.0.1:8090 to use the One Call endpoint)
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+def current_payload(lat: float, lon: float) -> dict:
+    return {
+        "coord": {"lat": lat, "lon": lon},
+        "weather": [{"main": "Clouds", "description": "scattered clouds", "icon": "03d"}],
+        "main": {"temp": 29.4, "feels_like": 32.1, "humidity": 70},
+        "wind": {"speed": 3.1},
+        "clouds": {"all": 45},
+        "dt": int(time.time())
+    }
+
+
+def forecast_payload(lat: float, lon: float) -> dict:
+    now = int(time.time())
+    items = []
+    for step in range(40):  # 5 days in 3-hour steps
+        item = {
+            "dt": now + step * 3 * 3600,
+            "main": {"temp": 24 + (step % 8)},
+            "weather": [{"description": "light rain" if step % 5 == 0 else "broken clouds"}]
+        }
+        if step % 5 == 0:
+            item["rain"] = {"3h": 1.2}
+        items.append(item)
+    return {"city": {"coord": {"lat": lat, "lon": lon}}, "list": items}
+
+
+def onecall_payload(lat: float, lon: float) -> dict:
+    now = int(time.time())
+    daily = []
+    for day in range(8):
+        item = {
+            "dt": now + day * 86400,
+            "temp": {"min": 22 + day % 3, "max": 31 + day % 4},
+            "weather": [{"main": "Clouds", "description": "broken clouds", "icon": "04d"}],
+            "pop": 0.6 if day % 3 == 2 else 0.2
+        }
+        if day % 3 == 2:
+            item["rain"] = 4.8
+        daily.append(item)
+    return {
+        "lat": lat,
+        "lon": lon,
+        "current": {
+            "dt": now,
+            "temp": 29.4,
+            "feels_like": 32.1,
+            "humidity": 70,
+            "clouds": 45,
+            "wind_speed": 3.1,
+            "weather": [{"main": "Clouds", "description": "scattered clouds", "icon": "03d"}]
+        },
+        "daily": daily
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    wbufsize = 64 * 1024  # send headers and body in one segment
+    disable_nagle_algorithm = True
+    delay = 0.0
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        lat = float(query.get("lat", ["16.5"])[0])
+        lon = float(query.get("lon", ["80.6"])[0])
+
+        if url.path.endswith("/weather"):
+            payload = current_payload(lat, lon)
+        elif url.path.endswith("/forecast"):
+            payload = forecast_payload(lat, lon)
+        elif url.path.endswith("/onecall"):
+            payload = onecall_payload(lat, lon)
+        else:
+            self.send_error(404)
+            return
+
+        if not self.server.admit():
+            self.server.count("throttled")
+            self.send_response(429)
+            self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.server.count(url.path.rsplit("/", 1)[-1])
+        time.sleep(self.delay)
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # accept bursts of concurrent connections
+
+    rate_limit = 0  # requests per second before answering 429; 0 is unlimited
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = {}
+        self._calls_lock = threading.Lock()
+        self._window = (0, 0)  # (second, requests admitted in it)
+
+    def admit(self) -> bool:
+        """Fixed one-second window rate limit, like the provider's per-minute quota"""
+        if not self.rate_limit:
+            return True
+        with self._calls_lock:
+            second = int(time.monotonic())
+            start, count = self._window
+            if start != second:
+                start, count = second, 0
+            if count >= self.rate_limit:
+                return False
+            self._window = (start, count + 1)
+            return True
+
+    def count(self, endpoint: str) -> None:
+        """Tally a served call per endpoint ("weather", "forecast")"""
+        with self._calls_lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+
+
+def start_stub_server(port: int = 0, delay: float = 0.0, rate_limit: int = 0) -> StubServer:
+    """Start the stub server in a daemon thread; returns the server (see server_address)"""
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"delay": delay})
+    server = StubServer(("127.0.0.1", port), handler)
+    server.rate_limit = rate_limit
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local OpenWeatherMap stub")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--delay", type=float, default=0.2, help="Seconds to wait before each response")
+    parser.add_argument("--rate-limit", type=int, default=0, help="Requests per second before answering 429")
+    args = parser.parse_args()
+
+    server = start_stub_server(args.port, args.delay, args.rate_limit)
+    print(f"Weather stub listening on http://127.0.0.1:{server.server_address[1]} (delay {args.delay}s)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
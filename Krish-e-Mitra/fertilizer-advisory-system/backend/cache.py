@@ -0,0 +1,224 @@
+"""
+Bounded in-process caches.
+Thread-safe LRU cache with per-entry time-to-live and hit/miss/eviction counters,
+and single-flight call deduplication for filling caches on a miss.
+"""
+
+import asyncio
+import concurrent.futures
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+# Sentinel for "not in cache" so that None can be cached
+MISSING = object()
+
+
+class TTLCache:
+    """Least-recently-used cache whose entries also expire after `ttl` seconds"""
+
+    def __init__(self, maxsize: int, ttl: float, name: str = "cache"):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        """Return the cached value, or `default` if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def peek(self, key: Hashable, default: Any = MISSING) -> Any:
+        """Like get, but without touching counters or recency"""
+        with self._lock:
+            entry = self._data.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            return default
+        return entry[0]
+
+    def remaining(self, key: Hashable) -> Optional[float]:
+        """Seconds until an entry expires, or None if it is missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+        if entry is None:
+            return None
+        left = entry[1] - time.monotonic()
+        return left if left > 0 else None
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value, evicting the least recently used entry when full"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable) -> Any:
+        """Remove an entry; returns its value or MISSING"""
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return MISSING if entry is None else entry[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for monitoring; hit_ratio is over all lookups so far"""
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+class _Call:
+    """One in-flight call shared by a leader and its followers"""
+
+    __slots__ = ("future", "loop")
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.future = concurrent.futures.Future()
+        # Event loop of a coroutine leader (None for a thread)
+        self.loop = loop
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls for the same key into one.
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is running wait and get the same result or exception.
+    Threads and coroutines on any event loop share one in-flight call per key
+    (so a background job on its own loop and request handlers fetch a key
+    once); coroutines wait without blocking their loop. A thread never waits
+    on a coroutine of its own running loop, which it would deadlock, and runs
+    the function itself instead.
+    """
+
+    def __init__(self, name: str = "singleflight"):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.shared = 0
+
+    def _finish(self, key: Hashable) -> None:
+        with self._lock:
+            del self._calls[key]
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Run fn() once for all callers asking for `key` at the same time"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+            elif call.loop is not None and call.loop is _running_loop():
+                call = None
+            else:
+                self.shared += 1
+
+        if call is None:
+            return fn()
+        if not leader:
+            try:
+                return call.future.result()
+            except concurrent.futures.CancelledError:
+                # The leading coroutine was cancelled; its result never comes
+                return fn()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key)
+            call.future.set_exception(e)
+            raise
+        self._finish(key)
+        call.future.set_result(result)
+        return result
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Await fn() once for all callers asking for `key` at the same time"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call(loop)
+                self.calls += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            try:
+                # Shielded, so a cancelled follower leaves the shared call running
+                return await asyncio.shield(asyncio.wrap_future(call.future))
+            except asyncio.CancelledError:
+                if not call.future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+            # The leading coroutine was cancelled, not this one: lead a new call (or follow one)
+            return await self.do_async(key, fn)
+
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            self._finish(key)
+            call.future.cancel()
+            raise
+        except BaseException as e:
+            self._finish(key)
+            call.future.set_exception(e)
+            raise
+        self._finish(key)
+        call.future.set_result(result)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """calls went to the function; shared callers reused an in-flight result"""
+        return {
+            "name": self.name,
+            "in_flight": len(self._calls),
+            "calls": self.calls,
+            "shared": self.shared
+        }
@@ -0,0 +1,96 @@
+"""
+Circuit breaker for upstream services.
+After `failure_threshold` consecutive failures the breaker opens and calls
+are rejected without touching the network; after `reset_timeout` seconds a
+single probe call is let through (half-open) and its result closes or
+reopens the breaker.
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Numeric state for metrics
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+    """Thread-safe consecutive-failure breaker with a single half-open probe"""
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probe_started: Optional[float] = None
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.rejected = 0
+        self.last_failure: Optional[str] = None
+
+    def allow(self) -> bool:
+        """Whether a call may go upstream now (False means fail fast)"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            now = time.monotonic()
+            if self.state == OPEN and now - self._opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._probe_started = None
+            # One probe at a time; a probe that never reported back is replaced
+            if self.state == HALF_OPEN and (
+                self._probe_started is None or now - self._probe_started >= self.reset_timeout
+            ):
+                self._probe_started = now
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self._probe_started = None
+            if self.state != CLOSED:
+                self.state = CLOSED
+                print(f"Circuit breaker '{self.name}' closed")
+
+    def record_abandoned(self) -> None:
+        """
+        A call was given up by its caller (its own deadline ran out), which says
+        nothing about the upstream: neither counts as a failure nor resets the
+        count, but frees the half-open probe slot.
+        """
+        with self._lock:
+            self._probe_started = None
+
+    def record_failure(self, error: Any = None) -> None:
+        with self._lock:
+            self.failures += 1
+            self._probe_started = None
+            if error is not None:
+                self.last_failure = str(error) or type(error).__name__
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+                self.opened += 1
+                print(f"Circuit breaker '{self.name}' opened after {self.failures} consecutive failures")
+
+    def stats(self) -> Dict[str, Any]:
+        opened_for = time.monotonic() - self._opened_at if self.state != CLOSED else 0.0
+        return {
+            "name": self.name,
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "failure_threshold": self.failure_threshold,
+            "reset_timeout_seconds": self.reset_timeout,
+            "open_for_seconds": round(opened_for, 1),
+            "times_opened": self.opened,
+            "rejected": self.rejected,
+            "last_failure": self.last_failure
+        }
@@ -0,0 +1,196 @@
+"""
+Response compression negotiated from Accept-Encoding.
+The client's highest q-value wins; among equal ones Brotli (when the optional
+`brotli` package is installed) is preferred to gzip. Small bodies are sent
+as-is; streamed bodies are compressed chunk by chunk and flushed so clients
+still receive the first bytes immediately. Every compressible response
+carries Vary: Accept-Encoding, and a compressed response's strong ETag is
+made weak, since its bytes differ from the identity response's.
+"""
+
+import zlib
+from typing import Dict, List, Optional
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+# Bodies smaller than this are not worth compressing
+MINIMUM_SIZE = 1024
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript")
+
+# Server preference among codings the client rates equally
+PREFERENCE = ("br", "gzip")
+
+
+class GzipEncoder:
+    name = "gzip"
+
+    def __init__(self, level: int = 6):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        out = self._compressor.compress(data)
+        return out + self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class BrotliEncoder:
+    name = "br"
+
+    def __init__(self, quality: int = 5):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        out = self._compressor.process(data)
+        return out + (self._compressor.finish() if final else self._compressor.flush())
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """Map each offered coding to its q-value"""
+    offered = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        offered[coding.strip().lower()] = quality
+    return offered
+
+
+def choose_encoder(accept_encoding: str):
+    """
+    Pick the supported encoder with the highest q-value for an Accept-Encoding
+    header (PREFERENCE breaks ties), or None for identity
+    """
+    offered = parse_accept_encoding(accept_encoding)
+    wildcard = offered.get("*", 0.0)
+    encoders = {"br": BrotliEncoder, "gzip": GzipEncoder} if brotli is not None else {"gzip": GzipEncoder}
+    best = max(
+        (name for name in PREFERENCE if name in encoders),
+        key=lambda name: (offered.get(name, wildcard), -PREFERENCE.index(name))
+    )
+    quality = offered.get(best, wildcard)
+    # identity is acceptable unless refused; it wins only when rated explicitly higher
+    if quality <= 0 or offered.get("identity", 0.0) > quality:
+        return None
+    return encoders[best]()
+
+
+def add_vary(headers: List) -> List:
+    """Headers with Accept-Encoding added to Vary (merged into an existing Vary header)"""
+    for index, (key, value) in enumerate(headers):
+        if key == b"vary":
+            if b"accept-encoding" in value.lower() or value.strip() == b"*":
+                return headers
+            return headers[:index] + [(key, value + b", Accept-Encoding")] + headers[index + 1:]
+    return headers + [(b"vary", b"Accept-Encoding")]
+
+
+def weaken_etag(headers: List) -> List:
+    """Headers with a strong ETag turned weak"""
+    return [
+        (key, b"W/" + value) if key == b"etag" and not value.startswith(b"W/") else (key, value)
+        for key, value in headers
+    ]
+
+
+class CompressionMiddleware:
+    """ASGI middleware applying gzip/Brotli to compressible responses"""
+
+    def __init__(self, app, minimum_size: int = MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = ""
+        for key, value in scope["headers"]:
+            if key == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+
+        # Also without Accept-Encoding, so caches learn that the response varies on it
+        responder = _CompressingSender(send, accept_encoding, self.minimum_size)
+        await self.app(scope, receive, responder)
+
+
+class _CompressingSender:
+    def __init__(self, send, accept_encoding: str, minimum_size: int):
+        self.send = send
+        self.accept_encoding = accept_encoding
+        self.minimum_size = minimum_size
+        self.start_message: Optional[dict] = None
+        self.encoder = None
+        self.passthrough = False
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start_message is not None:
+            start, self.start_message = self.start_message, None
+            headers = list(start.get("headers", []))
+            if self._negotiable(start, headers):
+                headers = add_vary(headers)
+            if self._should_compress(headers, body, more_body):
+                self.encoder = choose_encoder(self.accept_encoding)
+            if self.encoder is None:
+                self.passthrough = True
+                await self.send(dict(start, headers=headers))
+                await self.send(message)
+                return
+
+            headers = [(k, v) for k, v in weaken_etag(headers) if k != b"content-length"]
+            headers.append((b"content-encoding", self.encoder.name.encode()))
+            compressed = self.encoder.compress(body, final=not more_body)
+            if not more_body:
+                headers.append((b"content-length", str(len(compressed)).encode()))
+            await self.send(dict(start, headers=headers))
+            await self.send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+            return
+
+        await self.send({
+            "type": "http.response.body",
+            "body": self.encoder.compress(body, final=not more_body),
+            "more_body": more_body
+        })
+
+    @staticmethod
+    def _negotiable(start: dict, headers: List) -> bool:
+        """Whether the response (or the 200 a 304 stands for) could be compressed"""
+        if start.get("status") == 304:
+            return True
+        headers = dict(headers)
+        content_type = headers.get(b"content-type", b"").decode("latin-1")
+        return b"content-encoding" not in headers and content_type.startswith(COMPRESSIBLE_TYPES)
+
+    def _should_compress(self, headers: List, body: bytes, more_body: bool) -> bool:
+        content_type = b""
+        for key, value in headers:
+            if key == b"content-encoding":
+                return False
+            if key == b"content-type":
+                content_type = value
+        if not content_type.decode("latin-1").startswith(COMPRESSIBLE_TYPES):
+            return False
+        # Streamed bodies are always compressed; single bodies only above the threshold
+        return more_body or len(body) >= self.minimum_size
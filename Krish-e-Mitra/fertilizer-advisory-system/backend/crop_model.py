@@ -0,0 +1,225 @@
+"""
+Compiled crop model.
+crop_data.json is compiled once at load time into immutable records: stage
+boundaries become sorted tuples searched with bisect, and every stage carries
+its fertilizer doses with per-acre amounts and costs already resolved, so the
+rules engine never walks the raw JSON on the request path.
+"""
+
+from bisect import bisect_right
+from types import MappingProxyType
+from typing import Dict, Mapping, NamedTuple, Optional, Tuple
+
+# Nutrient -> straight fertilizer used to supply it, in recommendation order
+PRIMARY_FERTILIZERS = (("N", "Urea"), ("P", "DAP"), ("K", "MOP"))
+
+# Application timing in the vegetative stage; other stages use "During <stage> stage"
+VEGETATIVE_TIMING = {"N": "Immediate", "P": "Basal application"}
+
+# Requirement for stages a crop does not define (kg nutrient per acre)
+DEFAULT_REQUIREMENT = {"N": 40, "P": 20, "K": 20}
+
+# Crop used for names that are not in crop_data.json
+DEFAULT_CROP = "వరి"
+
+# English names passed to stage_calculator
+SCHEDULE_CROP_NAMES = {
+    "వరి": "Paddy",
+    "పత్తి": "Cotton",
+    "మొక్కజొన్న": "Maize",
+    "వేరుశనగ": "Groundnut",
+    "మినుము": "Blackgram",
+    "పెసర": "Green Gram"
+}
+
+
+class Fertilizer(NamedTuple):
+    name: str
+    telugu_name: str
+    nutrient: str
+    percentage: float
+    price_per_kg: float
+    bag_weight: float
+
+
+class FertilizerDose(NamedTuple):
+    """One fertilizer application for a stage, per acre, before soil checks"""
+    fertilizer: Fertilizer
+    nutrient: str
+    amount_per_acre: float
+    cost_per_acre: float
+    timing: str
+
+
+class Stage(NamedTuple):
+    name: str
+    start_day: int
+    end_day: int
+    description: str
+    requirement: Tuple[float, float, float]  # N, P, K in kg nutrient per acre
+    doses: Tuple[FertilizerDose, ...]
+
+
+class Crop(NamedTuple):
+    name: str
+    english_name: str
+    stage_starts: Tuple[int, ...]  # sorted, for bisect
+    stages: Tuple[Stage, ...]      # same order as stage_starts
+    stages_by_name: Mapping[str, Stage]
+
+
+class OrganicIndex(NamedTuple):
+    """
+    organic_recommendations per crop, built once and shared by every response.
+
+    Values hold tuples of the crop_data.json option dicts; treat them as read-only.
+    """
+    by_name: Mapping[str, Dict]  # case-folded crop name / alias -> options
+    default: Dict                # for names not in the index
+
+
+class CropModel(NamedTuple):
+    crops: Mapping[str, Crop]
+    fertilizers: Mapping[str, Fertilizer]
+    thresholds: Mapping[str, float]  # nutrient -> "medium" soil level
+    default_crop: Crop
+    organic: OrganicIndex
+
+
+def dose_timing(stage_name: str, nutrient: str) -> str:
+    """When to apply a fertilizer dosed for `nutrient` in the given stage"""
+    if stage_name == "vegetative" and nutrient in VEGETATIVE_TIMING:
+        return VEGETATIVE_TIMING[nutrient]
+    return f"During {stage_name} stage"
+
+
+def compile_doses(
+    fertilizers: Mapping[str, Fertilizer],
+    requirement: Mapping[str, float],
+    stage_name: str
+) -> Tuple[FertilizerDose, ...]:
+    """Resolve the Urea/DAP/MOP doses that supply a stage's nutrient requirement"""
+    doses = []
+    for nutrient, fertilizer_name in PRIMARY_FERTILIZERS:
+        fertilizer = fertilizers[fertilizer_name]
+        amount = (requirement[nutrient] * 100) / fertilizer.percentage
+        doses.append(FertilizerDose(
+            fertilizer, nutrient, amount, amount * fertilizer.price_per_kg,
+            dose_timing(stage_name, nutrient)
+        ))
+    return tuple(doses)
+
+
+def compile_crop(name: str, crop_info: Dict, fertilizers: Mapping[str, Fertilizer]) -> Crop:
+    requirements = crop_info['nutrient_requirements']
+    stages = []
+    for stage_name, stage_info in crop_info['growth_stages'].items():
+        requirement = requirements.get(stage_name, DEFAULT_REQUIREMENT)
+        stages.append(Stage(
+            stage_name,
+            stage_info['days'][0],
+            stage_info['days'][1],
+            stage_info['description'],
+            (requirement['N'], requirement['P'], requirement['K']),
+            compile_doses(fertilizers, requirement, stage_name)
+        ))
+    stages.sort(key=lambda stage: stage.start_day)
+    for previous, stage in zip(stages, stages[1:]):
+        if stage.start_day <= previous.end_day:
+            raise ValueError(f"Crop {name}: stage {stage.name} overlaps {previous.name}")
+
+    return Crop(
+        name=name,
+        english_name=crop_info.get('english_name', name),
+        stage_starts=tuple(stage.start_day for stage in stages),
+        stages=tuple(stages),
+        stages_by_name=MappingProxyType({stage.name: stage for stage in stages})
+    )
+
+
+def compile_organic_index(crop_data: Dict, crops: Mapping[str, Crop], default_crop: Crop) -> OrganicIndex:
+    """
+    Pre-filter bio-fertilizers for every crop name they can be requested under.
+
+    A crop matches a bio-fertilizer listing "All Crops", its Telugu name or its
+    English name. Any other name (including English names, which are not
+    crop_data.json keys) is treated as the default crop, plus any
+    bio-fertilizer that lists the name itself.
+    """
+    options = crop_data.get('organic_options', {})
+    manures = tuple(options.get('manures', []))
+    green_manures = tuple(options.get('green_manures', []))
+    bio_fertilizers = options.get('bio_fertilizers', [])
+    bio_crops = [frozenset(c.casefold() for c in bf.get('crops', [])) for bf in bio_fertilizers]
+
+    def build(names: frozenset) -> Dict:
+        return {
+            "manures": manures,
+            "bio_fertilizers": tuple(
+                bf for bf, listed in zip(bio_fertilizers, bio_crops)
+                if "all crops" in listed or names & listed
+            ),
+            "green_manures": green_manures
+        }
+
+    default_name = default_crop.english_name.casefold()
+    by_name = {
+        crop.name.casefold(): build(frozenset((crop.name.casefold(), crop.english_name.casefold())))
+        for crop in crops.values()
+    }
+    # Other spellings (English names, crops only named in bio-fertilizer lists) are unknown crops
+    for crop in crops.values():
+        by_name.setdefault(crop.english_name.casefold(), None)
+    for name in frozenset().union(*bio_crops):
+        by_name.setdefault(name, None)
+    for name, entry in by_name.items():
+        if entry is None:
+            by_name[name] = build(frozenset((name, default_name)))
+
+    return OrganicIndex(MappingProxyType(by_name), build(frozenset((default_name,))))
+
+
+def compile_crop_model(crop_data: Dict) -> CropModel:
+    """Compile parsed crop_data.json into a CropModel"""
+    fertilizers = MappingProxyType({
+        name: Fertilizer(
+            name, info['telugu_name'], info['nutrient'],
+            info['percentage'], info['price_per_kg'], info.get('bag_weight', 50)
+        )
+        for name, info in crop_data['fertilizer_types'].items()
+    })
+    crops = MappingProxyType({
+        name: compile_crop(name, info, fertilizers)
+        for name, info in crop_data['crops'].items()
+    })
+    thresholds = MappingProxyType({
+        nutrient: levels['medium'] for nutrient, levels in crop_data['soil_thresholds'].items()
+    })
+    default_crop = crops[DEFAULT_CROP]
+    return CropModel(
+        crops, fertilizers, thresholds, default_crop,
+        compile_organic_index(crop_data, crops, default_crop)
+    )
+
+
+def find_stage(crop: Crop, days_after_sowing: int) -> Optional[Stage]:
+    """Stage whose day range contains days_after_sowing, or None"""
+    index = bisect_right(crop.stage_starts, days_after_sowing) - 1
+    if index >= 0:
+        stage = crop.stages[index]
+        if days_after_sowing <= stage.end_day:
+            return stage
+    return None
+
+
+def stage_doses(model: CropModel, crop: Crop, stage_name: str) -> Tuple[FertilizerDose, ...]:
+    """Precompiled doses for a crop stage, or the default requirement for unknown stages"""
+    stage = crop.stages_by_name.get(stage_name)
+    if stage is not None:
+        return stage.doses
+    return compile_doses(model.fertilizers, DEFAULT_REQUIREMENT, stage_name)
+
+
+def organic_options(model: CropModel, crop_name: str) -> Dict:
+    """Shared organic_recommendations for a crop name (read-only, served to every response as is)"""
+    return model.organic.by_name.get(crop_name.casefold(), model.organic.default)
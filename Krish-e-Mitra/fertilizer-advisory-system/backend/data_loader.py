@@ -1,98 +1,316 @@
-import pandas as pd
-from sqlalchemy.orm import Session
-from database import SoilData, FarmerRecord, init_db, SessionLocal
-from datetime import datetime
+"""
+Reference dataset loading.
+The NTR soil and e-panta Excel files are parsed once by the ingest command
+(`python data_loader.py --build-snapshot`) into a prepared SQLite snapshot.
+Startup only compares the snapshot's version stamp with the one recorded in
+the application database and, when they differ, copies the tables over with
+ATTACH. pandas/xlrd/openpyxl are imported only when Excel files are parsed.
+"""
+
+import argparse
+import hashlib
 import os
+import time
+from datetime import datetime
+from typing import Dict, List
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from database import (
+    Base, DatasetMeta, SoilData, SoilHealthCard, FarmerRecord, engine, init_db, SessionLocal
+)
+from reference_catalog import refresh_reference_catalog
+from soil_index import refresh_soil_index
+
+DATASETS_DIR = os.path.join(os.path.dirname(__file__), "..", "datasets")
+SOIL_DATASET = os.path.join(DATASETS_DIR, "ntr-soil.xls")
+FARMER_DATASET = os.path.join(DATASETS_DIR, "NTR-7 mandals e panta and SHC sample data.xlsx")
+
+SNAPSHOT_PATH = os.getenv(
+    "DATASET_SNAPSHOT_PATH",
+    os.path.join(os.path.dirname(__file__), "dataset_snapshot.db")
+)
+SNAPSHOT_VERSION_KEY = "snapshot_version"
+# Bump when the snapshot layout or the parsing rules change
+SNAPSHOT_FORMAT = "2"
+SNAPSHOT_TABLES = (SoilData.__table__, SoilHealthCard.__table__, FarmerRecord.__table__)
+
+def read_soil_rows(file_path: str = SOIL_DATASET) -> List[Dict]:
+    """Parse the NTR soil Excel file into SoilData column values"""
+    import pandas as pd  # ingestion only
+
+    df = pd.read_excel(file_path)
+
+    # Clean column names (remove the ,C,10 and ,C,254 suffixes)
+    df.columns = [col.split(',')[0] for col in df.columns]
+
+    columns = pd.DataFrame({
+        "code": df['Code'].astype(int),
+        "depth": df['Depth'].astype(str),
+        "drainage": df['Drinage'].astype(str),  # Note: typo in original data
+        "texture": df['Texture'].astype(str),
+        "slope": df['Slope'].astype(str),
+        "temperature": df['Temperatur'].astype(str),  # Note: typo in original data
+        "hsg": df['HSG'].astype(str),
+        "soil_taxonomy": df['SoilTaxono'].astype(str),
+        "landform": df['Landform'].astype(str)
+    })
+    return columns.to_dict("records")
+
+def read_farmer_rows(file_path: str = FARMER_DATASET) -> List[Dict]:
+    """Parse the e-panta Excel file into FarmerRecord column values"""
+    import pandas as pd  # ingestion only
+
+    df = pd.read_excel(file_path)
+
+    # Clean column names (remove trailing spaces)
+    df.columns = [col.strip() for col in df.columns]
+
+    def text(name):
+        values = df[name]
+        return values.astype(str).where(values.notna(), None).tolist()
+
+    def number(name, cast):
+        return [cast(v) if pd.notna(v) else None for v in df[name].tolist()]
+
+    sowing_dates = pd.to_datetime(df['Date of Sowing'], errors="coerce")
+    columns = {
+        "booking_id": number('Booking-id', int),
+        "district": text('District'),
+        "mandal": text('Mandal'),
+        "village": text('Village'),
+        "crop_name": text('Crop Name'),
+        "variety": text('Variety'),
+        "area_sown": number('Area Sown', float),
+        "date_of_sowing": [d.to_pydatetime() if pd.notna(d) else None for d in sowing_dates],
+        "crop_nature": text('Crop Nature'),
+        "irrigation_source": text('Irrigation Source'),
+        "method_of_irrigation": text('Method of Irrigation'),
+        "farming_type": text('Farming Type')
+    }
+    return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+def read_soil_health_rows(file_path: str = FARMER_DATASET) -> List[Dict]:
+    """Parse the SHC sheet of the e-panta workbook into SoilHealthCard column values"""
+    import pandas as pd  # ingestion only
+
+    df = pd.read_excel(file_path, sheet_name="SHC data")
+    df.columns = [col.strip() for col in df.columns]
+
+    def text(name):
+        values = df[name]
+        return values.astype(str).str.strip().where(values.notna(), None).tolist()
+
+    def number(name):
+        values = pd.to_numeric(df[name], errors="coerce")
+        return [float(v) if pd.notna(v) else None for v in values.tolist()]
+
+    sample_dates = pd.to_datetime(df['Sample date'], errors="coerce")
+    columns = {
+        "test_id": text('Test ID'),
+        "district": text('District'),
+        "mandal": text('Block'),
+        "village": text('Village'),
+        "survey_number": text('Survey Number'),
+        "latitude": number('Latitude'),
+        "longitude": number('Longitude'),
+        "ph": number('pH'),
+        "ec": number('EC'),
+        "oc": number('OC'),
+        "n": number('n'),
+        "p": number('p'),
+        "k": number('k'),
+        "sample_date": [d.to_pydatetime() if pd.notna(d) else None for d in sample_dates]
+    }
+    return [dict(zip(columns, values)) for values in zip(*columns.values())]
 
 def load_soil_data(db: Session):
     """Load NTR soil data from Excel file into database"""
     print("Loading NTR soil data...")
-    
+
     # Check if data already loaded
     if db.query(SoilData).count() > 0:
         print("Soil data already loaded. Skipping...")
         return
-    
-    # Read Excel file
-    file_path = os.path.join(os.path.dirname(__file__), "..", "datasets", "ntr-soil.xls")
-    df = pd.read_excel(file_path)
-    
-    # Clean column names (remove the ,C,10 and ,C,254 suffixes)
-    df.columns = [col.split(',')[0] for col in df.columns]
-    
-    # Insert data
-    for _, row in df.iterrows():
-        soil_record = SoilData(
-            code=int(row['Code']),
-            depth=str(row['Depth']),
-            drainage=str(row['Drinage']),  # Note: typo in original data
-            texture=str(row['Texture']),
-            slope=str(row['Slope']),
-            temperature=str(row['Temperatur']),  # Note: typo in original data
-            hsg=str(row['HSG']),
-            soil_taxonomy=str(row['SoilTaxono']),
-            landform=str(row['Landform'])
-        )
-        db.add(soil_record)
-    
+
+    rows = read_soil_rows()
+    db.execute(insert(SoilData), rows)
     db.commit()
-    print(f"Loaded {df.shape[0]} soil records")
+    print(f"Loaded {len(rows)} soil records")
 
 def load_farmer_records(db: Session):
     """Load NTR-7 mandals farmer data from Excel file into database"""
     print("Loading NTR-7 mandals farmer data...")
-    
+
     # Check if data already loaded
     if db.query(FarmerRecord).count() > 0:
         print("Farmer records already loaded. Skipping...")
         return
-    
-    # Read Excel file
-    file_path = os.path.join(os.path.dirname(__file__), "..", "datasets", "NTR-7 mandals e panta and SHC sample data.xlsx")
-    df = pd.read_excel(file_path)
-    
-    # Clean column names (remove trailing spaces)
-    df.columns = [col.strip() for col in df.columns]
-    
-    # Insert data
-    for _, row in df.iterrows():
-        # Handle date parsing
-        try:
-            sowing_date = pd.to_datetime(row['Date of Sowing'])
-        except:
-            sowing_date = None
-        
-        farmer_record = FarmerRecord(
-            booking_id=int(row['Booking-id']) if pd.notna(row['Booking-id']) else None,
-            district=str(row['District']) if pd.notna(row['District']) else None,
-            mandal=str(row['Mandal']) if pd.notna(row['Mandal']) else None,
-            village=str(row['Village']) if pd.notna(row['Village']) else None,
-            crop_name=str(row['Crop Name']) if pd.notna(row['Crop Name']) else None,
-            variety=str(row['Variety']) if pd.notna(row['Variety']) else None,
-            area_sown=float(row['Area Sown']) if pd.notna(row['Area Sown']) else None,
-            date_of_sowing=sowing_date,
-            crop_nature=str(row['Crop Nature']) if pd.notna(row['Crop Nature']) else None,
-            irrigation_source=str(row['Irrigation Source']) if pd.notna(row['Irrigation Source']) else None,
-            method_of_irrigation=str(row['Method of Irrigation']) if pd.notna(row['Method of Irrigation']) else None,
-            farming_type=str(row['Farming Type']) if pd.notna(row['Farming Type']) else None
-        )
-        db.add(farmer_record)
-    
+
+    rows = read_farmer_rows()
+    db.execute(insert(FarmerRecord), rows)
+    db.commit()
+    print(f"Loaded {len(rows)} farmer records")
+
+def load_soil_health_cards(db: Session):
+    """Load soil health card results from the SHC sheet into database"""
+    print("Loading soil health card data...")
+
+    # Check if data already loaded
+    if db.query(SoilHealthCard).count() > 0:
+        print("Soil health cards already loaded. Skipping...")
+        return
+
+    rows = read_soil_health_rows()
+    db.execute(insert(SoilHealthCard), rows)
     db.commit()
-    print(f"Loaded {df.shape[0]} farmer records")
+    print(f"Loaded {len(rows)} soil health cards")
+
+def add_soil_health_cards(db: Session, file_path: str) -> int:
+    """
+    Append SHC results from another workbook and fold them into this process's soil index.
+    Running API workers pick them up within SOIL_INDEX_REFRESH_INTERVAL.
+    """
+    rows = read_soil_health_rows(file_path)
+    if rows:
+        db.execute(insert(SoilHealthCard), rows)
+        db.commit()
+    index = refresh_soil_index(db)
+    print(f"Added {len(rows)} soil health cards ({index.cards} indexed)")
+    return len(rows)
+
+def dataset_version() -> str:
+    """Content hash of the source Excel files and the snapshot format"""
+    digest = hashlib.sha256(SNAPSHOT_FORMAT.encode())
+    for file_path in (SOIL_DATASET, FARMER_DATASET):
+        with open(file_path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+def read_snapshot_version(path: str = SNAPSHOT_PATH):
+    """Version stamp of a snapshot file, or None if it does not exist"""
+    if not os.path.exists(path):
+        return None
+    snapshot_engine = create_engine(f"sqlite:///{path}")
+    try:
+        with snapshot_engine.connect() as conn:
+            return conn.exec_driver_sql(
+                "SELECT value FROM dataset_meta WHERE key = ?", (SNAPSHOT_VERSION_KEY,)
+            ).scalar()
+    finally:
+        snapshot_engine.dispose()
+
+def build_snapshot(path: str = SNAPSHOT_PATH, force: bool = False) -> str:
+    """
+    Parse the Excel datasets into a prepared SQLite snapshot (the ingest step).
+
+    Args:
+        path: Snapshot file to write
+        force: Rebuild even if the snapshot already matches the source files
+
+    Returns:
+        Version stamp of the snapshot
+    """
+    version = dataset_version()
+    if not force and read_snapshot_version(path) == version:
+        print(f"Snapshot {path} is up to date ({version})")
+        return version
+
+    started = time.perf_counter()
+    soil_rows = read_soil_rows()
+    soil_health_rows = read_soil_health_rows()
+    farmer_rows = read_farmer_rows()
+
+    # Write to a temporary file and rename so readers never see a partial snapshot
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    snapshot_engine = create_engine(f"sqlite:///{tmp_path}")
+    try:
+        Base.metadata.create_all(snapshot_engine, tables=[*SNAPSHOT_TABLES, DatasetMeta.__table__])
+        with snapshot_engine.begin() as conn:
+            conn.execute(insert(SoilData), soil_rows)
+            conn.execute(insert(SoilHealthCard), soil_health_rows)
+            conn.execute(insert(FarmerRecord), farmer_rows)
+            conn.execute(insert(DatasetMeta), [
+                {"key": SNAPSHOT_VERSION_KEY, "value": version},
+                {"key": "built_at", "value": datetime.now().isoformat()},
+                {"key": "soil_rows", "value": str(len(soil_rows))},
+                {"key": "soil_health_rows", "value": str(len(soil_health_rows))},
+                {"key": "farmer_rows", "value": str(len(farmer_rows))}
+            ])
+    finally:
+        snapshot_engine.dispose()
+    os.replace(tmp_path, path)
+
+    print(f"Built snapshot {path} ({version}): {len(soil_rows)} soil records, "
+          f"{len(soil_health_rows)} soil health cards, {len(farmer_rows)} farmer records in {time.perf_counter() - started:.2f}s")
+    return version
+
+def apply_snapshot(path: str = SNAPSHOT_PATH) -> bool:
+    """
+    Bring the reference tables in line with the snapshot.
+
+    Returns:
+        True if the database now matches the snapshot, False if there is no snapshot
+    """
+    if not os.path.exists(path):
+        return False
+
+    started = time.perf_counter()
+    with engine.connect() as conn:
+        conn.exec_driver_sql("ATTACH DATABASE ? AS snapshot", (path,))
+        try:
+            snapshot_version = conn.exec_driver_sql(
+                "SELECT value FROM snapshot.dataset_meta WHERE key = ?", (SNAPSHOT_VERSION_KEY,)
+            ).scalar()
+            loaded_version = conn.exec_driver_sql(
+                "SELECT value FROM main.dataset_meta WHERE key = ?", (SNAPSHOT_VERSION_KEY,)
+            ).scalar()
+            if snapshot_version == loaded_version:
+                conn.rollback()
+                print(f"Dataset snapshot {snapshot_version} already loaded")
+                return True
+
+            for table in SNAPSHOT_TABLES:
+                columns = ", ".join(column.name for column in table.columns)
+                conn.exec_driver_sql(f"DELETE FROM main.{table.name}")
+                conn.exec_driver_sql(
+                    f"INSERT INTO main.{table.name} ({columns}) SELECT {columns} FROM snapshot.{table.name}"
+                )
+            conn.exec_driver_sql(
+                "INSERT OR REPLACE INTO main.dataset_meta (key, value) VALUES (?, ?)",
+                (SNAPSHOT_VERSION_KEY, snapshot_version)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.exec_driver_sql("DETACH DATABASE snapshot")
+            conn.commit()
+
+    print(f"Loaded dataset snapshot {snapshot_version} in {(time.perf_counter() - started) * 1000:.1f} ms")
+    return True
 
 def initialize_database():
     """Initialize database and load all data"""
     print("Initializing database...")
-    
+
     # Create tables
     init_db()
-    
+
     # Load data
     db = SessionLocal()
     try:
-        load_soil_data(db)
-        load_farmer_records(db)
+        if not apply_snapshot():
+            # No prebuilt snapshot: parse the Excel files directly
+            load_soil_data(db)
+            load_soil_health_cards(db)
+            load_farmer_records(db)
+        refresh_reference_catalog(db)
+        refresh_soil_index(db, full=True)
         print("Database initialization complete!")
     except Exception as e:
         print(f"Error loading data: {e}")
@@ -100,5 +318,26 @@ def initialize_database():
     finally:
         db.close()
 
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Load the reference datasets")
+    parser.add_argument("--build-snapshot", action="store_true",
+                        help="Parse the Excel files into the dataset snapshot instead of loading the database")
+    parser.add_argument("--force", action="store_true", help="Rebuild the snapshot even if it is up to date")
+    parser.add_argument("--add-soil-cards", metavar="XLSX",
+                        help="Append soil health cards from a workbook with an 'SHC data' sheet")
+    args = parser.parse_args(argv)
+
+    if args.build_snapshot:
+        build_snapshot(force=args.force)
+    elif args.add_soil_cards:
+        init_db()
+        db = SessionLocal()
+        try:
+            add_soil_health_cards(db, args.add_soil_cards)
+        finally:
+            db.close()
+    else:
+        initialize_database()
+
 if __name__ == "__main__":
-    initialize_database()
+    main()
@@ -1,14 +1,25 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text, ForeignKey
+import os
+import json
+from sqlalchemy import (
+    create_engine, inspect, text, Column, Integer, String, Float, DateTime, Text,
+    ForeignKey, Index
+)
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
 
 # Database setup
-DATABASE_URL = "sqlite:///./fertilizer_advisory.db"
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./fertilizer_advisory.db")
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Async engine for request handlers (same database, aiosqlite driver)
+ASYNC_DATABASE_URL = DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+async_engine = create_async_engine(ASYNC_DATABASE_URL)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 # Database Models
 class Farmer(Base):
     __tablename__ = "farmers"
@@ -34,13 +45,18 @@ class Field(Base):
     variety = Column(String)
     sowing_date = Column(DateTime)
     area_sown = Column(Float)  # in acres
-    created_at = Column(DateTime, default=datetime.utcnow)
+    # farmer_records row a batch advisory was generated from (None for fields entered through the API)
+    source_record_id = Column(Integer)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     
     farmer = relationship("Farmer", back_populates="fields")
     recommendations = relationship("Recommendation", back_populates="field")
 
 class Recommendation(Base):
     __tablename__ = "recommendations"
+    __table_args__ = (
+        Index("ix_recommendations_farmer_created", "farmer_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     farmer_id = Column(Integer, ForeignKey("farmers.id"))
@@ -48,9 +64,32 @@ class Recommendation(Base):
     recommendation_json = Column(Text)  # JSON string
     created_at = Column(DateTime, default=datetime.utcnow)
     
+    # Summary columns so history lists never decode recommendation_json
+    crop = Column(String)
+    variety = Column(String)
+    current_stage = Column(String)
+    district = Column(String)
+    mandal = Column(String)
+    area_sown = Column(Float)
+    total_cost = Column(Float)
+    
     farmer = relationship("Farmer", back_populates="recommendations")
     field = relationship("Field", back_populates="recommendations")
 
+class IdSequence(Base):
+    """Next free primary key per table, for allocating ids before rows are written"""
+    __tablename__ = "id_sequences"
+    
+    name = Column(String, primary_key=True)
+    next_id = Column(Integer, nullable=False)
+
+class DatasetMeta(Base):
+    """Key/value stamps about the loaded reference datasets (e.g. snapshot version)"""
+    __tablename__ = "dataset_meta"
+    
+    key = Column(String, primary_key=True)
+    value = Column(String)
+
 class SoilData(Base):
     __tablename__ = "soil_data"
     
@@ -65,6 +104,26 @@ class SoilData(Base):
     soil_taxonomy = Column(String)
     landform = Column(String)
 
+class SoilHealthCard(Base):
+    """Soil health card (SHC) test results; farmer names and phone numbers are not stored"""
+    __tablename__ = "soil_health_cards"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    test_id = Column(String)
+    district = Column(String)
+    mandal = Column(String)  # "Block" in SHC data
+    village = Column(String)
+    survey_number = Column(String)
+    latitude = Column(Float)
+    longitude = Column(Float)
+    ph = Column(Float)
+    ec = Column(Float)
+    oc = Column(Float)  # Organic carbon %
+    n = Column(Float)   # kg/ha
+    p = Column(Float)   # kg/ha
+    k = Column(Float)   # kg/ha
+    sample_date = Column(DateTime)
+
 class FarmerRecord(Base):
     __tablename__ = "farmer_records"
     
@@ -82,9 +141,75 @@ class FarmerRecord(Base):
     method_of_irrigation = Column(String)
     farming_type = Column(String)
 
+# Recommendation columns added after the first release, with their SQL types
+RECOMMENDATION_SUMMARY_COLUMNS = {
+    "crop": "VARCHAR",
+    "variety": "VARCHAR",
+    "current_stage": "VARCHAR",
+    "district": "VARCHAR",
+    "mandal": "VARCHAR",
+    "area_sown": "FLOAT",
+    "total_cost": "FLOAT",
+}
+
+def recommendation_summary(recommendation_data: dict) -> dict:
+    """Summary column values for a recommendation payload"""
+    return {
+        "crop": recommendation_data.get("crop"),
+        "variety": recommendation_data.get("variety"),
+        "current_stage": recommendation_data.get("current_stage"),
+        "district": recommendation_data.get("district"),
+        "mandal": recommendation_data.get("mandal"),
+        "area_sown": recommendation_data.get("area_sown"),
+        "total_cost": recommendation_data.get("total_cost"),
+    }
+
+def migrate_recommendation_summary():
+    """Add summary columns to an existing recommendations table and backfill them once"""
+    # create_all skips indexes on tables that already exist
+    for index in Recommendation.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+    
+    existing = {col["name"] for col in inspect(engine).get_columns("recommendations")}
+    missing = [name for name in RECOMMENDATION_SUMMARY_COLUMNS if name not in existing]
+    if not missing:
+        return
+    
+    with engine.begin() as conn:
+        for name in missing:
+            conn.execute(text(f"ALTER TABLE recommendations ADD COLUMN {name} {RECOMMENDATION_SUMMARY_COLUMNS[name]}"))
+        
+        rows = conn.execute(text("SELECT id, recommendation_json FROM recommendations")).all()
+        for rec_id, rec_json in rows:
+            try:
+                summary = recommendation_summary(json.loads(rec_json or "{}"))
+            except ValueError:
+                continue
+            conn.execute(
+                text("UPDATE recommendations SET crop = :crop, variety = :variety, "
+                     "current_stage = :current_stage, district = :district, mandal = :mandal, "
+                     "area_sown = :area_sown, total_cost = :total_cost WHERE id = :id"),
+                dict(summary, id=rec_id)
+            )
+    print(f"Added recommendation summary columns {missing} and backfilled {len(rows)} rows")
+
+def migrate_field_source():
+    """Add the source_record_id column and created_at index to an existing fields table"""
+    for index in Field.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+    
+    existing = {col["name"] for col in inspect(engine).get_columns("fields")}
+    if "source_record_id" in existing:
+        return
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE fields ADD COLUMN source_record_id INTEGER"))
+    print("Added fields.source_record_id column")
+
 # Create tables
 def init_db():
     Base.metadata.create_all(bind=engine)
+    migrate_recommendation_summary()
+    migrate_field_source()
 
 # Dependency to get DB session
 def get_db():
@@ -93,3 +218,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Dependency to get an async DB session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
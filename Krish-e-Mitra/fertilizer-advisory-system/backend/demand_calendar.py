@@ -0,0 +1,477 @@
+"""
+Mandal-level fertilizer demand calendar.
+Streams farmer_records and fields in chunks and, for every field, computes
+what calculate_stage_schedule would recommend today: the fertilizer engine
+gives the per-acre doses in bulk and each crop's schedule template splits them
+across stage application dates. Amounts are summed into
+(district, mandal, week, fertilizer) buckets.
+
+The calendar is kept in memory. farmer_records rows added since the last
+build are folded in by id (they come from a single ingest writer). API
+fields get ids in reserved blocks (write_behind), so a later commit can
+carry a lower id; they are folded in by created_at instead, re-reading the
+last DEMAND_FIELD_COMMIT_LAG seconds so rows committed shortly after their
+timestamp are not missed. Fields generated from farmer_records by a batch
+advisory are already counted as records and are left out. Everything is
+rebuilt when the day or the knowledge base version changes. Rows with an
+unknown or missing crop are computed with the engine's default (rice)
+values, as the rules engine does; rows missing a location, area or sowing
+date are counted as skipped.
+
+The API serves the last built calendar; DemandCalendarRefresher keeps it
+current in the background.
+
+    python demand_calendar.py --output demand.csv --mandal TIRUVURU
+"""
+
+import argparse
+import csv
+import io
+import os
+import threading
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from crop_model import SCHEDULE_CROP_NAMES
+from database import SessionLocal, FarmerRecord, Field
+from fertilizer_engine import compute_batch, engine_tables
+from knowledge_base import KnowledgeBase, get_knowledge_base
+from reference_catalog import resolve_crop_name
+from rules_engine import get_soil_parameters
+from stage_calculator import SPLIT_FERTILIZERS, get_schedule_template, get_nutrient_from_fertilizer
+
+# Rows read and computed per chunk
+DEMAND_CHUNK_SIZE = int(os.getenv("DEMAND_CHUNK_SIZE", "50000"))
+
+# Rows that feed the calendar: e-panta records and fields entered through the API
+DEMAND_SOURCES = ("records", "fields")
+
+# Seconds of fields re-read on each refresh (write-behind commits lag created_at by about this much at most)
+DEMAND_FIELD_COMMIT_LAG = float(os.getenv("DEMAND_FIELD_COMMIT_LAG", "600"))
+
+# Seconds between background refreshes of the served calendar (0 disables the refresher)
+DEMAND_REFRESH_INTERVAL = float(os.getenv("DEMAND_REFRESH_INTERVAL", "60"))
+
+# Weeks listed by default, starting with the current one
+DEMAND_HORIZON_WEEKS = int(os.getenv("DEMAND_HORIZON_WEEKS", "26"))
+
+# Order of fertilizers in bucket keys (the fertilizer supplying N, P, K in schedules)
+SCHEDULE_FERTILIZERS = tuple(SPLIT_FERTILIZERS[nutrient][0] for nutrient in ("N", "P", "K"))
+
+CSV_COLUMNS = ("district", "mandal", "week_start", "fertilizer", "amount_kg", "bags")
+
+_calendar: Optional["DemandCalendar"] = None
+_calendar_lock = threading.Lock()
+
+
+class SourcePart(NamedTuple):
+    """Demand from one source"""
+    totals: Dict[Tuple[str, str, date, str], float]
+    # Last farmer_records id folded in, or the newest fields created_at
+    watermark: Any
+    fields: int
+    skipped: int
+    # Fields ids folded in within DEMAND_FIELD_COMMIT_LAG of the watermark
+    recent: FrozenSet[int] = frozenset()
+
+
+class DemandCalendar(NamedTuple):
+    as_of: date
+    version: str  # knowledge base version the amounts were computed with
+    sources: Tuple[str, ...]
+    # (district, mandal, week start (Monday), fertilizer) -> kg
+    totals: Dict[Tuple[str, str, date, str], float]
+    parts: Dict[str, SourcePart]
+    fields: int
+    skipped: int
+
+
+def usable_row(row: Tuple) -> bool:
+    """A field row has a location, a positive area and a sowing date"""
+    return bool(row[0] and row[1] and row[4] and row[4] > 0 and row[5])
+
+
+def week_start(ordinal: np.ndarray) -> np.ndarray:
+    """Ordinal of the Monday starting each day's week (ordinal 1 is a Monday)"""
+    return ordinal - (ordinal - 1) % 7
+
+
+def aggregate_fields(
+    kb: KnowledgeBase,
+    rows: Sequence[Tuple[str, str, Optional[str], str, float, datetime]],
+    as_of: date
+) -> Dict[Tuple[str, str, date, str], float]:
+    """
+    Scheduled fertilizer per (district, mandal, week, fertilizer) for a chunk of fields.
+
+    Args:
+        kb: Knowledge base snapshot
+        rows: (district, mandal, village, crop_name, area_sown, sowing_date) per field;
+            rows missing a location, area or sowing date are skipped, unknown
+            or missing crops use the default crop
+        as_of: Date whose crop stage (and so whose recommendation) is scheduled
+
+    Returns:
+        Bucket totals in kg
+    """
+    rows = [row for row in rows if usable_row(row)]
+    if not rows:
+        return {}
+
+    locations: Dict[Tuple[str, str], int] = {}
+    soil_cache: Dict[Tuple, Tuple[float, float, float]] = {}
+    count = len(rows)
+    location_ids = np.empty(count, dtype=np.int64)
+    sowing = np.empty(count, dtype=np.int64)
+    area = np.empty(count)
+    soil = np.empty((count, 3))
+    crop_names = []
+    for i, (district, mandal, village, crop_name, area_sown, sowing_date) in enumerate(rows):
+        location_ids[i] = locations.setdefault((district, mandal), len(locations))
+        soil_key = (district, mandal, village)
+        levels = soil_cache.get(soil_key)
+        if levels is None:
+            params = get_soil_parameters(None, district, mandal, village)
+            levels = soil_cache[soil_key] = (params["N"], params["P"], params["K"])
+        soil[i] = levels
+        sowing[i] = sowing_date.toordinal()
+        area[i] = area_sown
+        crop_names.append(crop_name or "")
+
+    # Doses for the stage on `as_of` (what the rules engine recommends), then total N/P/K
+    result = compute_batch(
+        kb.model, crop_names, as_of.toordinal() - sowing, area,
+        soil[:, 0], soil[:, 1], soil[:, 2]
+    )
+    default_set = engine_tables(kb.model)[1]
+    fractions = np.array([
+        [get_nutrient_from_fertilizer(name)[n] for n in ("N", "P", "K")] for name in default_set.names
+    ])
+    npk = result.amount @ fractions
+
+    # Split over each crop's schedule stages
+    templates = {}
+    template_ids = np.empty(count, dtype=np.int64)
+    by_crop = {}
+    for i, crop_name in enumerate(crop_names):
+        template_id = by_crop.get(crop_name)
+        if template_id is None:
+            template = get_schedule_template(SCHEDULE_CROP_NAMES.get(crop_name, crop_name), kb.stage_tables)
+            template_id = by_crop[crop_name] = templates.setdefault(template, len(templates))
+        template_ids[i] = template_id
+
+    keys = []
+    amounts = []
+    for template, template_id in templates.items():
+        members = np.flatnonzero(template_ids == template_id)
+        for stage in template.stages:
+            weeks = week_start(sowing[members] + stage.days)
+            for nutrient, ratio in stage.splits:
+                column = "NPK".index(nutrient)
+                kg = npk[members, column] * ratio / SPLIT_FERTILIZERS[nutrient][2]
+                applied = kg > 0
+                keys.append((location_ids[members[applied]] << 22 | weeks[applied]) << 2 | column)
+                amounts.append(kg[applied])
+
+    if not keys:
+        return {}
+    unique_keys, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+    sums = np.bincount(inverse, weights=np.concatenate(amounts))
+
+    location_names = list(locations)
+    totals = {}
+    for key, kg in zip(unique_keys.tolist(), sums.tolist()):
+        district, mandal = location_names[key >> 24]
+        bucket = (district, mandal, date.fromordinal((key >> 2) & ((1 << 22) - 1)), SCHEDULE_FERTILIZERS[key & 3])
+        totals[bucket] = kg
+    return totals
+
+
+def _record_chunks(db: Session, after_id: int):
+    statement = select(
+        FarmerRecord.id, FarmerRecord.district, FarmerRecord.mandal, FarmerRecord.village,
+        FarmerRecord.crop_name, FarmerRecord.area_sown, FarmerRecord.date_of_sowing
+    ).where(FarmerRecord.id > after_id).order_by(FarmerRecord.id)
+    resolved = {}
+    for chunk in db.execute(statement.execution_options(yield_per=DEMAND_CHUNK_SIZE)).partitions():
+        rows = []
+        for record_id, district, mandal, village, crop_name, area_sown, sowing_date in chunk:
+            crop = resolved.get(crop_name)
+            if crop is None:
+                crop = resolved[crop_name] = resolve_crop_name(crop_name) or ""
+            rows.append((district, mandal, village, crop, area_sown, sowing_date))
+        yield chunk[-1][0], rows, None
+
+
+def _field_chunks(db: Session, part: SourcePart, lag: timedelta):
+    """
+    Yield (watermark, rows, recent) for fields not yet in `part`.
+
+    Rows created within `lag` of the part's watermark are read again and
+    skipped when already folded in; a final empty chunk carries the ids
+    folded in within `lag` of the new watermark.
+    """
+    statement = select(
+        Field.id, Field.location, Field.crop_type, Field.area_sown, Field.sowing_date, Field.created_at
+    ).where(Field.source_record_id.is_(None)).order_by(Field.created_at, Field.id)
+    if part.watermark:
+        statement = statement.where(Field.created_at >= part.watermark - lag)
+    watermark = part.watermark
+    window = []
+    for chunk in db.execute(statement.execution_options(yield_per=DEMAND_CHUNK_SIZE)).partitions():
+        rows = []
+        for field_id, location, crop_type, area_sown, sowing_date, created_at in chunk:
+            if created_at is not None:
+                watermark = created_at
+                window.append((created_at, field_id))
+            if field_id in part.recent:
+                continue
+            # Stored as "<mandal>, <district>"
+            mandal, _, district = (location or "").rpartition(", ")
+            rows.append((district, mandal, None, crop_type, area_sown, sowing_date))
+        # Rows arrive in created_at order, so only the tail can stay in the window
+        window = [entry for entry in window if watermark - entry[0] <= lag]
+        yield watermark, rows, None
+    yield watermark, [], frozenset(field_id for _, field_id in window)
+
+
+def _fold(kb: KnowledgeBase, as_of: date, chunks, part: SourcePart) -> SourcePart:
+    """Add (watermark, rows, recent) chunks to a copy of a source part (recent None: unchanged)"""
+    totals = dict(part.totals)
+    watermark, count, skipped, recent = part.watermark, part.fields, part.skipped, part.recent
+    for watermark, rows, chunk_recent in chunks:
+        if chunk_recent is not None:
+            recent = chunk_recent
+        usable = [row for row in rows if usable_row(row)]
+        for bucket, kg in aggregate_fields(kb, usable, as_of).items():
+            totals[bucket] = totals.get(bucket, 0.0) + kg
+        count += len(usable)
+        skipped += len(rows) - len(usable)
+    return SourcePart(totals, watermark, count, skipped, recent)
+
+
+def build_demand_calendar(
+    db: Session,
+    as_of: date = None,
+    kb: KnowledgeBase = None,
+    sources: Iterable[str] = DEMAND_SOURCES,
+    base: Optional[DemandCalendar] = None
+) -> DemandCalendar:
+    """
+    Aggregate fields into a demand calendar, one chunk at a time.
+
+    Args:
+        db: Database session
+        as_of: Date the recommendations are computed for (default: today)
+        kb: Knowledge base snapshot (default: current version)
+        sources: Any of "records" (farmer_records) and "fields"
+        base: Calendar to extend (copied, never modified): records and fields
+            added after it are folded in
+
+    Returns:
+        New DemandCalendar
+    """
+    as_of = as_of or date.today()
+    kb = kb or get_knowledge_base()
+    sources = tuple(sources)
+    lag = timedelta(seconds=DEMAND_FIELD_COMMIT_LAG)
+    parts = {}
+    for source in sources:
+        part = base.parts.get(source) if base else None
+        if source == "records":
+            part = part or SourcePart({}, 0, 0, 0)
+            parts[source] = _fold(kb, as_of, _record_chunks(db, part.watermark), part)
+        else:
+            part = part or SourcePart({}, None, 0, 0)
+            parts[source] = _fold(kb, as_of, _field_chunks(db, part, lag), part)
+
+    totals = {}
+    for part in parts.values():
+        for bucket, kg in part.totals.items():
+            totals[bucket] = totals.get(bucket, 0.0) + kg
+    return DemandCalendar(
+        as_of, kb.version, sources, totals, parts,
+        sum(part.fields for part in parts.values()), sum(part.skipped for part in parts.values())
+    )
+
+
+def _records_went_backwards(db: Session, calendar: DemandCalendar) -> bool:
+    part = calendar.parts.get("records")
+    if part is None:
+        return False
+    last_record_id = db.execute(select(func.max(FarmerRecord.id))).scalar() or 0
+    return last_record_id < part.watermark
+
+
+def refresh_demand_calendar(db: Session = None, full: bool = False) -> DemandCalendar:
+    """
+    Fold rows added since the last build into the calendar.
+
+    Rebuilds from scratch with full=True, on a new day, after a knowledge
+    base reload, or when record ids went backwards (records replaced by an ingest).
+    Builds are serialized; readers keep getting the previous calendar meanwhile.
+    """
+    global _calendar
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
+    try:
+        with _calendar_lock:
+            base = _calendar
+            kb = get_knowledge_base()
+            if full or base is None or base.as_of != date.today() or base.version != kb.version \
+                    or _records_went_backwards(db, base):
+                base = None
+            calendar = build_demand_calendar(db, kb=kb, base=base)
+            _calendar = calendar
+    finally:
+        if own_session:
+            db.close()
+    return calendar
+
+
+def current_demand_calendar() -> DemandCalendar:
+    """The last built calendar, building it only if there is none yet"""
+    calendar = _calendar
+    return calendar if calendar is not None else refresh_demand_calendar()
+
+
+class DemandCalendarRefresher:
+    """Background thread that folds new rows into the served demand calendar"""
+
+    def __init__(self, interval: float = DEMAND_REFRESH_INTERVAL):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running or self.interval <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="demand-calendar-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        if not self.running:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self) -> None:
+        # Build once right away so the first request does not have to
+        while True:
+            try:
+                refresh_demand_calendar()
+            except Exception as e:
+                print(f"Error refreshing demand calendar: {e!r}")
+            if self._stop.wait(self.interval):
+                return
+
+
+demand_calendar_refresher = DemandCalendarRefresher()
+
+
+def demand_rows(
+    calendar: DemandCalendar,
+    district: str = None,
+    mandal: str = None,
+    fertilizer: str = None,
+    start: date = None,
+    end: date = None
+) -> List[Dict[str, Any]]:
+    """
+    Calendar buckets matching a filter, sorted by location, week and fertilizer.
+
+    Without `start` the listing begins with the week of calendar.as_of (earlier
+    seasons' applications are past); without `end` it covers DEMAND_HORIZON_WEEKS.
+    """
+    fertilizers = get_knowledge_base().model.fertilizers
+    if start is None:
+        start = date.fromordinal(week_start(calendar.as_of.toordinal()))
+    if end is None:
+        end = start + timedelta(weeks=DEMAND_HORIZON_WEEKS) - timedelta(days=1)
+    rows = []
+    for (bucket_district, bucket_mandal, week, name), kg in sorted(calendar.totals.items()):
+        if (district and bucket_district != district) or (mandal and bucket_mandal != mandal) \
+                or (fertilizer and name != fertilizer) or (start and week < start) or (end and week > end):
+            continue
+        bag_weight = fertilizers[name].bag_weight if name in fertilizers else 50
+        rows.append({
+            "district": bucket_district,
+            "mandal": bucket_mandal,
+            "week_start": week.isoformat(),
+            "fertilizer": name,
+            "amount_kg": round(kg, 2),
+            "bags": round(kg / bag_weight, 1)
+        })
+    return rows
+
+
+def demand_csv(rows: List[Dict[str, Any]]) -> str:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS)
+    writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+def demand_parquet(rows: List[Dict[str, Any]]) -> bytes:
+    """Parquet file contents (needs pandas and pyarrow)"""
+    import pandas as pd
+
+    buffer = io.BytesIO()
+    pd.DataFrame(rows, columns=CSV_COLUMNS).to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Weekly fertilizer demand per mandal")
+    parser.add_argument("--district", help="Only this district")
+    parser.add_argument("--mandal", help="Only this mandal")
+    parser.add_argument("--fertilizer", help="Only this fertilizer (Urea, DAP or MOP)")
+    parser.add_argument("--as-of", help="Compute recommendations for this date (YYYY-MM-DD, default today)")
+    parser.add_argument("--start", help="First week to list (YYYY-MM-DD, default the --as-of week)")
+    parser.add_argument("--end", help=f"Last week to list (YYYY-MM-DD, default {DEMAND_HORIZON_WEEKS} weeks on)")
+    parser.add_argument("--source", choices=DEMAND_SOURCES, action="append",
+                        help="Only farmer records or API fields (default both)")
+    parser.add_argument("--output", help="Write to this .csv or .parquet file instead of stdout")
+    args = parser.parse_args(argv)
+
+    as_of, start, end = (
+        datetime.strptime(value, "%Y-%m-%d").date() if value else None
+        for value in (args.as_of, args.start, args.end)
+    )
+    db = SessionLocal()
+    try:
+        started = datetime.now()
+        calendar = build_demand_calendar(db, as_of, sources=args.source or DEMAND_SOURCES)
+        elapsed = (datetime.now() - started).total_seconds()
+    finally:
+        db.close()
+    print(f"Aggregated {calendar.fields} fields into {len(calendar.totals)} buckets in {elapsed:.2f}s "
+          f"({calendar.skipped} skipped: no location, area or sowing date)")
+
+    rows = demand_rows(calendar, args.district, args.mandal, args.fertilizer, start, end)
+    if not args.output:
+        print(demand_csv(rows), end="")
+    elif args.output.endswith(".parquet"):
+        with open(args.output, "wb") as f:
+            f.write(demand_parquet(rows))
+        print(f"Wrote {args.output}")
+    else:
+        with open(args.output, "w", encoding="utf-8", newline="") as f:
+            f.write(demand_csv(rows))
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""
+Vectorized fertilizer computation.
+Nutrient requirements, soil levels and fertilizer compositions are held as
+NumPy arrays so recommendations for many fields are computed in a handful
+of array operations. The single-field rules engine goes through the same code
+with a batch of one.
+
+A fertilizer set is an ordered dosing plan: each fertilizer is dosed for one
+target nutrient, and whatever it also supplies (e.g. the N in DAP) is
+credited before later fertilizers are dosed. List complexes and DAP before
+Urea to take that credit.
+"""
+
+from typing import Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from crop_model import CropModel, Crop, DEFAULT_REQUIREMENT, PRIMARY_FERTILIZERS, dose_timing
+from stage_calculator import get_nutrient_from_fertilizer
+
+NUTRIENTS = ("N", "P", "K")
+NUTRIENT_INDEX = {nutrient: index for index, nutrient in enumerate(NUTRIENTS)}
+
+# Day ranges used for crops not in crop_data.json (see rules_engine.calculate_crop_stage)
+GENERIC_STAGES = (
+    ("not_sown", -np.inf, -1),
+    ("vegetative", 0, 30),
+    ("flowering", 31, 60),
+    ("ripening", 61, np.inf)
+)
+# Stage used when days after sowing fall outside every defined range
+FALLBACK_STAGE = "ripening"
+
+
+class FertilizerSet(NamedTuple):
+    names: Tuple[str, ...]
+    telugu_names: Tuple[str, ...]
+    targets: np.ndarray      # (F,) index of the nutrient each fertilizer is dosed for
+    composition: np.ndarray  # (F, 3) N/P/K content in percent
+    prices: np.ndarray       # (F,) price per kg
+
+
+class EngineTables(NamedTuple):
+    """Crop model as arrays; row len(crops) stands for any unknown crop"""
+    crop_index: Mapping[str, int]
+    stage_names: Tuple[str, ...]
+    starts: np.ndarray          # (C+1, S) first day of each stage, padded with +inf
+    ends: np.ndarray            # (C+1, S) last day of each stage
+    stage_ids: np.ndarray       # (C+1, S) index into stage_names
+    fallback_stage: np.ndarray  # (C+1,) stage when no range matches
+    requirement: np.ndarray     # (C+1, len(stage_names), 3) kg nutrient per acre
+    thresholds: np.ndarray      # (3,) soil level below which a nutrient is applied
+
+
+class BatchResult(NamedTuple):
+    stage: np.ndarray            # (N,) index into EngineTables.stage_names
+    applied: np.ndarray          # (N, F) fertilizer recommended (soil deficient in its target)
+    amount_per_acre: np.ndarray  # (N, F) kg per acre
+    amount: np.ndarray           # (N, F) kg for the whole field
+    cost: np.ndarray             # (N, F)
+    total_cost: np.ndarray       # (N,)
+
+
+def straight_fertilizer_set(model: CropModel) -> FertilizerSet:
+    """Urea/DAP/MOP with the single-nutrient percentages from crop_data.json"""
+    fertilizers = [model.fertilizers[name] for _, name in PRIMARY_FERTILIZERS]
+    composition = np.zeros((len(fertilizers), 3))
+    for row, fertilizer in enumerate(fertilizers):
+        composition[row, NUTRIENT_INDEX[fertilizer.nutrient]] = fertilizer.percentage
+    return FertilizerSet(
+        names=tuple(f.name for f in fertilizers),
+        telugu_names=tuple(f.telugu_name for f in fertilizers),
+        targets=np.array([NUTRIENT_INDEX[nutrient] for nutrient, _ in PRIMARY_FERTILIZERS]),
+        composition=composition,
+        prices=np.array([f.price_per_kg for f in fertilizers], dtype=float)
+    )
+
+
+def fertilizer_set(
+    model: CropModel,
+    plan: Sequence[Tuple[str, str]],
+    prices: Optional[Mapping[str, float]] = None
+) -> FertilizerSet:
+    """
+    Build a dosing plan from fertilizer names, e.g. [("DAP", "P"), ("MOP", "K"), ("Urea", "N")].
+
+    Compositions come from stage_calculator.get_nutrient_from_fertilizer, so
+    SSP, complexes and grades such as 19:19:19 work. Prices default to
+    crop_data.json, then 0 for fertilizers it does not list.
+    """
+    prices = prices or {}
+    composition = np.zeros((len(plan), 3))
+    for row, (name, nutrient) in enumerate(plan):
+        content = get_nutrient_from_fertilizer(name)
+        composition[row] = [round(content[n] * 100, 6) for n in NUTRIENTS]
+        if composition[row, NUTRIENT_INDEX[nutrient]] <= 0:
+            raise ValueError(f"{name} contains no {nutrient}")
+
+    known = model.fertilizers
+    return FertilizerSet(
+        names=tuple(name for name, _ in plan),
+        telugu_names=tuple(known[name].telugu_name if name in known else name for name, _ in plan),
+        targets=np.array([NUTRIENT_INDEX[nutrient] for _, nutrient in plan]),
+        composition=composition,
+        prices=np.array([
+            prices.get(name, known[name].price_per_kg if name in known else 0.0)
+            for name, _ in plan
+        ], dtype=float)
+    )
+
+
+def compile_engine_tables(model: CropModel) -> EngineTables:
+    crops = list(model.crops.values())
+    stage_names = []
+    for stage_name in [s.name for crop in crops for s in crop.stages] + [s[0] for s in GENERIC_STAGES]:
+        if stage_name not in stage_names:
+            stage_names.append(stage_name)
+    if FALLBACK_STAGE not in stage_names:
+        stage_names.append(FALLBACK_STAGE)
+    stage_position = {name: index for index, name in enumerate(stage_names)}
+
+    width = max([len(crop.stages) for crop in crops] + [len(GENERIC_STAGES)])
+    rows = len(crops) + 1
+    starts = np.full((rows, width), np.inf)
+    ends = np.full((rows, width), -np.inf)
+    stage_ids = np.zeros((rows, width), dtype=np.intp)
+    requirement = np.empty((rows, len(stage_names), 3))
+    requirement[:] = [DEFAULT_REQUIREMENT[n] for n in NUTRIENTS]
+
+    def fill(row: int, crop: Crop, ranges):
+        for column, (stage_name, start, end) in enumerate(ranges):
+            starts[row, column], ends[row, column] = start, end
+            stage_ids[row, column] = stage_position[stage_name]
+        for stage in crop.stages:
+            requirement[row, stage_position[stage.name]] = stage.requirement
+
+    for row, crop in enumerate(crops):
+        fill(row, crop, [(s.name, s.start_day, s.end_day) for s in crop.stages])
+    # Unknown crops: generic day ranges with the default crop's requirements
+    fill(len(crops), model.default_crop, GENERIC_STAGES)
+
+    return EngineTables(
+        crop_index={crop.name: row for row, crop in enumerate(crops)},
+        stage_names=tuple(stage_names),
+        starts=starts,
+        ends=ends,
+        stage_ids=stage_ids,
+        fallback_stage=np.full(rows, stage_position[FALLBACK_STAGE], dtype=np.intp),
+        requirement=requirement,
+        thresholds=np.array([model.thresholds[n] for n in NUTRIENTS], dtype=float)
+    )
+
+
+class _ModelEntry(NamedTuple):
+    model: CropModel
+    tables: EngineTables
+    default_set: FertilizerSet
+    field_doses: Dict[Tuple, Tuple[Dict, ...]]  # single-field results with the default set
+
+
+_current: Optional[_ModelEntry] = None
+
+
+def _model_entry(model: CropModel) -> _ModelEntry:
+    global _current
+    entry = _current
+    if entry is None or entry.model is not model:
+        entry = _current = _ModelEntry(
+            model, compile_engine_tables(model), straight_fertilizer_set(model), {}
+        )
+    return entry
+
+
+def engine_tables(model: CropModel) -> Tuple[EngineTables, FertilizerSet]:
+    """Tables and default fertilizer set for a crop model, compiled once per model"""
+    entry = _model_entry(model)
+    return entry.tables, entry.default_set
+
+
+def crop_indices(tables: EngineTables, crop_names: Sequence[str]) -> np.ndarray:
+    unknown = len(tables.crop_index)
+    return np.array([tables.crop_index.get(name, unknown) for name in crop_names], dtype=np.intp)
+
+
+def lookup_stages(tables: EngineTables, crops: np.ndarray, days_after_sowing: np.ndarray) -> np.ndarray:
+    """Stage index for every field (vectorized bisect over each crop's sorted stage starts)"""
+    days = np.asarray(days_after_sowing, dtype=float)
+    position = (tables.starts[crops] <= days[:, None]).sum(axis=1) - 1
+    clipped = np.maximum(position, 0)
+    matched = (position >= 0) & (days <= tables.ends[crops, clipped])
+    return np.where(matched, tables.stage_ids[crops, clipped], tables.fallback_stage[crops])
+
+
+def compute_doses(
+    requirement: np.ndarray,
+    soil: np.ndarray,
+    thresholds: np.ndarray,
+    fertilizers: FertilizerSet
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Per-acre fertilizer amounts for a batch of fields.
+
+    Args:
+        requirement: (N, 3) kg N/P/K per acre needed at the current stage
+        soil: (N, 3) soil N/P/K levels
+        thresholds: (3,) soil level below which a nutrient is applied
+        fertilizers: Dosing plan
+
+    Returns:
+        Tuple of (applied, amount_per_acre), both (N, F)
+    """
+    deficient = soil < thresholds
+    remaining = np.where(deficient, requirement, 0.0)
+    amounts = np.zeros((requirement.shape[0], len(fertilizers.names)))
+    for column, target in enumerate(fertilizers.targets):
+        content = fertilizers.composition[column]
+        amount = np.maximum(remaining[:, target], 0.0) * 100 / content[target]
+        amounts[:, column] = amount
+        remaining -= amount[:, None] * content / 100
+    return deficient[:, fertilizers.targets], amounts
+
+
+def compute_batch(
+    model: CropModel,
+    crop_names: Sequence[str],
+    days_after_sowing: np.ndarray,
+    area_sown: np.ndarray,
+    soil_n: np.ndarray,
+    soil_p: np.ndarray,
+    soil_k: np.ndarray,
+    fertilizers: Optional[FertilizerSet] = None
+) -> BatchResult:
+    """
+    Fertilizer recommendations for N fields, one array per input column.
+
+    Args:
+        model: Compiled crop model
+        crop_names: Crop name per field (crop_data.json keys; others use default values)
+        days_after_sowing: Days since sowing per field
+        area_sown: Area in acres per field
+        soil_n, soil_p, soil_k: Soil nutrient levels per field
+        fertilizers: Dosing plan (default: Urea/DAP/MOP as in crop_data.json)
+
+    Returns:
+        BatchResult with stage, per-fertilizer amounts and costs
+    """
+    tables, default_set = engine_tables(model)
+    fertilizers = fertilizers or default_set
+    crops = crop_indices(tables, crop_names)
+    stages = lookup_stages(tables, crops, days_after_sowing)
+    requirement = tables.requirement[crops, stages]
+    soil = np.column_stack([soil_n, soil_p, soil_k]).astype(float)
+
+    applied, per_acre = compute_doses(requirement, soil, tables.thresholds, fertilizers)
+    area = np.asarray(area_sown, dtype=float)[:, None]
+    amount = per_acre * area
+    cost = np.where(applied, amount * fertilizers.prices, 0.0)
+    return BatchResult(stages, applied, per_acre, amount, cost, cost.sum(axis=1))
+
+
+def field_doses(
+    model: CropModel,
+    crop: Crop,
+    stage_name: str,
+    soil_params: Mapping[str, float],
+    fertilizers: Optional[FertilizerSet] = None
+) -> List[Dict]:
+    """
+    Per-acre fertilizer entries for one field at a known stage (a batch of one).
+
+    With the default fertilizer set the result only depends on the crop, the
+    stage and which nutrients are deficient, so it is memoized on those.
+    """
+    entry = _model_entry(model)
+    deficient = tuple(soil_params[n] < model.thresholds[n] for n in NUTRIENTS)
+    key = (crop.name, stage_name, deficient)
+    if fertilizers is None:
+        cached = entry.field_doses.get(key)
+        if cached is not None:
+            return [dict(dose) for dose in cached]
+
+    plan = fertilizers or entry.default_set
+    stage = crop.stages_by_name.get(stage_name)
+    requirement = stage.requirement if stage is not None else tuple(DEFAULT_REQUIREMENT[n] for n in NUTRIENTS)
+    applied, per_acre = compute_doses(
+        np.array([requirement], dtype=float),
+        np.array([[soil_params[n] for n in NUTRIENTS]], dtype=float),
+        entry.tables.thresholds,
+        plan
+    )
+
+    doses = []
+    for column, name in enumerate(plan.names):
+        if not applied[0, column]:
+            continue
+        nutrient = NUTRIENTS[plan.targets[column]]
+        amount = float(per_acre[0, column])
+        doses.append({
+            "type": name,
+            "name": name,
+            "telugu_name": plan.telugu_names[column],
+            "amount_per_acre": amount,
+            "timing": dose_timing(stage_name, nutrient),
+            "cost_per_acre": amount * float(plan.prices[column]),
+            "nutrient": nutrient
+        })
+
+    if fertilizers is None:
+        entry.field_doses[key] = tuple(doses)
+    return [dict(dose) for dose in doses]
@@ -0,0 +1,143 @@
+"""
+Recommendation history queries.
+Keyset pagination over (farmer_id, created_at, id) that reads only the summary
+columns; the full recommendation_json is loaded only for a single detail view.
+
+Recommendations accepted but still queued by the write-behind writer are
+merged in from `pending` (RecommendationWriter.pending_for), so they show up
+before their commit. Only the worker that accepted a request has its pending
+entries; on another worker it appears once committed (within the flush
+interval).
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import Recommendation, recommendation_summary
+
+HISTORY_PAGE_SIZE = 10
+MAX_HISTORY_PAGE_SIZE = 100
+
+SUMMARY_COLUMNS = (
+    Recommendation.id,
+    Recommendation.created_at,
+    Recommendation.crop,
+    Recommendation.variety,
+    Recommendation.current_stage,
+    Recommendation.district,
+    Recommendation.mandal,
+    Recommendation.area_sown,
+    Recommendation.total_cost,
+)
+
+
+def encode_history_cursor(created_at: datetime, rec_id: int) -> str:
+    """Opaque cursor pointing just after the given row"""
+    raw = f"{created_at.isoformat()}|{rec_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_history_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_history_cursor; raises ValueError for malformed cursors"""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        created_at, rec_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(created_at), int(rec_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid history cursor") from e
+
+
+def pending_rows(pending: Iterable[tuple]) -> List[Dict]:
+    """Summary rows, shaped like SUMMARY_COLUMNS results, for queued write-behind entries"""
+    return [
+        dict(recommendation_summary(data), id=recommendation_id, created_at=created_at)
+        for _, _, recommendation_id, _, data, created_at in pending
+    ]
+
+
+async def fetch_history_page(
+    db: AsyncSession,
+    farmer_id: int,
+    limit: int = HISTORY_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    pending: Iterable[tuple] = ()
+) -> Dict:
+    """
+    Get one page of a farmer's recommendation summaries, newest first.
+
+    Args:
+        pending: The farmer's queued write-behind entries, read before the query
+            (an entry committed in between is then in both and kept once)
+
+    Returns:
+        Dictionary with "history" (summaries) and "next_cursor" (None on the last page)
+    """
+    limit = max(1, min(limit, MAX_HISTORY_PAGE_SIZE))
+    query = select(*SUMMARY_COLUMNS).where(Recommendation.farmer_id == farmer_id)
+    extra = pending_rows(pending)
+
+    if cursor:
+        created_at, rec_id = decode_history_cursor(cursor)
+        query = query.where(or_(
+            Recommendation.created_at < created_at,
+            and_(Recommendation.created_at == created_at, Recommendation.id < rec_id)
+        ))
+        extra = [row for row in extra if (row["created_at"], row["id"]) < (created_at, rec_id)]
+
+    rows = [row._asdict() for row in (await db.execute(
+        query.order_by(Recommendation.created_at.desc(), Recommendation.id.desc()).limit(limit + 1)
+    )).all()]
+    if extra:
+        committed = {row["id"] for row in rows}
+        rows.extend(row for row in extra if row["id"] not in committed)
+        rows.sort(key=lambda row: (row["created_at"], row["id"]), reverse=True)
+
+    history: List[Dict] = []
+    for row in rows[:limit]:
+        history.append({
+            "id": row["id"],
+            "crop": row["crop"],
+            "variety": row["variety"],
+            "current_stage": row["current_stage"],
+            "district": row["district"],
+            "mandal": row["mandal"],
+            "area_sown": row["area_sown"],
+            "total_cost": row["total_cost"],
+            "created_at": row["created_at"].strftime("%Y-%m-%d %H:%M:%S"),
+        })
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_history_cursor(last["created_at"], last["id"])
+
+    return {"history": history, "next_cursor": next_cursor}
+
+
+async def fetch_history_detail(
+    db: AsyncSession,
+    farmer_id: int,
+    rec_id: int,
+    pending: Iterable[tuple] = ()
+) -> Optional[Dict]:
+    """Get the full stored (or still queued) recommendation, or None if it does not belong to the farmer"""
+    for _, _, recommendation_id, _, data, created_at in pending:
+        if recommendation_id == rec_id:
+            return dict(data, id=rec_id, created_at=created_at.strftime("%Y-%m-%d %H:%M:%S"))
+
+    row = (await db.execute(
+        select(Recommendation.recommendation_json, Recommendation.created_at)
+        .where(Recommendation.id == rec_id, Recommendation.farmer_id == farmer_id)
+    )).first()
+    if row is None:
+        return None
+
+    rec_data = json.loads(row.recommendation_json)
+    rec_data["id"] = rec_id
+    rec_data["created_at"] = row.created_at.strftime("%Y-%m-%d %H:%M:%S")
+    return rec_data
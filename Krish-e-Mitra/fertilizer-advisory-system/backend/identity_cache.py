@@ -0,0 +1,84 @@
+"""
+Farmer identity cache.
+Maps a mobile number to the farmer's id, profile and language so hot-path
+handlers skip the farmers table lookup.
+"""
+
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from cache import TTLCache, MISSING
+from database import Farmer, Recommendation
+
+FARMER_CACHE = TTLCache(
+    maxsize=int(os.getenv("FARMER_CACHE_SIZE", "50000")),
+    ttl=int(os.getenv("FARMER_CACHE_TTL", "3600")),
+    name="farmer"
+)
+
+# Farmers with a recommendation in this many days are loaded at startup
+WARM_ACTIVE_DAYS = int(os.getenv("FARMER_CACHE_WARM_DAYS", "7"))
+
+
+def farmer_identity(farmer: Farmer) -> Dict:
+    """Cacheable copy of a Farmer row (matches FarmerResponse)"""
+    return {
+        "id": farmer.id,
+        "mobile": farmer.mobile,
+        "name": farmer.name,
+        "district": farmer.district,
+        "mandal": farmer.mandal,
+        "language_preference": farmer.language_preference
+    }
+
+
+def cache_farmer(farmer: Farmer) -> Dict:
+    identity = farmer_identity(farmer)
+    FARMER_CACHE.set(farmer.mobile, identity)
+    return identity
+
+
+def invalidate_farmer(mobile: str) -> None:
+    """Drop a cached identity; call on registration and any profile change"""
+    FARMER_CACHE.pop(mobile)
+
+
+def get_farmer_identity(db: Session, mobile: str) -> Optional[Dict]:
+    """Get a farmer's identity by mobile number, from cache when possible"""
+    identity = FARMER_CACHE.get(mobile)
+    if identity is not MISSING:
+        return identity
+
+    farmer = db.scalar(select(Farmer).where(Farmer.mobile == mobile))
+    if farmer is None:
+        return None
+    return cache_farmer(farmer)
+
+
+async def async_get_farmer_identity(db: AsyncSession, mobile: str) -> Optional[Dict]:
+    """Non-blocking get_farmer_identity for async handlers"""
+    identity = FARMER_CACHE.get(mobile)
+    if identity is not MISSING:
+        return identity
+
+    farmer = await db.scalar(select(Farmer).where(Farmer.mobile == mobile))
+    if farmer is None:
+        return None
+    return cache_farmer(farmer)
+
+
+def warm_farmer_cache(db: Session, days: int = WARM_ACTIVE_DAYS) -> int:
+    """Load recently active farmers into the cache; returns how many were loaded"""
+    since = datetime.utcnow() - timedelta(days=days)
+    active_ids = select(Recommendation.farmer_id).where(Recommendation.created_at >= since).distinct()
+    farmers = db.scalars(
+        select(Farmer).where(Farmer.id.in_(active_ids)).limit(FARMER_CACHE.maxsize)
+    ).all()
+    for farmer in farmers:
+        cache_farmer(farmer)
+    return len(farmers)
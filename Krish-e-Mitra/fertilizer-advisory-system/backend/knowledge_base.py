@@ -0,0 +1,238 @@
+"""
+Versioned, hot-reloadable agronomy knowledge base.
+crop_data.json (crops, fertilizer prices, soil thresholds, organic options and
+optional overrides of the stage_calculator tables) is validated and compiled
+into an immutable KnowledgeBase. A watcher thread polls the file and compiles
+new versions off the request path; a version that fails to compile is logged
+and the current one stays in service.
+
+Installing a version is a single reference swap. A request takes one snapshot
+with get_knowledge_base() and uses it throughout, so it never waits on a
+reload and never mixes two versions. Caches derived from the knowledge base
+key on `version` (or on the identity of `model`).
+"""
+
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from types import MappingProxyType
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from crop_model import CropModel, compile_crop_model
+from metrics import register, Counter
+from stage_calculator import DEFAULT_STAGE_TABLES, StageTables
+
+KNOWLEDGE_BASE_PATH = os.getenv(
+    "CROP_DATA_PATH", os.path.join(os.path.dirname(__file__), "crop_data.json")
+)
+# Seconds between checks of KNOWLEDGE_BASE_PATH; 0 disables the watcher
+KNOWLEDGE_BASE_POLL_INTERVAL = float(os.getenv("KNOWLEDGE_BASE_POLL_INTERVAL", "5"))
+
+NUTRIENTS = ("N", "P", "K")
+STAGE_FIELDS = ("name", "name_te", "days", "duration", "icon")
+
+KNOWLEDGE_BASE_RELOADS = register(Counter(
+    "advisory_knowledge_base_reloads_total",
+    "Knowledge base versions installed or rejected by the reloader",
+    ("result",)
+))
+
+
+class KnowledgeBase(NamedTuple):
+    version: str            # "<generation>-<content hash>"
+    loaded_at: datetime
+    source: str
+    crop_data: Dict         # parsed crop_data.json; treat as read-only
+    model: CropModel
+    stage_tables: StageTables
+
+
+def compile_stage_tables(crop_data: Dict) -> StageTables:
+    """
+    Built-in stage_calculator tables with the overrides from crop_data.json:
+
+        "stage_schedules": {"<crop key>": {"stages": [...], "npk_splits": {"N": {...}, ...}}},
+        "stage_instructions": {"<stage name>": {"en": "...", "te": "..."}}
+
+    A crop key replaces that crop's stages and splits; a new key adds a crop
+    (matched against the schedule crop name, e.g. "groundnut").
+    """
+    stages = dict(DEFAULT_STAGE_TABLES.stages)
+    npk_splits = dict(DEFAULT_STAGE_TABLES.npk_splits)
+
+    for crop_key, schedule in crop_data.get('stage_schedules', {}).items():
+        crop_stages = sorted(
+            ({field: stage[field] for field in STAGE_FIELDS} for stage in schedule['stages']),
+            key=lambda stage: stage['days']
+        )
+        if not crop_stages:
+            raise ValueError(f"Stage schedule {crop_key}: no stages")
+        for stage in crop_stages:
+            if not isinstance(stage['days'], int) or not isinstance(stage['duration'], int) \
+                    or stage['days'] < 0 or stage['duration'] <= 0:
+                raise ValueError(f"Stage schedule {crop_key}: invalid days/duration for {stage['name']}")
+
+        names = {stage['name'] for stage in crop_stages}
+        splits = {nutrient: dict(schedule['npk_splits'].get(nutrient, {})) for nutrient in NUTRIENTS}
+        for nutrient, ratios in splits.items():
+            unknown = set(ratios) - names
+            if unknown:
+                raise ValueError(f"Stage schedule {crop_key}: {nutrient} split for unknown stages {sorted(unknown)}")
+            if any(ratio < 0 for ratio in ratios.values()) or sum(ratios.values()) > 1 + 1e-9:
+                raise ValueError(f"Stage schedule {crop_key}: {nutrient} splits must be >= 0 and sum to at most 1")
+
+        stages[crop_key.lower()] = crop_stages
+        npk_splits[crop_key.lower()] = splits
+
+    instructions = dict(DEFAULT_STAGE_TABLES.instructions)
+    for stage_name, text in crop_data.get('stage_instructions', {}).items():
+        instructions[stage_name] = {"en": text['en'], "te": text['te']}
+
+    return StageTables(
+        MappingProxyType(stages), MappingProxyType(npk_splits), MappingProxyType(instructions)
+    )
+
+
+def compile_knowledge_base(content: bytes, source: str, generation: int) -> KnowledgeBase:
+    """
+    Parse, validate and compile crop_data.json contents.
+
+    Raises:
+        ValueError, KeyError or TypeError if the data is malformed
+    """
+    crop_data = json.loads(content.decode('utf-8'))
+    model = compile_crop_model(crop_data)
+    for nutrient in NUTRIENTS:
+        if nutrient not in model.thresholds:
+            raise ValueError(f"Missing soil threshold for {nutrient}")
+    stage_tables = compile_stage_tables(crop_data)
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    return KnowledgeBase(
+        f"{generation}-{digest}", datetime.now(), source, crop_data, model, stage_tables
+    )
+
+
+def _read(path: str):
+    with open(path, 'rb') as f:
+        stat = os.fstat(f.fileno())
+        return f.read(), (path, stat.st_mtime_ns, stat.st_size)
+
+
+_reload_lock = threading.Lock()
+_listeners: List[Callable[[KnowledgeBase], None]] = []
+
+_content, _signature = _read(KNOWLEDGE_BASE_PATH)
+_current = compile_knowledge_base(_content, KNOWLEDGE_BASE_PATH, 1)
+_digest = hashlib.sha256(_content).hexdigest()
+_generation = 1
+del _content
+
+
+def get_knowledge_base() -> KnowledgeBase:
+    """Current version; take it once per request and use it throughout"""
+    return _current
+
+
+def on_reload(callback: Callable[[KnowledgeBase], None]) -> None:
+    """Call `callback(kb)` from the reloading thread after each new version is installed"""
+    _listeners.append(callback)
+
+
+def reload_knowledge_base(path: str = None, force: bool = False) -> bool:
+    """
+    Compile `path` if it changed since the last check and swap it in.
+
+    Args:
+        path: crop_data.json to load (default: KNOWLEDGE_BASE_PATH)
+        force: Recompile even if the file is unchanged
+
+    Returns:
+        True if a new version was installed
+    """
+    global _current, _signature, _digest, _generation
+    path = path or KNOWLEDGE_BASE_PATH
+    with _reload_lock:
+        try:
+            stat = os.stat(path)
+        except OSError as e:
+            print(f"Knowledge base {path} unavailable, keeping version {_current.version}: {e}")
+            return False
+        if not force and (path, stat.st_mtime_ns, stat.st_size) == _signature:
+            return False
+
+        try:
+            content, signature = _read(path)
+            digest = hashlib.sha256(content).hexdigest()
+            if not force and digest == _digest:
+                _signature = signature
+                return False
+            kb = compile_knowledge_base(content, path, _generation + 1)
+        except Exception as e:
+            # Remember the file so a broken edit is reported once, not on every poll
+            _signature = (path, stat.st_mtime_ns, stat.st_size)
+            KNOWLEDGE_BASE_RELOADS.inc("rejected")
+            print(f"Knowledge base {path} rejected, keeping version {_current.version}: {e!r}")
+            return False
+
+        _current, _signature, _digest, _generation = kb, signature, digest, _generation + 1
+        KNOWLEDGE_BASE_RELOADS.inc("installed")
+
+    print(f"Knowledge base version {kb.version} installed from {path}")
+    for callback in list(_listeners):
+        try:
+            callback(kb)
+        except Exception as e:
+            print(f"Error in knowledge base reload listener: {e!r}")
+    return True
+
+
+class KnowledgeBaseWatcher:
+    """Background thread that polls crop_data.json and reloads it on change"""
+
+    def __init__(self, path: str = None, interval: float = KNOWLEDGE_BASE_POLL_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running or self.interval <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="knowledge-base-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        if not self.running:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                reload_knowledge_base(self.path)
+            except Exception as e:
+                print(f"Error reloading knowledge base: {e!r}")
+
+
+knowledge_base_watcher = KnowledgeBaseWatcher()
+
+
+def knowledge_base_info() -> Dict:
+    kb = _current
+    return {
+        "version": kb.version,
+        "loaded_at": kb.loaded_at.isoformat(),
+        "source": kb.source,
+        "crops": len(kb.model.crops),
+        "watching": knowledge_base_watcher.running,
+        "poll_interval_seconds": knowledge_base_watcher.interval
+    }
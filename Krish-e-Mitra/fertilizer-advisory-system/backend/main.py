@@ -1,27 +1,60 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from datetime import datetime
-import json
 
-from database import get_db, init_db, Farmer, Field, Recommendation, FarmerRecord
+from database import (
+    get_db, get_async_db, init_db, SessionLocal, async_engine, Farmer
+)
 from models import (
     FarmerRegistration, LoginRequest, RecommendationRequest,
     FarmerResponse, LoginResponse, RecommendationResponse,
-    CropInfo, DistrictInfo, MandalInfo, WeatherData
+    CropInfo, DistrictInfo, MandalInfo, WeatherData,
+    BulkRecommendationRequest, BulkRecommendationResponse, HistoryPage
+)
+from rules_engine import (
+    calculate_fertilizer_recommendation,
+    get_soil_parameters, async_get_weather_context, get_cache_stats
+)
+from batch_advisory import field_inputs_from_records, generate_bulk_recommendations
+from identity_cache import (
+    get_farmer_identity, async_get_farmer_identity, cache_farmer, invalidate_farmer,
+    warm_farmer_cache
+)
+from history import fetch_history_page, fetch_history_detail, HISTORY_PAGE_SIZE
+from reference_catalog import (
+    async_get_reference_catalog, get_mandals_entry, etag_matches
 )
-from rules_engine import calculate_fertilizer_recommendation, get_available_crops
 from data_loader import initialize_database
-from weather_service import get_current_weather, get_weather_forecast
+from soil_index import get_soil_index, soil_index_refresher
+from compression import CompressionMiddleware
+from responses import FastJSONResponse
+from metrics import stage_timer, render_metrics
+from weather_service import async_get_current_weather, close_async_client, warm_weather_cache, WEATHER_BREAKER
+from weather_store import weather_store_compactor
+from weather_prefetch import weather_prefetcher
+from write_behind import recommendation_writer
+from knowledge_base import knowledge_base_watcher, knowledge_base_info
+from demand_calendar import (
+    current_demand_calendar, demand_calendar_refresher, demand_rows, demand_csv, demand_parquet
+)
+from schedule_export import schedule_csv_chunks, schedule_ical_chunks
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Krish-e-Mitra API",
     description="AI-Enabled Precision Fertilizer Advisory System for Indian Farmers",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
 
+# Compress large advisory payloads for 2G/3G clients (gzip, or Brotli when installed)
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -41,6 +74,35 @@ async def startup_event():
         initialize_database()
     except Exception as e:
         print(f"Database already initialized or error: {e}")
+    
+    db = SessionLocal()
+    try:
+        print(f"Warmed farmer cache with {warm_farmer_cache(db)} active farmers")
+    finally:
+        db.close()
+    
+    print(f"Warmed weather cache with {warm_weather_cache()} stored entries")
+    # Built by initialize_database; built here if loading failed part way
+    print(f"Soil index holds {get_soil_index().cards} soil health cards")
+    
+    recommendation_writer.start()
+    knowledge_base_watcher.start()
+    weather_store_compactor.start()
+    weather_prefetcher.start()
+    demand_calendar_refresher.start()
+    soil_index_refresher.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    knowledge_base_watcher.stop()
+    soil_index_refresher.stop()
+    demand_calendar_refresher.stop()
+    weather_prefetcher.stop()
+    weather_store_compactor.stop()
+    # Write out queued recommendations before the process exits
+    recommendation_writer.stop()
+    await close_async_client()
+    await async_engine.dispose()
 
 @app.get("/")
 async def root():
@@ -51,11 +113,11 @@ async def root():
     }
 
 @app.post("/api/register", response_model=FarmerResponse)
-async def register_farmer(farmer_data: FarmerRegistration, db: Session = Depends(get_db)):
+async def register_farmer(farmer_data: FarmerRegistration, db: AsyncSession = Depends(get_async_db)):
     """Register a new farmer"""
     
     # Check if farmer already exists
-    existing_farmer = db.query(Farmer).filter(Farmer.mobile == farmer_data.mobile).first()
+    existing_farmer = await db.scalar(select(Farmer).where(Farmer.mobile == farmer_data.mobile))
     if existing_farmer:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -72,13 +134,14 @@ async def register_farmer(farmer_data: FarmerRegistration, db: Session = Depends
     )
     
     db.add(new_farmer)
-    db.commit()
-    db.refresh(new_farmer)
+    await db.commit()
+    await db.refresh(new_farmer)
     
-    return new_farmer
+    invalidate_farmer(new_farmer.mobile)
+    return cache_farmer(new_farmer)
 
 @app.post("/api/login", response_model=LoginResponse)
-async def login_farmer(login_data: LoginRequest, db: Session = Depends(get_db)):
+async def login_farmer(login_data: LoginRequest, db: AsyncSession = Depends(get_async_db)):
     """Login with OTP verification (dev OTP: 123456)"""
     
     # Check OTP (hardcoded for development)
@@ -90,7 +153,7 @@ async def login_farmer(login_data: LoginRequest, db: Session = Depends(get_db)):
         )
     
     # Find farmer
-    farmer = db.query(Farmer).filter(Farmer.mobile == login_data.mobile).first()
+    farmer = await async_get_farmer_identity(db, login_data.mobile)
     
     if not farmer:
         return LoginResponse(
@@ -102,19 +165,20 @@ async def login_farmer(login_data: LoginRequest, db: Session = Depends(get_db)):
     return LoginResponse(
         success=True,
         message="Login successful",
-        farmer=FarmerResponse.from_orm(farmer)
+        farmer=FarmerResponse(**farmer)
     )
 
 @app.post("/api/recommendation", response_model=RecommendationResponse)
 async def get_recommendation(
     req: RecommendationRequest,
     farmer_mobile: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Generate fertilizer recommendation"""
     
     # Find farmer
-    farmer = db.query(Farmer).filter(Farmer.mobile == farmer_mobile).first()
+    with stage_timer("farmer_lookup"):
+        farmer = await async_get_farmer_identity(db, farmer_mobile)
     if not farmer:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -130,98 +194,266 @@ async def get_recommendation(
             detail="Invalid date format. Use YYYY-MM-DD"
         )
     
-    # Create or update field record
-    field = Field(
-        farmer_id=farmer.id,
-        location=f"{req.mandal}, {req.district}",
-        crop_type=req.crop_name,
-        variety=req.variety,
-        sowing_date=sowing_date,
-        area_sown=req.area_sown
-    )
-    db.add(field)
-    db.commit()
-    db.refresh(field)
+    # Soil comes from the in-memory soil health card index; weather without blocking the event loop
+    with stage_timer("soil_lookup"):
+        soil_params = get_soil_parameters(None, req.district, req.mandal, req.village, req.survey_number)
+    with stage_timer("weather"):
+        weather_context = await async_get_weather_context(req.district, req.mandal)
     
     # Calculate recommendation
-    recommendation_data = calculate_fertilizer_recommendation(
-        crop_name=req.crop_name,
-        sowing_date=sowing_date,
-        district=req.district,
-        mandal=req.mandal,
-        area_sown=req.area_sown,
-        db=db,
-        variety=req.variety
-    )
+    with stage_timer("calculation"):
+        recommendation_data = calculate_fertilizer_recommendation(
+            crop_name=req.crop_name,
+            sowing_date=sowing_date,
+            district=req.district,
+            mandal=req.mandal,
+            area_sown=req.area_sown,
+            db=None,
+            variety=req.variety,
+            soil_params=soil_params,
+            weather_context=weather_context
+        )
     
-    # Save recommendation
-    recommendation_record = Recommendation(
-        farmer_id=farmer.id,
-        field_id=field.id,
-        recommendation_json=json.dumps(recommendation_data, ensure_ascii=False)
-    )
-    db.add(recommendation_record)
-    db.commit()
+    # Queue field and recommendation rows; they are group-committed in the background
+    with stage_timer("persist_enqueue"):
+        await recommendation_writer.async_submit(
+            farmer["id"],
+            {
+                "location": f"{req.mandal}, {req.district}",
+                "crop_type": req.crop_name,
+                "variety": req.variety,
+                "sowing_date": sowing_date,
+                "area_sown": req.area_sown
+            },
+            recommendation_data
+        )
     
     return RecommendationResponse(**recommendation_data)
 
-@app.get("/api/history")
-async def get_history(farmer_mobile: str, db: Session = Depends(get_db)):
-    """Get farmer's recommendation history"""
+@app.post("/api/recommendation/bulk", response_model=BulkRecommendationResponse)
+def get_bulk_recommendations(
+    req: BulkRecommendationRequest,
+    farmer_mobile: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Generate fertilizer recommendations for many fields or a farmer record filter"""
+    
+    farmer_id = None
+    if farmer_mobile:
+        farmer = get_farmer_identity(db, farmer_mobile)
+        if not farmer:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Farmer not found"
+            )
+        farmer_id = farmer["id"]
+    
+    if req.fields:
+        items = [field.model_dump() for field in req.fields]
+    elif req.record_filter:
+        items = field_inputs_from_records(db, **req.record_filter.model_dump())
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide either fields or record_filter"
+        )
+    
+    summary = generate_bulk_recommendations(
+        items, db,
+        include_weather=req.include_weather,
+        persist=req.persist,
+        farmer_id=farmer_id
+    )
+    if not req.include_results:
+        summary["recommendations"] = None
+    
+    return summary
+
+@app.get("/api/demand-calendar")
+def get_demand_calendar(
+    district: Optional[str] = None,
+    mandal: Optional[str] = None,
+    fertilizer: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    format: str = "json"
+):
+    """
+    Weekly Urea/DAP/MOP demand per mandal from scheduled applications (json, csv or parquet).
+    Lists the current week to DEMAND_HORIZON_WEEKS ahead unless start/end are given.
+    Served from the last calendar built in the background (DEMAND_REFRESH_INTERVAL).
+    """
+    try:
+        start_date = datetime.strptime(start, "%Y-%m-%d").date() if start else None
+        end_date = datetime.strptime(end, "%Y-%m-%d").date() if end else None
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid date format. Use YYYY-MM-DD"
+        )
+    if format not in ("json", "csv", "parquet"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Format must be json, csv or parquet"
+        )
+    
+    calendar = current_demand_calendar()
+    rows = demand_rows(calendar, district, mandal, fertilizer, start_date, end_date)
+    
+    if format == "csv":
+        return Response(
+            content=demand_csv(rows), media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="demand_calendar.csv"'}
+        )
+    if format == "parquet":
+        try:
+            content = demand_parquet(rows)
+        except ImportError:
+            raise HTTPException(
+                status_code=status.HTTP_501_NOT_IMPLEMENTED,
+                detail="Parquet export needs pyarrow installed"
+            )
+        return Response(
+            content=content, media_type="application/vnd.apache.parquet",
+            headers={"Content-Disposition": 'attachment; filename="demand_calendar.parquet"'}
+        )
+    return {
+        "as_of": calendar.as_of.isoformat(),
+        "knowledge_base_version": calendar.version,
+        "fields": calendar.fields,
+        "skipped_fields": calendar.skipped,
+        "rows": rows
+    }
+
+@app.get("/api/export/schedules")
+def export_schedules(
+    district: Optional[str] = None,
+    mandal: Optional[str] = None,
+    village: Optional[str] = None,
+    crop_name: Optional[str] = None,
+    format: str = "csv"
+):
+    """Stream stage-wise schedules for the selected farmer records as CSV or iCalendar"""
+    if format == "csv":
+        chunks, media_type = schedule_csv_chunks(district, mandal, village, crop_name), "text/csv; charset=utf-8"
+    elif format == "ics":
+        chunks, media_type = schedule_ical_chunks(district, mandal, village, crop_name), "text/calendar; charset=utf-8"
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Format must be csv or ics"
+        )
+    return StreamingResponse(
+        chunks, media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="fertilizer_schedules.{format}"'}
+    )
+
+@app.get("/api/history", response_model=HistoryPage)
+async def get_history(
+    farmer_mobile: str,
+    limit: int = HISTORY_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get a page of the farmer's recommendation history (summaries only)"""
     
     # Find farmer
-    farmer = db.query(Farmer).filter(Farmer.mobile == farmer_mobile).first()
+    farmer = await async_get_farmer_identity(db, farmer_mobile)
     if not farmer:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Farmer not found"
         )
     
-    # Get recommendations
-    recommendations = db.query(Recommendation).filter(
-        Recommendation.farmer_id == farmer.id
-    ).order_by(Recommendation.created_at.desc()).limit(10).all()
+    try:
+        # Include recommendations this worker accepted but has not committed yet
+        return await fetch_history_page(
+            db, farmer["id"], limit, cursor, pending=recommendation_writer.pending_for(farmer["id"])
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid history cursor"
+        )
+
+@app.get("/api/history/{recommendation_id}")
+async def get_history_detail(
+    recommendation_id: int,
+    farmer_mobile: str,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get one full recommendation from the farmer's history"""
+    
+    # Find farmer
+    farmer = await async_get_farmer_identity(db, farmer_mobile)
+    if not farmer:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Farmer not found"
+        )
     
-    history = []
-    for rec in recommendations:
-        rec_data = json.loads(rec.recommendation_json)
-        rec_data['created_at'] = rec.created_at.strftime("%Y-%m-%d %H:%M:%S")
-        history.append(rec_data)
+    rec_data = await fetch_history_detail(
+        db, farmer["id"], recommendation_id, pending=recommendation_writer.pending_for(farmer["id"])
+    )
+    if rec_data is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Recommendation not found"
+        )
     
-    return {"history": history}
+    return rec_data
+
+def catalog_response(request: Request, entry: dict) -> Response:
+    """Serve a pre-serialized catalog entry, or 304 if the client copy is current"""
+    headers = {"ETag": entry["etag"], "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), entry["etag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=entry["body"], media_type="application/json", headers=headers)
 
 @app.get("/api/crops", response_model=List[CropInfo])
-async def get_crops(db: Session = Depends(get_db)):
+async def get_crops(request: Request):
     """Get list of available crops"""
-    return get_available_crops(db)
+    return catalog_response(request, (await async_get_reference_catalog())["crops"])
 
 @app.get("/api/districts", response_model=List[DistrictInfo])
-async def get_districts(db: Session = Depends(get_db)):
+async def get_districts(request: Request):
     """Get list of districts"""
-    districts = db.query(FarmerRecord.district).distinct().all()
-    return [DistrictInfo(name=d[0]) for d in districts if d[0]]
+    return catalog_response(request, (await async_get_reference_catalog())["districts"])
 
 @app.get("/api/mandals", response_model=List[MandalInfo])
-async def get_mandals(district: str = None, db: Session = Depends(get_db)):
+async def get_mandals(request: Request, district: str = None):
     """Get list of mandals, optionally filtered by district"""
-    query = db.query(FarmerRecord.mandal).distinct()
-    
-    if district:
-        query = query.filter(FarmerRecord.district == district)
-    
-    mandals = query.all()
-    return [MandalInfo(name=m[0]) for m in mandals if m[0]]
+    return catalog_response(request, get_mandals_entry(await async_get_reference_catalog(), district))
 
 @app.get("/api/health")
 async def health_check():
-    """Health check endpoint"""
-    return {"status": "healthy", "timestamp": datetime.now().isoformat()}
+    """Health check endpoint (weather_upstream is the weather circuit breaker state)"""
+    return {
+        "status": "healthy",
+        "timestamp": datetime.now().isoformat(),
+        "weather_upstream": WEATHER_BREAKER.state
+    }
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics: pipeline stage latencies, cache and upstream counters"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Recommendation and weather cache counters"""
+    return dict(get_cache_stats(), weather_prefetch=weather_prefetcher.stats())
+
+@app.get("/api/knowledge-base")
+async def knowledge_base_status():
+    """Version of the crop knowledge base currently serving requests"""
+    return knowledge_base_info()
 
 @app.get("/api/weather", response_model=WeatherData)
 async def get_weather(district: str, mandal: str):
     """Get current weather for a location"""
     try:
-        weather_data = get_current_weather(district, mandal)
+        weather_data = await async_get_current_weather(district, mandal)
         return weather_data
     except Exception as e:
         raise HTTPException(
@@ -21,6 +21,21 @@ class RecommendationRequest(BaseModel):
     district: str
     mandal: str
     area_sown: float = Field(..., gt=0)
+    village: Optional[str] = None  # narrows soil parameters when soil health cards exist
+    survey_number: Optional[str] = None
+
+class FarmerRecordFilter(BaseModel):
+    district: Optional[str] = None
+    mandal: Optional[str] = None
+    village: Optional[str] = None
+    crop_name: Optional[str] = None
+
+class BulkRecommendationRequest(BaseModel):
+    fields: Optional[List[RecommendationRequest]] = None
+    record_filter: Optional[FarmerRecordFilter] = None  # used when fields is empty
+    include_weather: bool = True
+    persist: bool = True
+    include_results: bool = False
 
 # Response Models
 class FertilizerDetail(BaseModel):
@@ -46,6 +61,9 @@ class WeatherData(BaseModel):
     rain_3h: float
     timestamp: str
     is_mock: bool = False
+    # Served from the last known reading while the provider is unavailable
+    is_stale: bool = False
+    age_seconds: Optional[float] = None
 
 class WeatherForecast(BaseModel):
     date: str
@@ -54,6 +72,8 @@ class WeatherForecast(BaseModel):
     description: str
     rain_probability: int
     rain_mm: float
+    is_stale: bool = False
+    age_seconds: Optional[float] = None
 
 class WeatherAnalysis(BaseModel):
     condition: str  # SUNNY, CLOUDY, RAINY
@@ -133,6 +153,21 @@ class LoginResponse(BaseModel):
     message: str
     farmer: Optional[FarmerResponse] = None
 
+class HistoryItem(BaseModel):
+    id: int
+    crop: Optional[str]
+    variety: Optional[str]
+    current_stage: Optional[str]
+    district: Optional[str]
+    mandal: Optional[str]
+    area_sown: Optional[float]
+    total_cost: Optional[float]
+    created_at: str
+
+class HistoryPage(BaseModel):
+    history: List[HistoryItem]
+    next_cursor: Optional[str] = None
+
 class CropInfo(BaseModel):
     telugu_name: str
     english_name: str
@@ -142,3 +177,15 @@ class DistrictInfo(BaseModel):
 
 class MandalInfo(BaseModel):
     name: str
+
+class BulkRecommendationError(BaseModel):
+    index: int
+    detail: str
+
+class BulkRecommendationResponse(BaseModel):
+    total: int
+    generated: int
+    persisted: int
+    groups: int
+    errors: List[BulkRecommendationError]
+    recommendations: Optional[List[RecommendationResponse]] = None
@@ -0,0 +1,163 @@
+"""
+In-memory reference catalog for dropdown endpoints.
+Crops, districts and district->mandal lists only change when a dataset is
+ingested or a new knowledge base version is installed, so they are computed
+once into an immutable snapshot with pre-serialized JSON bodies and strong ETags.
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from cache import SingleFlight
+from database import SessionLocal, FarmerRecord
+from crop_model import CropModel
+from knowledge_base import get_knowledge_base, on_reload
+from rules_engine import merge_crop_list
+
+_catalog: Optional[Dict] = None
+_catalog_lock = threading.Lock()
+# Concurrent first requests (warm-up failed or has not finished) share one build
+_catalog_builds = SingleFlight("reference_catalog")
+
+
+def normalize_crop_name(name: str) -> str:
+    """Case-fold and drop whitespace so 'మొక్క జొన్న' matches 'మొక్కజొన్న'"""
+    return "".join(name.split()).casefold()
+
+
+def build_crop_aliases(record_crop_names: List[str], model: CropModel) -> Dict[str, str]:
+    """
+    Map normalized crop spellings to crop_data.json keys.
+
+    Covers Telugu and English names, plus e-panta spellings that extend a
+    known Telugu name (e.g. plural 'మినుములు' -> 'మినుము').
+    """
+    aliases = {}
+    for crop_name, crop in model.crops.items():
+        aliases[normalize_crop_name(crop_name)] = crop_name
+        aliases[normalize_crop_name(crop.english_name)] = crop_name
+
+    known = sorted(model.crops, key=len, reverse=True)
+    for record_name in record_crop_names:
+        normalized = normalize_crop_name(record_name)
+        if normalized in aliases:
+            continue
+        for crop_name in known:
+            if normalized.startswith(normalize_crop_name(crop_name)):
+                aliases[normalized] = crop_name
+                break
+
+    return aliases
+
+
+def _entry(payload) -> Dict:
+    """Pre-serialized response body with its strong ETag"""
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return {"body": body, "etag": '"' + hashlib.sha256(body).hexdigest()[:32] + '"'}
+
+
+def build_reference_catalog(db: Session) -> Dict:
+    """Read farmer records once and build every reference list"""
+    model = get_knowledge_base().model
+    rows = db.query(FarmerRecord.district, FarmerRecord.mandal, FarmerRecord.crop_name).distinct().all()
+
+    mandals_by_district = defaultdict(set)
+    all_mandals = set()
+    record_crops = set()
+    for district, mandal, crop_name in rows:
+        if district:
+            district_mandals = mandals_by_district[district]
+            if mandal:
+                district_mandals.add(mandal)
+        if mandal:
+            all_mandals.add(mandal)
+        if crop_name:
+            record_crops.add(crop_name)
+
+    districts = sorted(mandals_by_district)
+    return {
+        "built_at": datetime.now().isoformat(),
+        "crop_aliases": build_crop_aliases(sorted(record_crops), model),
+        "mandals_by_district": {d: sorted(m) for d, m in mandals_by_district.items()},
+        "crops": _entry(merge_crop_list(sorted(record_crops), model)),
+        "districts": _entry([{"name": d} for d in districts]),
+        "mandals": _entry([{"name": m} for m in sorted(all_mandals)]),
+        "mandals_for_district": {
+            d: _entry([{"name": m} for m in sorted(mandals_by_district[d])])
+            for d in districts
+        },
+        "no_mandals": _entry([]),
+    }
+
+
+def refresh_reference_catalog(db: Session = None) -> Dict:
+    """Rebuild the catalog (call after dataset ingestion) and swap it in"""
+    global _catalog
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
+    try:
+        catalog = build_reference_catalog(db)
+    finally:
+        if own_session:
+            db.close()
+
+    with _catalog_lock:
+        _catalog = catalog
+    return catalog
+
+
+def _refresh_after_reload(kb) -> None:
+    # Only rebuild a catalog that is in use; otherwise the next request builds it
+    if _catalog is not None:
+        refresh_reference_catalog()
+
+
+on_reload(_refresh_after_reload)
+
+
+def get_reference_catalog() -> Dict:
+    """Current catalog snapshot, built on first use"""
+    catalog = _catalog
+    if catalog is None:
+        catalog = refresh_reference_catalog()
+    return catalog
+
+
+async def async_get_reference_catalog() -> Dict:
+    """get_reference_catalog for async handlers: a missing catalog is built in a worker thread"""
+    catalog = _catalog
+    if catalog is None:
+        catalog = await _catalog_builds.do_async(None, lambda: asyncio.to_thread(refresh_reference_catalog))
+    return catalog
+
+
+def get_mandals_entry(catalog: Dict, district: str = None) -> Dict:
+    if not district:
+        return catalog["mandals"]
+    return catalog["mandals_for_district"].get(district, catalog["no_mandals"])
+
+
+def resolve_crop_name(crop_name: Optional[str]) -> Optional[str]:
+    """Map an e-panta crop spelling to its crop_data.json key (unchanged if unknown)"""
+    if not crop_name:
+        return crop_name
+    return get_reference_catalog()["crop_aliases"].get(normalize_crop_name(crop_name), crop_name)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Evaluate an If-None-Match header against an ETag (weak comparison, so the
+    weak ETags of compressed responses match too)
+    """
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
@@ -1,16 +1,48 @@
-import json
 import os
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 from sqlalchemy.orm import Session
-from database import SoilData, FarmerRecord
-from weather_service import get_current_weather, get_weather_forecast, analyze_weather_for_fertilizer
-from stage_calculator import calculate_stage_schedule
+from database import FarmerRecord
+from weather_service import (
+    get_current_weather, get_weather_forecast, analyze_weather_for_fertilizer,
+    async_get_weather_bundle, get_known_weather, weather_cache_stats, weather_deadline, is_degraded,
+    WEATHER_CACHE
+)
+from stage_calculator import plan_stage_schedule, render_stage_schedule
+from crop_model import CropModel, find_stage, organic_options, SCHEDULE_CROP_NAMES
+from fertilizer_engine import field_doses
+from knowledge_base import KnowledgeBase, get_knowledge_base
+from soil_index import lookup_soil_parameters
+from cache import TTLCache, MISSING
+from metrics import register, stage_timer, Gauge
 
-# Load crop data
-CROP_DATA_PATH = os.path.join(os.path.dirname(__file__), "crop_data.json")
-with open(CROP_DATA_PATH, 'r', encoding='utf-8') as f:
-    CROP_DATA = json.load(f)
+# Memoized per-acre recommendations (keyed by knowledge base version) and
+# (shorter-lived) weather sections
+RECOMMENDATION_CACHE = TTLCache(
+    maxsize=int(os.getenv("RECOMMENDATION_CACHE_SIZE", "10000")),
+    ttl=int(os.getenv("RECOMMENDATION_CACHE_TTL", "21600")),
+    name="recommendation"
+)
+WEATHER_CONTEXT_CACHE = TTLCache(
+    maxsize=int(os.getenv("WEATHER_CONTEXT_CACHE_SIZE", "1000")),
+    ttl=int(os.getenv("WEATHER_CONTEXT_CACHE_TTL", "600")),
+    name="weather"
+)
+# Weather sections built from stale or mock fallbacks are kept only briefly,
+# so recommendations pick up live weather soon after the provider recovers
+WEATHER_DEGRADED_CONTEXT_TTL = int(os.getenv("WEATHER_DEGRADED_CONTEXT_TTL", "60"))
+
+# First note of a recommendation whose weather lookup failed
+WEATHER_UNAVAILABLE_NOTE = "Weather data unavailable - check conditions before application"
+register(Gauge(
+    "advisory_cache_hit_ratio",
+    "Hit ratio of in-process caches since start",
+    ("cache",),
+    lambda: {
+        (c.name,): c.stats()["hit_ratio"]
+        for c in (RECOMMENDATION_CACHE, WEATHER_CONTEXT_CACHE, WEATHER_CACHE)
+    }
+))
 
 def calculate_crop_stage(sowing_date: datetime, current_date: datetime = None) -> str:
     """Calculate current crop growth stage based on days after sowing"""
@@ -28,16 +60,23 @@ def calculate_crop_stage(sowing_date: datetime, current_date: datetime = None) -
     else:
         return "ripening"
 
-def get_crop_stage_for_crop(crop_name: str, sowing_date: datetime, current_date: datetime = None) -> Dict:
+def get_crop_stage_for_crop(
+    crop_name: str,
+    sowing_date: datetime,
+    current_date: datetime = None,
+    model: CropModel = None
+) -> Dict:
     """Get specific crop stage based on crop type"""
     if current_date is None:
         current_date = datetime.now()
+    if model is None:
+        model = get_knowledge_base().model
     
     days_after_sowing = (current_date - sowing_date).days
     
     # Get crop data
-    crop_info = CROP_DATA['crops'].get(crop_name, None)
-    if not crop_info:
+    crop = model.crops.get(crop_name)
+    if crop is None:
         # Default stages
         return {
             "stage": calculate_crop_stage(sowing_date, current_date),
@@ -46,14 +85,13 @@ def get_crop_stage_for_crop(crop_name: str, sowing_date: datetime, current_date:
         }
     
     # Determine stage based on crop-specific days
-    stages = crop_info['growth_stages']
-    for stage_name, stage_info in stages.items():
-        if stage_info['days'][0] <= days_after_sowing <= stage_info['days'][1]:
-            return {
-                "stage": stage_name,
-                "days_after_sowing": days_after_sowing,
-                "description": stage_info['description']
-            }
+    stage = find_stage(crop, days_after_sowing)
+    if stage is not None:
+        return {
+            "stage": stage.name,
+            "days_after_sowing": days_after_sowing,
+            "description": stage.description
+        }
     
     # If beyond all stages, return ripening
     return {
@@ -62,24 +100,170 @@ def get_crop_stage_for_crop(crop_name: str, sowing_date: datetime, current_date:
         "description": "Maturity stage"
     }
 
-def get_soil_parameters(db: Session, district: str = None, mandal: str = None) -> Optional[Dict]:
-    """Get soil parameters from database based on location"""
-    # For now, return average/typical values since we don't have direct mapping
-    # In production, this would query based on district/mandal
+# Typical soil values used until location-specific data is available
+DEFAULT_SOIL_PARAMS = {
+    "N": 250,  # kg/ha (low)
+    "P": 15,   # kg/ha (medium)
+    "K": 150,  # kg/ha (low)
+    "pH": 6.5,
+    "OC": 0.5  # Organic carbon %
+}
+
+def get_soil_parameters(
+    db: Optional[Session],
+    district: str = None,
+    mandal: str = None,
+    village: str = None,
+    survey_number: str = None
+) -> Dict:
+    """
+    Soil N/P/K/pH/OC for a location from the soil health card index.
     
-    soil_records = db.query(SoilData).limit(10).all()
-    if not soil_records:
-        return None
+    Falls back from survey number to village, mandal and district, then to
+    DEFAULT_SOIL_PARAMS. No database access; `db` is kept for callers.
+    """
+    found = lookup_soil_parameters(district, mandal, village, survey_number)
+    if found is None:
+        return dict(DEFAULT_SOIL_PARAMS)
+    return dict(DEFAULT_SOIL_PARAMS, **found)
+
+def weather_context_key(district: str, mandal: str) -> tuple:
+    return (normalize_location(district), normalize_location(mandal))
+
+def build_weather_context(weather_data: Dict, forecast: List[Dict]) -> Dict:
+    return {
+        "weather": weather_data,
+        "forecast": forecast,
+        "analysis": analyze_weather_for_fertilizer(weather_data, forecast)
+    }
+
+def cache_weather_context(cache_key: tuple, weather_context: Dict) -> None:
+    ttl = WEATHER_DEGRADED_CONTEXT_TTL if is_degraded(weather_context["weather"]) else None
+    WEATHER_CONTEXT_CACHE.set(cache_key, weather_context, ttl=ttl)
+
+def get_weather_context(district: str, mandal: str) -> Dict:
+    """Fetch current weather, forecast and fertilizer analysis for a location"""
+    cache_key = weather_context_key(district, mandal)
+    weather_context = WEATHER_CONTEXT_CACHE.get(cache_key)
+    if weather_context is not MISSING:
+        return weather_context
     
-    # Return mock soil parameters (in production, calculate from actual soil data)
+    # Current weather and forecast share one latency budget
+    deadline = weather_deadline()
+    weather_context = build_weather_context(
+        get_current_weather(district, mandal, deadline), get_weather_forecast(district, mandal, deadline)
+    )
+    cache_weather_context(cache_key, weather_context)
+    return weather_context
+
+def prime_weather_context(district: str, mandal: str) -> Dict:
+    """
+    Recompute a location's weather section from cached, last-known-good or
+    mock weather and cache it (used by the prefetcher; no upstream calls)
+    """
+    weather_context = build_weather_context(*get_known_weather(district, mandal))
+    cache_weather_context(weather_context_key(district, mandal), weather_context)
+    return weather_context
+
+async def async_get_weather_context(district: str, mandal: str) -> Dict:
+    """Non-blocking get_weather_context; fetches current weather and forecast concurrently"""
+    cache_key = weather_context_key(district, mandal)
+    weather_context = WEATHER_CONTEXT_CACHE.get(cache_key)
+    if weather_context is not MISSING:
+        return weather_context
+    
+    weather_context = build_weather_context(*await async_get_weather_bundle(district, mandal))
+    cache_weather_context(cache_key, weather_context)
+    return weather_context
+
+def normalize_location(name: Optional[str]) -> str:
+    """Normalize a district/mandal/variety name for use in cache keys"""
+    return " ".join((name or "").split()).upper()
+
+def get_cache_stats() -> Dict:
+    """Hit/miss/eviction counters for the recommendation and weather caches"""
     return {
-        "N": 250,  # kg/ha (low)
-        "P": 15,   # kg/ha (medium)
-        "K": 150,  # kg/ha (low)
-        "pH": 6.5,
-        "OC": 0.5  # Organic carbon %
+        "recommendation": RECOMMENDATION_CACHE.stats(),
+        "weather": WEATHER_CONTEXT_CACHE.stats(),
+        "weather_upstream": weather_cache_stats()
     }
 
+def build_agronomic_core(
+    crop_name: str,
+    sowing_date: datetime,
+    crop_stage_info: Dict,
+    soil_params: Dict,
+    kb: KnowledgeBase = None
+) -> Dict:
+    """
+    Compute the per-acre, weather-independent part of a recommendation.
+
+    Amounts and costs are kept unrounded so they can be scaled to any area,
+    and so are the per-acre stage amounts of the schedule plan (rendered per
+    request by scale_stage_schedule). The core is shared by every request
+    with the same inputs: soil_parameters is copied before it goes into a
+    response, organic_recommendations (read-only tuples) is not.
+    """
+    if kb is None:
+        kb = get_knowledge_base()
+    model = kb.model
+    stage = crop_stage_info['stage']
+    
+    # Get crop data (unknown crops use rice values)
+    crop = model.crops.get(crop_name, model.default_crop)
+    
+    # Urea/DAP/MOP where the soil is deficient (vectorized engine, batch of one)
+    fertilizers = field_doses(model, crop, stage, soil_params)
+    
+    # Precomputed per crop and shared across responses
+    organic_recommendations = organic_options(model, crop_name)
+    
+    # Plan the stage-based fertilizer schedule per acre
+    try:
+        # Map crop name to English to avoid Unicode issues in server environment
+        calc_crop_name = SCHEDULE_CROP_NAMES.get(crop_name, crop_name)
+
+        with stage_timer("stage_schedule"):
+            template, amounts = plan_stage_schedule(
+                crop=calc_crop_name,
+                total_fertilizers=[
+                    {"name": fert["name"], "amount_kg": fert["amount_per_acre"]}
+                    for fert in fertilizers
+                ],
+                area_sown=1.0,
+                tables=kb.stage_tables
+            )
+        stage_plan = (template, calc_crop_name, sowing_date.strftime("%Y-%m-%d"), amounts)
+    except Exception as e:
+        print(f"Error calculating stage schedule: {repr(e)}")
+        stage_plan = None
+    
+    return {
+        "english_name": crop.english_name,
+        "stage_info": crop_stage_info,
+        "fertilizers": fertilizers,
+        "soil_parameters": dict(soil_params),
+        "organic_recommendations": organic_recommendations,
+        "stage_plan": stage_plan
+    }
+
+def scale_stage_schedule(
+    stage_plan: Optional[tuple],
+    area_sown: float,
+    sowing_date: Optional[datetime] = None
+) -> Optional[Dict]:
+    """
+    Render a core's stage plan for the given area (amounts rounded after scaling).
+    With `sowing_date`, dates follow that sowing date instead of the core's
+    (the per-acre plan only depends on crop, stage and soil).
+    """
+    if stage_plan is None:
+        return None
+    template, calc_crop_name, sowing_str, amounts = stage_plan
+    if sowing_date is not None:
+        sowing_str = sowing_date.strftime("%Y-%m-%d")
+    return render_stage_schedule(template, calc_crop_name, sowing_str, amounts, area_sown)
+
 def calculate_fertilizer_recommendation(
     crop_name: str,
     sowing_date: datetime,
@@ -88,11 +272,19 @@ def calculate_fertilizer_recommendation(
     area_sown: float,
     db: Session,
     variety: str = None,
-    include_weather: bool = True
+    include_weather: bool = True,
+    soil_params: Optional[Dict] = None,
+    weather_context: Optional[Dict] = None,
+    kb: KnowledgeBase = None,
+    core_cache: Optional[Dict] = None
 ) -> Dict:
     """
     Main function to calculate fertilizer recommendation
     
+    The per-acre agronomic result is memoized on the inputs it depends on
+    (crop, stage, sowing date, soil), so repeated requests only scale it to
+    the requested area and attach weather.
+    
     Args:
         crop_name: Name of the crop (Telugu or English)
         sowing_date: Date when crop was sown
@@ -102,87 +294,68 @@ def calculate_fertilizer_recommendation(
         db: Database session
         variety: Crop variety (optional)
         include_weather: Whether to include weather data (default: True)
+        soil_params: Pre-fetched soil parameters (optional, skips the soil lookup)
+        weather_context: Pre-fetched result of get_weather_context (optional)
+        kb: Knowledge base snapshot (optional, default: current version)
+        core_cache: Dict to memoize per-acre results in instead of the shared
+            cache (batch jobs, so they do not evict live entries)
     
     Returns:
         Dictionary with recommendation details
     """
     
+    # One knowledge base version for the whole request, even if a reload lands mid-way
+    if kb is None:
+        kb = get_knowledge_base()
+    
     # Get crop stage
-    crop_stage_info = get_crop_stage_for_crop(crop_name, sowing_date)
+    crop_stage_info = get_crop_stage_for_crop(crop_name, sowing_date, model=kb.model)
     stage = crop_stage_info['stage']
     
     # Get soil parameters
-    soil_params = get_soil_parameters(db, district, mandal)
+    if soil_params is None:
+        soil_params = get_soil_parameters(db, district, mandal)
     if not soil_params:
-        soil_params = {"N": 250, "P": 15, "K": 150, "pH": 6.5, "OC": 0.5}
-    
-    # Get crop data
-    crop_info = CROP_DATA['crops'].get(crop_name, None)
-    if not crop_info:
-        # Use default values for unknown crops
-        crop_info = CROP_DATA['crops']['వరి']  # Default to rice
+        soil_params = dict(DEFAULT_SOIL_PARAMS)
     
-    # Get nutrient requirements for current stage
-    nutrient_req = crop_info['nutrient_requirements'].get(stage, {"N": 40, "P": 20, "K": 20})
+    # Per-acre result, shared by every request with the same agronomic inputs
+    # (location only matters through the soil parameters)
+    cache_key = (
+        kb.version,
+        crop_name.strip(),
+        stage,
+        crop_stage_info['days_after_sowing'],
+        sowing_date.date(),
+        tuple(sorted(soil_params.items()))
+    )
+    if core_cache is None:
+        core = RECOMMENDATION_CACHE.get(cache_key)
+        if core is MISSING:
+            core = build_agronomic_core(crop_name, sowing_date, crop_stage_info, soil_params, kb)
+            RECOMMENDATION_CACHE.set(cache_key, core)
+    else:
+        core = core_cache.get(cache_key)
+        if core is None:
+            core = core_cache[cache_key] = build_agronomic_core(
+                crop_name, sowing_date, crop_stage_info, soil_params, kb
+            )
     
-    # Calculate fertilizer needs based on soil deficiency
-    thresholds = CROP_DATA['soil_thresholds']
+    # Scale to the requested area
     fertilizers = []
     total_cost = 0
-    
-    # Nitrogen (Urea)
-    if soil_params['N'] < thresholds['N']['medium']:
-        n_needed = nutrient_req['N'] * area_sown  # kg
-        urea_amount = (n_needed * 100) / CROP_DATA['fertilizer_types']['Urea']['percentage']
-        urea_cost = urea_amount * CROP_DATA['fertilizer_types']['Urea']['price_per_kg']
-        
-        fertilizers.append({
-            "type": "Urea",
-            "name": "Urea",
-            "telugu_name": CROP_DATA['fertilizer_types']['Urea']['telugu_name'],
-            "amount_kg": round(urea_amount, 2),
-            "amount_per_acre": round(urea_amount / area_sown, 2),
-            "timing": "Immediate" if stage == "vegetative" else f"During {stage} stage",
-            "cost": round(urea_cost, 2),
-            "nutrient": "N"
-        })
-        total_cost += urea_cost
-    
-    # Phosphorus (DAP)
-    if soil_params['P'] < thresholds['P']['medium']:
-        p_needed = nutrient_req['P'] * area_sown  # kg
-        dap_amount = (p_needed * 100) / CROP_DATA['fertilizer_types']['DAP']['percentage']
-        dap_cost = dap_amount * CROP_DATA['fertilizer_types']['DAP']['price_per_kg']
-        
+    for fert in core["fertilizers"]:
+        cost = fert["cost_per_acre"] * area_sown
         fertilizers.append({
-            "type": "DAP",
-            "name": "DAP",
-            "telugu_name": CROP_DATA['fertilizer_types']['DAP']['telugu_name'],
-            "amount_kg": round(dap_amount, 2),
-            "amount_per_acre": round(dap_amount / area_sown, 2),
-            "timing": "Basal application" if stage == "vegetative" else f"During {stage} stage",
-            "cost": round(dap_cost, 2),
-            "nutrient": "P"
+            "type": fert["type"],
+            "name": fert["name"],
+            "telugu_name": fert["telugu_name"],
+            "amount_kg": round(fert["amount_per_acre"] * area_sown, 2),
+            "amount_per_acre": round(fert["amount_per_acre"], 2),
+            "timing": fert["timing"],
+            "cost": round(cost, 2),
+            "nutrient": fert["nutrient"]
         })
-        total_cost += dap_cost
-    
-    # Potassium (MOP)
-    if soil_params['K'] < thresholds['K']['medium']:
-        k_needed = nutrient_req['K'] * area_sown  # kg
-        mop_amount = (k_needed * 100) / CROP_DATA['fertilizer_types']['MOP']['percentage']
-        mop_cost = mop_amount * CROP_DATA['fertilizer_types']['MOP']['price_per_kg']
-        
-        fertilizers.append({
-            "type": "MOP",
-            "name": "MOP",
-            "telugu_name": CROP_DATA['fertilizer_types']['MOP']['telugu_name'],
-            "amount_kg": round(mop_amount, 2),
-            "amount_per_acre": round(mop_amount / area_sown, 2),
-            "timing": f"During {stage} stage",
-            "cost": round(mop_cost, 2),
-            "nutrient": "K"
-        })
-        total_cost += mop_cost
+        total_cost += cost
     
     # Base notes
     notes = [
@@ -197,9 +370,11 @@ def calculate_fertilizer_recommendation(
     
     if include_weather:
         try:
-            weather_data = get_current_weather(district, mandal)
-            forecast = get_weather_forecast(district, mandal)
-            weather_analysis = analyze_weather_for_fertilizer(weather_data, forecast)
+            if weather_context is None:
+                weather_context = get_weather_context(district, mandal)
+            weather_data = weather_context['weather']
+            forecast = weather_context['forecast']
+            weather_analysis = weather_context['analysis']
             
             # Add weather-based notes
             if weather_analysis['weather_notes']:
@@ -208,12 +383,12 @@ def calculate_fertilizer_recommendation(
         except Exception as e:
             print(f"Error getting weather data: {e}")
             # Continue without weather data
-            notes.insert(0, "Weather data unavailable - check conditions before application")
+            notes.insert(0, WEATHER_UNAVAILABLE_NOTE)
     
     # Generate recommendation
-    recommendation = {
+    return {
         "crop": crop_name,
-        "english_name": crop_info.get('english_name', crop_name),
+        "english_name": core["english_name"],
         "variety": variety,
         "area_sown": area_sown,
         "sowing_date": sowing_date.strftime("%Y-%m-%d"),
@@ -223,69 +398,43 @@ def calculate_fertilizer_recommendation(
         "fertilizers": fertilizers,
         "total_cost": round(total_cost, 2),
         "expected_yield_increase": "10-15%",
-        "soil_parameters": soil_params,
+        "soil_parameters": dict(core["soil_parameters"]),
         "notes": notes,
         "district": district,
         "mandal": mandal,
         "weather": weather_data,
         "weather_analysis": weather_analysis,
         "forecast": forecast,
-        "organic_recommendations": {
-            "manures": CROP_DATA.get('organic_options', {}).get('manures', []),
-            "bio_fertilizers": [
-                 bf for bf in CROP_DATA.get('organic_options', {}).get('bio_fertilizers', [])
-                 if "All Crops" in bf.get('crops', []) or 
-                    any(c.lower() in [x.lower() for x in bf.get('crops', [])] for c in [crop_name, crop_info.get('english_name', '')])
-            ],
-            "green_manures": CROP_DATA.get('organic_options', {}).get('green_manures', [])
-        }
+        "organic_recommendations": core["organic_recommendations"],
+        "stage_schedule": scale_stage_schedule(core["stage_plan"], area_sown)
     }
-    
-    # Calculate stage-based fertilizer schedule
-    try:
-        # Map crop name to English to avoid Unicode issues in server environment
-        english_crop_map = {
-             "వరి": "Paddy",
-             "పత్తి": "Cotton",
-             "మొక్కజొన్న": "Maize",
-             "వేరుశనగ": "Groundnut",
-             "మినుము": "Blackgram",
-             "పెసర": "Green Gram"
-        }
-        calc_crop_name = english_crop_map.get(crop_name, crop_name)
-
-        stage_schedule = calculate_stage_schedule(
-            crop=calc_crop_name,
-            sowing_date=sowing_date.strftime("%Y-%m-%d"),
-            total_fertilizers=fertilizers,
-            area_sown=area_sown
-        )
-        recommendation["stage_schedule"] = stage_schedule
-    except Exception as e:
-        print(f"Error calculating stage schedule: {repr(e)}")
-        recommendation["stage_schedule"] = None
-    
-    return recommendation
 
-def get_available_crops(db: Session) -> List[Dict]:
-    """Get list of available crops from database"""
-    crops = db.query(FarmerRecord.crop_name).distinct().all()
+def merge_crop_list(record_crop_names: List[str], model: CropModel = None) -> List[Dict]:
+    """Combine crop names seen in farmer records with all crops in crop_data.json"""
+    if model is None:
+        model = get_knowledge_base().model
     crop_list = []
+    seen = set()
     
-    for crop in crops:
-        crop_name = crop[0]
-        if crop_name and crop_name in CROP_DATA['crops']:
+    for crop_name in record_crop_names:
+        if crop_name and crop_name in model.crops and crop_name not in seen:
+            seen.add(crop_name)
             crop_list.append({
                 "telugu_name": crop_name,
-                "english_name": CROP_DATA['crops'][crop_name]['english_name']
+                "english_name": model.crops[crop_name].english_name
             })
     
     # Add crops from crop_data.json that might not be in records
-    for crop_name, crop_info in CROP_DATA['crops'].items():
-        if not any(c['telugu_name'] == crop_name for c in crop_list):
+    for crop_name, crop in model.crops.items():
+        if crop_name not in seen:
             crop_list.append({
                 "telugu_name": crop_name,
-                "english_name": crop_info['english_name']
+                "english_name": crop.english_name
             })
     
     return crop_list
+
+def get_available_crops(db: Session) -> List[Dict]:
+    """Get list of available crops from database"""
+    crops = db.query(FarmerRecord.crop_name).distinct().all()
+    return merge_crop_list([crop[0] for crop in crops])
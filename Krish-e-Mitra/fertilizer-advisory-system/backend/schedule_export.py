@@ -0,0 +1,202 @@
+"""
+Streaming export of stage-wise fertilizer schedules for many fields.
+Farmer records matching a district/mandal/village/crop selection are read
+lazily, each one's schedule is generated with the rules engine (weather
+excluded), and the result is written out as CSV rows or iCalendar events.
+Per-acre plans are memoized per export on (crop, stage, soil), outside the
+shared recommendation cache, so a large export does not evict live entries.
+Output is produced by generators in small chunks, so memory stays flat for
+any number of records and the header goes out before the first record is read.
+"""
+
+import csv
+import io
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from batch_advisory import iter_field_inputs_from_records
+from database import SessionLocal
+from knowledge_base import get_knowledge_base
+from rules_engine import (
+    build_agronomic_core, get_crop_stage_for_crop, get_soil_parameters, scale_stage_schedule
+)
+
+# Flush the output buffer once it holds this many bytes
+EXPORT_CHUNK_BYTES = 16 * 1024
+
+CSV_COLUMNS = (
+    "record_id", "district", "mandal", "village", "crop", "variety", "area_sown", "sowing_date",
+    "stage", "stage_te", "application_date", "fertilizer", "fertilizer_te", "amount_kg",
+    "percentage", "instructions_en", "instructions_te"
+)
+
+ICAL_PRODUCT_ID = "-//Krish-e-Mitra//Fertilizer Advisory//EN"
+
+
+def iter_field_schedules(
+    district: str = None,
+    mandal: str = None,
+    village: str = None,
+    crop_name: str = None
+) -> Iterator[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """
+    Yield (field input, stage schedule) for farmer records matching a filter.
+
+    Records without a usable sowing date or area are skipped. Uses its own
+    database session and one knowledge base version for the whole export.
+    """
+    kb = get_knowledge_base()
+    soil_by_location = {}
+    cores = {}
+    db = SessionLocal()
+    try:
+        for item in iter_field_inputs_from_records(db, district, mandal, village, crop_name):
+            if not item["crop_name"] or not item["sowing_date"] or not item["area_sown"] or item["area_sown"] <= 0:
+                continue
+            location = (item["district"], item["mandal"], item["village"])
+            soil_params = soil_by_location.get(location)
+            if soil_params is None:
+                soil_params = soil_by_location[location] = get_soil_parameters(None, *location)
+            crop_stage_info = get_crop_stage_for_crop(item["crop_name"], item["sowing_date"], model=kb.model)
+            core_key = (item["crop_name"].strip(), crop_stage_info["stage"], tuple(sorted(soil_params.items())))
+            core = cores.get(core_key)
+            if core is None:
+                core = cores[core_key] = build_agronomic_core(
+                    item["crop_name"], item["sowing_date"], crop_stage_info, soil_params, kb
+                )
+            schedule = scale_stage_schedule(core["stage_plan"], item["area_sown"], item["sowing_date"])
+            if schedule is not None:
+                yield item, schedule
+    finally:
+        db.close()
+
+
+def _chunked(lines: Iterator[str]) -> Iterator[bytes]:
+    """Encode lines and group them into chunks of about EXPORT_CHUNK_BYTES (the first line alone)"""
+    lines = iter(lines)
+    for line in lines:
+        yield line.encode("utf-8")
+        break
+
+    buffer = []
+    size = 0
+    for line in lines:
+        data = line.encode("utf-8")
+        buffer.append(data)
+        size += len(data)
+        if size >= EXPORT_CHUNK_BYTES:
+            yield b"".join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def _csv_lines(schedules: Iterator[Tuple[Dict, Dict]]) -> Iterator[str]:
+    out = io.StringIO()
+    writer = csv.writer(out)
+
+    def line(values) -> str:
+        writer.writerow(values)
+        text = out.getvalue()
+        out.seek(0)
+        out.truncate()
+        return text
+
+    yield line(CSV_COLUMNS)
+    for item, schedule in schedules:
+        base = (
+            item["record_id"], item["district"], item["mandal"], item["village"] or "",
+            item["crop_name"], item["variety"] or "", item["area_sown"],
+            schedule["sowing_date"]
+        )
+        for stage in schedule["stages"]:
+            stage_values = (stage["stage_name"], stage["stage_name_te"], stage["application_date"])
+            instructions = (stage["instructions_en"], stage["instructions_te"])
+            # Stages without fertilizer still get a row, so printed schedules show every stage
+            for fert in stage["fertilizers"] or [None]:
+                if fert is None:
+                    fert_values = ("", "", "", "")
+                else:
+                    fert_values = (fert["name"], fert["name_te"], fert["amount_kg"], fert["percentage"])
+                yield line(base + stage_values + fert_values + instructions)
+
+
+def schedule_csv_chunks(
+    district: str = None,
+    mandal: str = None,
+    village: str = None,
+    crop_name: str = None
+) -> Iterator[bytes]:
+    """CSV with one row per field, stage and fertilizer"""
+    return _chunked(_csv_lines(iter_field_schedules(district, mandal, village, crop_name)))
+
+
+def ical_escape(text: str) -> str:
+    return (text.replace("\\", "\\\\").replace(";", "\\;")
+            .replace(",", "\\,").replace("\n", "\\n"))
+
+
+def ical_line(line: str) -> str:
+    """Fold a content line at 75 octets (RFC 5545) and terminate it with CRLF"""
+    data = line.encode("utf-8")
+    if len(data) <= 75:
+        return line + "\r\n"
+    parts = []
+    start = 0
+    limit = 75
+    while start < len(data):
+        end = min(start + limit, len(data))
+        # Do not split a UTF-8 sequence
+        while end < len(data) and (data[end] & 0xC0) == 0x80:
+            end -= 1
+        parts.append(data[start:end].decode("utf-8"))
+        start = end
+        limit = 74  # continuation lines start with a space
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _ical_lines(schedules: Iterator[Tuple[Dict, Dict]], stamp: datetime) -> Iterator[str]:
+    yield ical_line("BEGIN:VCALENDAR")
+    yield ical_line("VERSION:2.0")
+    yield ical_line(f"PRODID:{ICAL_PRODUCT_ID}")
+    yield ical_line("CALSCALE:GREGORIAN")
+    dtstamp = stamp.strftime("%Y%m%dT%H%M%SZ")
+    for item, schedule in schedules:
+        place = ", ".join(part for part in (item["village"], item["mandal"], item["district"]) if part)
+        for index, stage in enumerate(schedule["stages"]):
+            if not stage["fertilizers"]:
+                continue
+            start = date.fromisoformat(stage["application_date"])
+            doses = ", ".join(f"{fert['name']} {fert['amount_kg']} kg" for fert in stage["fertilizers"])
+            description = "\n".join(
+                [f"{fert['name']} ({fert['name_te']}): {fert['amount_kg']} kg - {fert['percentage']}"
+                 for fert in stage["fertilizers"]]
+                + [stage["instructions_en"], stage["instructions_te"],
+                   f"{item['crop_name']}, {item['area_sown']} acres, sown {schedule['sowing_date']}"]
+            )
+            yield ical_line("BEGIN:VEVENT")
+            yield ical_line(f"UID:record-{item['record_id']}-stage-{index}@krish-e-mitra")
+            yield ical_line(f"DTSTAMP:{dtstamp}")
+            yield ical_line(f"DTSTART;VALUE=DATE:{start.strftime('%Y%m%d')}")
+            yield ical_line(
+                f"DTEND;VALUE=DATE:{(start + timedelta(days=stage['duration_days'])).strftime('%Y%m%d')}"
+            )
+            yield ical_line(f"SUMMARY:{ical_escape(stage['stage_name'] + ': ' + doses)}")
+            yield ical_line(f"DESCRIPTION:{ical_escape(description)}")
+            if place:
+                yield ical_line(f"LOCATION:{ical_escape(place)}")
+            yield ical_line("END:VEVENT")
+    yield ical_line("END:VCALENDAR")
+
+
+def schedule_ical_chunks(
+    district: str = None,
+    mandal: str = None,
+    village: str = None,
+    crop_name: str = None,
+    stamp: Optional[datetime] = None
+) -> Iterator[bytes]:
+    """iCalendar with one all-day event per field and stage that has fertilizer to apply"""
+    stamp = stamp or datetime.utcnow()
+    return _chunked(_ical_lines(iter_field_schedules(district, mandal, village, crop_name), stamp))
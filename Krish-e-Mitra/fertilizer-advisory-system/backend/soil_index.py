@@ -0,0 +1,211 @@
+"""
+In-memory soil parameter index built from soil health card (SHC) tests.
+Cards are aggregated per district, mandal, village and survey number, so a
+lookup is a few dictionary hits with hierarchical fallback
+(survey number -> village -> mandal -> district) and no database access.
+The index is rebuilt at ingest and can be refreshed incrementally with cards
+added since the last build; SoilIndexRefresher does so in API workers when
+another process adds cards or loads a new dataset.
+"""
+
+import os
+import re
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, DatasetMeta, SoilHealthCard
+
+# Seconds between checks for new soil health cards (0 disables the refresher)
+SOIL_INDEX_REFRESH_INTERVAL = float(os.getenv("SOIL_INDEX_REFRESH_INTERVAL", "60"))
+
+# Soil parameter name -> SoilHealthCard column
+SOIL_COLUMNS = (("N", "n"), ("P", "p"), ("K", "k"), ("pH", "ph"), ("OC", "oc"))
+
+_SEPARATORS = re.compile(r"[\s.\-_,()/]+")
+
+_index: Optional["SoilIndex"] = None
+_index_lock = threading.Lock()
+
+
+def location_key(name: Optional[str]) -> str:
+    """Normalize a place name so 'A.KONDURU' and 'A KONDURU' share a key"""
+    return _SEPARATORS.sub("", (name or "").upper())
+
+
+class SoilIndex(NamedTuple):
+    # key -> [sum per parameter..., count per parameter...]; kept for incremental refresh
+    totals: Dict[Tuple[str, ...], List[float]]
+    # key -> averaged parameters, e.g. {"N": 182.4, "P": 18.8, ...}
+    params: Dict[Tuple[str, ...], Dict[str, float]]
+    last_card_id: int
+    cards: int
+    # dataset_meta rows at build time; a new dataset replaces the cards
+    dataset: Tuple[Tuple[str, str], ...] = ()
+
+
+def card_keys(district, mandal, village, survey_number) -> List[Tuple[str, ...]]:
+    """Index keys a card contributes to, coarsest first"""
+    keys = []
+    parts = []
+    for part in (district, mandal, village, survey_number):
+        part = location_key(part)
+        if not part:
+            break
+        parts.append(part)
+        keys.append(tuple(parts))
+    return keys
+
+
+def build_soil_index(cards: Iterable, base: Optional[SoilIndex] = None) -> SoilIndex:
+    """
+    Aggregate soil health cards into an index.
+
+    Args:
+        cards: Rows with id, district, mandal, village, survey_number and the SOIL_COLUMNS
+        base: Existing index to extend (copied, never modified)
+
+    Returns:
+        New SoilIndex
+    """
+    width = len(SOIL_COLUMNS)
+    totals = {key: list(values) for key, values in base.totals.items()} if base else {}
+    params = dict(base.params) if base else {}
+    last_card_id = base.last_card_id if base else 0
+    count = base.cards if base else 0
+
+    touched = set()
+    for card in cards:
+        values = [getattr(card, column) for _, column in SOIL_COLUMNS]
+        for key in card_keys(card.district, card.mandal, card.village, card.survey_number):
+            entry = totals.get(key)
+            if entry is None:
+                entry = totals[key] = [0.0] * (2 * width)
+            for i, value in enumerate(values):
+                if value is not None:
+                    entry[i] += value
+                    entry[width + i] += 1
+            touched.add(key)
+        last_card_id = max(last_card_id, card.id)
+        count += 1
+
+    for key in touched:
+        entry = totals[key]
+        params[key] = {
+            name: round(entry[i] / entry[width + i], 2)
+            for i, (name, _) in enumerate(SOIL_COLUMNS)
+            if entry[width + i]
+        }
+
+    return SoilIndex(totals, params, last_card_id, count)
+
+
+def _load_cards(db: Session, after_id: int = 0):
+    columns = [getattr(SoilHealthCard, column) for _, column in SOIL_COLUMNS]
+    return db.query(
+        SoilHealthCard.id, SoilHealthCard.district, SoilHealthCard.mandal,
+        SoilHealthCard.village, SoilHealthCard.survey_number, *columns
+    ).filter(SoilHealthCard.id > after_id).order_by(SoilHealthCard.id).yield_per(1000)
+
+
+def _dataset_stamp(db: Session) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted(db.query(DatasetMeta.key, DatasetMeta.value).all()))
+
+
+def refresh_soil_index(db: Session = None, full: bool = False) -> SoilIndex:
+    """
+    Fold cards added since the last build into the index (or rebuild it with full=True).
+
+    Rebuilds from scratch when a dataset ingest replaced the cards.
+    """
+    global _index
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
+    try:
+        with _index_lock:
+            dataset = _dataset_stamp(db)
+            base = None if full or _index is None or _index.dataset != dataset else _index
+            index = build_soil_index(_load_cards(db, base.last_card_id if base else 0), base)
+            index = index._replace(dataset=dataset)
+            _index = index
+    finally:
+        if own_session:
+            db.close()
+    return index
+
+
+def soil_index_outdated(db: Session) -> bool:
+    """Whether cards were added or replaced since the current index was built"""
+    index = _index
+    if index is None:
+        return True
+    last_card_id = db.query(func.max(SoilHealthCard.id)).scalar() or 0
+    return last_card_id != index.last_card_id or _dataset_stamp(db) != index.dataset
+
+
+def get_soil_index() -> SoilIndex:
+    """Current index, built on first use"""
+    index = _index
+    if index is None:
+        index = refresh_soil_index(full=True)
+    return index
+
+
+class SoilIndexRefresher:
+    """Background thread that folds soil health cards added by other processes into the index"""
+
+    def __init__(self, interval: float = SOIL_INDEX_REFRESH_INTERVAL):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running or self.interval <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="soil-index-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        if not self.running:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            db = SessionLocal()
+            try:
+                if soil_index_outdated(db):
+                    index = refresh_soil_index(db)
+                    print(f"Refreshed soil index ({index.cards} cards)")
+            except Exception as e:
+                print(f"Error refreshing soil index: {e!r}")
+            finally:
+                db.close()
+
+
+soil_index_refresher = SoilIndexRefresher()
+
+
+def lookup_soil_parameters(
+    district: Optional[str],
+    mandal: Optional[str] = None,
+    village: Optional[str] = None,
+    survey_number: Optional[str] = None
+) -> Optional[Dict[str, float]]:
+    """Averaged soil parameters for the most specific known level, or None"""
+    params = get_soil_index().params
+    for key in reversed(card_keys(district, mandal, village, survey_number)):
+        found = params.get(key)
+        if found is not None:
+            return found
+    return None
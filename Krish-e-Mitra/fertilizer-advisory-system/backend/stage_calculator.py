@@ -1,10 +1,17 @@
 """
 Stage-based fertilizer calculator for crop recommendations.
 Calculates fertilizer application schedule across different growth stages.
+
+The stage tables are compiled once per StageTables into per-crop templates
+(stage offsets, split ratios, bilingual instructions). Rendering a schedule
+is then a date shift plus a scalar multiply of per-acre amounts, which are
+memoized on (crop, per-acre NPK).
 """
 
-from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+import os
+from datetime import date, datetime
+from functools import lru_cache
+from typing import List, Dict, Any, Callable, Mapping, NamedTuple, Optional, Tuple
 
 # Crop growth stage definitions (days after sowing)
 CROP_STAGES = {
@@ -96,6 +103,49 @@ STAGE_INSTRUCTIONS = {
 }
 
 
+class StageTables(NamedTuple):
+    """Stage definitions, NPK splits and instructions used to build schedules"""
+    stages: Mapping[str, List[Dict[str, Any]]]
+    npk_splits: Mapping[str, Dict[str, Dict[str, float]]]
+    instructions: Mapping[str, Dict[str, str]]
+
+
+# Built-in tables; crop_data.json can override them (see knowledge_base.py)
+DEFAULT_STAGE_TABLES = StageTables(CROP_STAGES, NPK_SPLITS, STAGE_INSTRUCTIONS)
+
+# Fertilizer applied for each nutrient: name, Telugu name, nutrient fraction
+SPLIT_FERTILIZERS = {
+    "N": ("Urea", "యూరియా", 0.46),
+    "P": ("DAP", "డిఎపి", 0.46),  # DAP is counted by its P content
+    "K": ("MOP", "ఎంఓపి", 0.60),
+}
+
+DEFAULT_INSTRUCTIONS = {
+    "en": "Apply as recommended by agricultural expert.",
+    "te": "వ్యవసాయ నిపుణుల సిఫార్సు ప్రకారం వర్తించండి."
+}
+
+# (template, per-acre NPK) combinations kept by the stage_amounts memo
+SCHEDULE_CACHE_SIZE = int(os.getenv("SCHEDULE_CACHE_SIZE", "4096"))
+
+
+class StageTemplate(NamedTuple):
+    name: str
+    name_te: str
+    icon: str
+    days: int
+    duration: int
+    splits: Tuple[Tuple[str, float], ...]  # (nutrient, ratio) in N, P, K order
+    instructions_en: str
+    instructions_te: str
+
+
+class ScheduleTemplate(NamedTuple):
+    crop_key: str
+    stages: Tuple[StageTemplate, ...]
+    total_duration_days: int
+
+
 def get_nutrient_from_fertilizer(fertilizer_name: str) -> Dict[str, float]:
     """Extract NPK content from fertilizer name"""
     nutrient_content = {
@@ -117,11 +167,207 @@ def get_nutrient_from_fertilizer(fertilizer_name: str) -> Dict[str, float]:
     return {"N": 0, "P": 0, "K": 0}
 
 
+@lru_cache(maxsize=256)
+def _nutrient_fractions(fertilizer_name: str) -> Tuple[float, float, float]:
+    content = get_nutrient_from_fertilizer(fertilizer_name)
+    return content["N"], content["P"], content["K"]
+
+
+def compile_schedule_templates(tables: StageTables) -> Dict[str, ScheduleTemplate]:
+    """Per-crop schedule templates for a set of stage tables"""
+    templates = {}
+    for crop_key, stages_info in tables.stages.items():
+        npk_splits = tables.npk_splits.get(crop_key, tables.npk_splits["paddy"])
+        stages = []
+        for stage_info in stages_info:
+            stage_name = stage_info["name"]
+            instructions = tables.instructions.get(stage_name, DEFAULT_INSTRUCTIONS)
+            stages.append(StageTemplate(
+                stage_name,
+                stage_info["name_te"],
+                stage_info["icon"],
+                stage_info["days"],
+                stage_info["duration"],
+                tuple(
+                    (nutrient, npk_splits[nutrient][stage_name])
+                    for nutrient in ("N", "P", "K")
+                    if stage_name in npk_splits[nutrient]
+                ),
+                instructions["en"],
+                instructions["te"]
+            ))
+        templates[crop_key] = ScheduleTemplate(
+            crop_key,
+            tuple(stages),
+            stages_info[-1]["days"] + stages_info[-1]["duration"]
+        )
+    return templates
+
+
+def match_crop_key(crop: str, tables: StageTables) -> str:
+    """Stage table key for a crop name (paddy if nothing matches)"""
+    crop_lower = crop.lower()
+    if crop_lower in tables.stages:
+        return crop_lower
+    if "paddy" in crop_lower or "rice" in crop_lower or "వరి" in crop_lower:
+        return "paddy"
+    if "cotton" in crop_lower or "పత్తి" in crop_lower:
+        return "cotton"
+    if "maize" in crop_lower or "corn" in crop_lower or "మొక్కజొన్న" in crop_lower:
+        return "maize"
+    return "paddy"
+
+
+class _TemplateEntry(NamedTuple):
+    tables: StageTables
+    templates: Dict[str, ScheduleTemplate]
+    # match_crop_key for these tables; crop names come from clients, so the memo is bounded
+    crop_key: Callable[[str], str]
+
+
+_entry: Optional[_TemplateEntry] = None
+
+
+def _template_entry(tables: StageTables) -> _TemplateEntry:
+    global _entry
+    entry = _entry
+    if entry is None or entry.tables is not tables:
+        entry = _entry = _TemplateEntry(
+            tables, compile_schedule_templates(tables),
+            lru_cache(maxsize=1024)(lambda crop: match_crop_key(crop, tables))
+        )
+    return entry
+
+
+def get_schedule_template(crop: str, tables: StageTables = None) -> ScheduleTemplate:
+    """Compiled schedule template for a crop name"""
+    entry = _template_entry(tables or DEFAULT_STAGE_TABLES)
+    return entry.templates.get(entry.crop_key(crop), entry.templates["paddy"])
+
+
+@lru_cache(maxsize=SCHEDULE_CACHE_SIZE)
+def stage_amounts(
+    template: ScheduleTemplate,
+    npk_per_acre: Tuple[float, float, float]
+) -> Tuple[Tuple[Tuple[float, Dict[str, Any]], ...], ...]:
+    """
+    Fertilizers per stage for the given per-acre N, P and K, memoized.
+
+    Returns:
+        For each template stage, (kg per acre, fertilizer entry) pairs; the
+        entry's amount_kg is filled in for the area when rendering
+    """
+    totals = dict(zip(("N", "P", "K"), npk_per_acre))
+    amounts = []
+    for stage in template.stages:
+        stage_fertilizers = []
+        for nutrient, ratio in stage.splits:
+            nutrient_amount = totals[nutrient] * ratio
+            if nutrient_amount > 0:
+                name, name_te, fraction = SPLIT_FERTILIZERS[nutrient]
+                per_acre = nutrient_amount / fraction
+                stage_fertilizers.append((per_acre, {
+                    "name": name,
+                    "name_te": name_te,
+                    "amount_kg": None,
+                    "amount_per_acre": round(per_acre, 2),
+                    "nutrient": nutrient,
+                    "percentage": f"{ratio * 100:.0f}% of total {nutrient}"
+                }))
+        amounts.append(tuple(stage_fertilizers))
+    return tuple(amounts)
+
+
+@lru_cache(maxsize=1024)
+def _sowing_ordinal(sowing_date: str) -> int:
+    return datetime.strptime(sowing_date, "%Y-%m-%d").toordinal()
+
+
+@lru_cache(maxsize=4096)
+def _date_strings(ordinal: int) -> Tuple[str, str]:
+    day = date.fromordinal(ordinal)
+    return day.strftime("%Y-%m-%d"), day.strftime("%b %d, %Y")
+
+
+def render_stage_schedule(
+    template: ScheduleTemplate,
+    crop: str,
+    sowing_date: str,
+    amounts: Tuple,
+    area_sown: float
+) -> Dict[str, Any]:
+    """Place a template at a sowing date and scale per-acre amounts to the area"""
+    sow_ordinal = _sowing_ordinal(sowing_date)
+    stages = []
+    for stage, stage_fertilizers in zip(template.stages, amounts):
+        application_date, application_date_formatted = _date_strings(sow_ordinal + stage.days)
+        stages.append({
+            "stage_name": stage.name,
+            "stage_name_te": stage.name_te,
+            "icon": stage.icon,
+            "days_after_sowing": stage.days,
+            "duration_days": stage.duration,
+            "application_date": application_date,
+            "application_date_formatted": application_date_formatted,
+            "fertilizers": [
+                dict(fertilizer, amount_kg=round(per_acre * area_sown, 2))
+                for per_acre, fertilizer in stage_fertilizers
+            ],
+            "instructions_en": stage.instructions_en,
+            "instructions_te": stage.instructions_te,
+        })
+    
+    return {
+        "crop": crop,
+        "crop_key": template.crop_key,
+        "sowing_date": sowing_date,
+        "sowing_date_formatted": _date_strings(sow_ordinal)[1],
+        "total_duration_days": template.total_duration_days,
+        "area_sown": area_sown,
+        "stages": stages,
+        "total_stages": len(stages)
+    }
+
+
+def plan_stage_schedule(
+    crop: str,
+    total_fertilizers: List[Dict[str, Any]],
+    area_sown: float,
+    tables: Optional[StageTables] = None
+) -> Tuple[ScheduleTemplate, Tuple]:
+    """
+    Template and unrounded per-acre stage amounts (see stage_amounts) for a
+    crop and its total fertilizers; render_stage_schedule places them at a
+    sowing date and scales them to any area.
+
+    Raises:
+        ValueError: area_sown is not positive
+    """
+    if area_sown <= 0:
+        raise ValueError(f"area_sown must be positive, got {area_sown}")
+    if tables is None:
+        tables = DEFAULT_STAGE_TABLES
+    template = get_schedule_template(crop, tables)
+    
+    # Total NPK supplied by the recommended fertilizers, per acre
+    n = p = k = 0
+    for fert in total_fertilizers:
+        n_frac, p_frac, k_frac = _nutrient_fractions(fert.get("name", fert.get("type", "")))
+        amount = fert["amount_kg"]
+        n += amount * n_frac
+        p += amount * p_frac
+        k += amount * k_frac
+    npk_per_acre = (n / area_sown, p / area_sown, k / area_sown)
+    
+    return template, stage_amounts(template, npk_per_acre)
+
+
 def calculate_stage_schedule(
     crop: str,
     sowing_date: str,
     total_fertilizers: List[Dict[str, Any]],
-    area_sown: float
+    area_sown: float,
+    tables: Optional[StageTables] = None
 ) -> Dict[str, Any]:
     """
     Calculate stage-based fertilizer application schedule.
@@ -131,111 +377,13 @@ def calculate_stage_schedule(
         sowing_date: Sowing date in YYYY-MM-DD format
         total_fertilizers: List of total fertilizer recommendations
         area_sown: Area in acres
+        tables: Stage tables to use (default: DEFAULT_STAGE_TABLES)
         
     Returns:
         Dictionary containing stage-based schedule
+
+    Raises:
+        ValueError: area_sown is not positive
     """
-    # Normalize crop name
-    crop_lower = crop.lower()
-    if "paddy" in crop_lower or "rice" in crop_lower or "వరి" in crop_lower:
-        crop_key = "paddy"
-    elif "cotton" in crop_lower or "పత్తి" in crop_lower:
-        crop_key = "cotton"
-    elif "maize" in crop_lower or "corn" in crop_lower or "మొక్కజొన్న" in crop_lower:
-        crop_key = "maize"
-    else:
-        crop_key = "paddy"  # Default to paddy
-    
-    # Get stages for this crop
-    stages_info = CROP_STAGES.get(crop_key, CROP_STAGES["paddy"])
-    npk_splits = NPK_SPLITS.get(crop_key, NPK_SPLITS["paddy"])
-    
-    # Parse sowing date
-    sow_date = datetime.strptime(sowing_date, "%Y-%m-%d")
-    
-    # Calculate total NPK from fertilizers
-    total_npk = {"N": 0, "P": 0, "K": 0}
-    for fert in total_fertilizers:
-        fert_name = fert.get("name", fert.get("type", ""))
-        nutrient_content = get_nutrient_from_fertilizer(fert_name)
-        amount = fert["amount_kg"]
-        for nutrient in ["N", "P", "K"]:
-            total_npk[nutrient] += amount * nutrient_content[nutrient]
-    
-    # Build stage schedule
-    stages = []
-    for stage_info in stages_info:
-        stage_name = stage_info["name"]
-        days_after_sowing = stage_info["days"]
-        application_date = sow_date + timedelta(days=days_after_sowing)
-        
-        # Calculate fertilizers for this stage
-        stage_fertilizers = []
-        
-        # Check each nutrient
-        for nutrient in ["N", "P", "K"]:
-            if stage_name in npk_splits[nutrient]:
-                ratio = npk_splits[nutrient][stage_name]
-                nutrient_amount = total_npk[nutrient] * ratio
-                
-                # Find appropriate fertilizer
-                if nutrient == "N" and nutrient_amount > 0:
-                    urea_amount = nutrient_amount / 0.46  # Urea is 46% N
-                    stage_fertilizers.append({
-                        "name": "Urea",
-                        "name_te": "యూరియా",
-                        "amount_kg": round(urea_amount, 2),
-                        "amount_per_acre": round(urea_amount / area_sown, 2),
-                        "nutrient": "N",
-                        "percentage": f"{ratio * 100:.0f}% of total N"
-                    })
-                elif nutrient == "P" and nutrient_amount > 0:
-                    dap_amount = nutrient_amount / 0.46  # DAP is 46% P
-                    stage_fertilizers.append({
-                        "name": "DAP",
-                        "name_te": "డిఎపి",
-                        "amount_kg": round(dap_amount, 2),
-                        "amount_per_acre": round(dap_amount / area_sown, 2),
-                        "nutrient": "P",
-                        "percentage": f"{ratio * 100:.0f}% of total P"
-                    })
-                elif nutrient == "K" and nutrient_amount > 0:
-                    mop_amount = nutrient_amount / 0.60  # MOP is 60% K
-                    stage_fertilizers.append({
-                        "name": "MOP",
-                        "name_te": "ఎంఓపి",
-                        "amount_kg": round(mop_amount, 2),
-                        "amount_per_acre": round(mop_amount / area_sown, 2),
-                        "nutrient": "K",
-                        "percentage": f"{ratio * 100:.0f}% of total K"
-                    })
-        
-        # Get instructions
-        instructions = STAGE_INSTRUCTIONS.get(stage_name, {
-            "en": "Apply as recommended by agricultural expert.",
-            "te": "వ్యవసాయ నిపుణుల సిఫార్సు ప్రకారం వర్తించండి."
-        })
-        
-        stages.append({
-            "stage_name": stage_name,
-            "stage_name_te": stage_info["name_te"],
-            "icon": stage_info["icon"],
-            "days_after_sowing": days_after_sowing,
-            "duration_days": stage_info["duration"],
-            "application_date": application_date.strftime("%Y-%m-%d"),
-            "application_date_formatted": application_date.strftime("%b %d, %Y"),
-            "fertilizers": stage_fertilizers,
-            "instructions_en": instructions["en"],
-            "instructions_te": instructions["te"],
-        })
-    
-    return {
-        "crop": crop,
-        "crop_key": crop_key,
-        "sowing_date": sowing_date,
-        "sowing_date_formatted": sow_date.strftime("%b %d, %Y"),
-        "total_duration_days": stages_info[-1]["days"] + stages_info[-1]["duration"],
-        "area_sown": area_sown,
-        "stages": stages,
-        "total_stages": len(stages)
-    }
+    template, amounts = plan_stage_schedule(crop, total_fertilizers, area_sown, tables)
+    return render_stage_schedule(template, crop, sowing_date, amounts, area_sown)
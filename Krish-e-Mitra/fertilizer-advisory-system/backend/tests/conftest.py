@@ -0,0 +1,30 @@
+"""
+Test setup: the app runs against a throwaway database and weather store,
+with background threads that would call out or rebuild data switched off.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+_data_dir = tempfile.mkdtemp(prefix="krish-e-mitra-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_data_dir}/fertilizer_advisory.db")
+os.environ.setdefault("WEATHER_STORE_PATH", f"{_data_dir}/weather_cache.db")
+os.environ.setdefault("WRITE_BEHIND_DEAD_LETTER_PATH", f"{_data_dir}/write_behind_dead_letter.jsonl")
+os.environ.setdefault("WEATHER_PROVIDER", "synthetic")
+os.environ.setdefault("WEATHER_PREFETCH_TICK", "0")
+os.environ.setdefault("DEMAND_REFRESH_INTERVAL", "0")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    import main
+
+    with TestClient(main.app) as test_client:
+        yield test_client
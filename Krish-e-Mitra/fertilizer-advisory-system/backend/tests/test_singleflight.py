@@ -0,0 +1,57 @@
+"""SingleFlight.do_async when the leading coroutine is cancelled"""
+
+import asyncio
+
+import pytest
+
+from cache import SingleFlight
+
+
+def test_followers_survive_cancelled_leader():
+    async def scenario():
+        flights = SingleFlight("test")
+        started = asyncio.Event()
+        calls = []
+
+        async def fetch():
+            calls.append(len(calls))
+            started.set()
+            await asyncio.sleep(0.05)
+            return "result"
+
+        leader = asyncio.create_task(flights.do_async("key", fetch))
+        await started.wait()
+        followers = [asyncio.create_task(flights.do_async("key", fetch)) for _ in range(3)]
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        # One follower takes over the call, the others share its result
+        assert await asyncio.gather(*followers) == ["result"] * 3
+        assert len(calls) == 2
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_follower_leaves_leader_running():
+    async def scenario():
+        flights = SingleFlight("test")
+        started = asyncio.Event()
+
+        async def fetch():
+            started.set()
+            await asyncio.sleep(0.05)
+            return "result"
+
+        leader = asyncio.create_task(flights.do_async("key", fetch))
+        await started.wait()
+        follower = asyncio.create_task(flights.do_async("key", fetch))
+        await asyncio.sleep(0)
+        follower.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        assert await leader == "result"
+
+    asyncio.run(scenario())
@@ -0,0 +1,82 @@
+"""Last-known-good weather keeps its is_stale / age_seconds flags in API responses"""
+
+import time
+from datetime import date, timedelta
+
+import pytest
+
+import rules_engine
+import weather_service
+from weather_providers import WeatherProvider
+
+DISTRICT, MANDAL = "NTR", "TIRUVURU"
+MOBILE = "9000000024"
+AGE = 600
+
+
+class DownProvider(WeatherProvider):
+    name = "down"
+    persistent = False
+
+    def fetch(self, endpoint, coords, timeout):
+        raise ConnectionError("provider unavailable")
+
+    async def async_fetch(self, endpoint, coords, timeout, client=None):
+        raise ConnectionError("provider unavailable")
+
+
+@pytest.fixture
+def stale_weather():
+    """Provider down, with last-known-good readings AGE seconds old"""
+    weather_service.set_provider(DownProvider())
+    rules_engine.WEATHER_CONTEXT_CACHE.clear()
+    coords = weather_service.get_coordinates(DISTRICT, MANDAL)
+    fetched_at = time.time() - AGE
+    current = dict(weather_service.get_mock_weather_data(DISTRICT, MANDAL), is_mock=False)
+    forecast = [
+        dict(day, date=(date.today() + timedelta(days=offset)).isoformat())
+        for offset, day in enumerate(weather_service.get_mock_forecast())
+    ]
+    weather_service.LAST_GOOD.set(weather_service.get_cache_key(coords, "current"), (current, fetched_at))
+    weather_service.LAST_GOOD.set(weather_service.get_cache_key(coords, "forecast"), (forecast, fetched_at))
+    yield
+    weather_service.set_provider(None)
+    weather_service.WEATHER_BREAKER.record_success()
+    rules_engine.WEATHER_CONTEXT_CACHE.clear()
+
+
+def test_weather_endpoint_reports_stale(client, stale_weather):
+    response = client.get("/api/weather", params={"district": DISTRICT, "mandal": MANDAL})
+
+    assert response.status_code == 200
+    weather = response.json()
+    assert weather["is_stale"] is True
+    assert weather["age_seconds"] >= AGE
+
+
+def test_recommendation_reports_stale(client, stale_weather):
+    client.post("/api/register", json={
+        "mobile": MOBILE, "name": "Test Farmer", "district": DISTRICT, "mandal": MANDAL
+    })
+    response = client.post("/api/recommendation", params={"farmer_mobile": MOBILE}, json={
+        "crop_name": "వరి",
+        "sowing_date": (date.today() - timedelta(days=30)).isoformat(),
+        "district": DISTRICT,
+        "mandal": MANDAL,
+        "area_sown": 2.0
+    })
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["weather"]["is_stale"] is True
+    assert body["weather"]["age_seconds"] >= AGE
+    assert body["forecast"]
+    assert all(day["is_stale"] is True for day in body["forecast"])
+
+
+def test_fresh_weather_is_not_stale(client):
+    response = client.get("/api/weather", params={"district": DISTRICT, "mandal": MANDAL})
+
+    assert response.status_code == 200
+    assert response.json()["is_stale"] is False
+    assert response.json()["age_seconds"] is None
@@ -0,0 +1,321 @@
+"""
+Bulk weather fetching for many locations at once (prefetch and batch jobs).
+Locations are deduplicated to weather grid cells and cells that are already
+cached are skipped. When the provider supports it (OPENWEATHER_ONECALL_URL
+set for the live provider), a cell costs one One Call request for both
+current weather and forecast; otherwise /weather and /forecast are
+requested separately. Requests are pipelined over one pooled
+client with bounded concurrency and spaced to this process's share of the
+provider's rate limit by one pacer for all bulk fetches, backing off for
+everyone when it answers 429. Each (cell, kind) fetch goes through
+WEATHER_FLIGHTS, so a request that misses the same cell meanwhile waits for
+it instead of calling the provider again.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import httpx
+
+from metrics import register, Counter, UPSTREAM_ERRORS
+from weather_providers import WeatherProvider, WeatherThrottled
+from weather_service import (
+    REQUEST_TIMEOUT, WEATHER_BREAKER, WEATHER_FLIGHTS, get_coordinates, get_cache_key, async_get_cached, async_set_cached,
+    get_provider, grid_coordinates, upstream_available, parse_current_weather, parse_forecast,
+    with_location, get_mock_weather_data, get_mock_forecast, WEATHER_CACHE
+)
+from cache import MISSING
+
+# Provider quota in calls per minute (60 on the free plan); 0 disables pacing
+WEATHER_RATE_LIMIT = float(os.getenv("WEATHER_RATE_LIMIT", "60"))
+# Processes on the host sharing the quota (uvicorn/gunicorn workers); each
+# paces its bulk fetches to WEATHER_RATE_LIMIT / WEATHER_WORKERS
+WEATHER_WORKERS = int(os.getenv("WEATHER_WORKERS", os.getenv("WEB_CONCURRENCY", "1")))
+WEATHER_BULK_CONCURRENCY = int(os.getenv("WEATHER_BULK_CONCURRENCY", "8"))
+# Retries of a call answered with 429 (after waiting Retry-After)
+WEATHER_BULK_RETRIES = int(os.getenv("WEATHER_BULK_RETRIES", "3"))
+
+WEATHER_KINDS = ("current", "forecast")
+ENDPOINTS = {"current": "weather", "forecast": "forecast"}
+
+BULK_CALLS = register(Counter(
+    "advisory_weather_bulk_calls_total",
+    "Upstream calls made by bulk weather fetches, by endpoint and result",
+    ("endpoint", "result")
+))
+
+
+def parse_onecall(data: Dict) -> Tuple[Dict, List[Dict]]:
+    """Current weather and 5-day forecast, in the /weather and /forecast shapes, from a One Call payload"""
+    current = data["current"]
+    weather_data = {
+        "location": "",
+        "temperature": current["temp"],
+        "feels_like": current["feels_like"],
+        "humidity": current["humidity"],
+        "description": current["weather"][0]["description"],
+        "main": current["weather"][0]["main"],
+        "icon": current["weather"][0]["icon"],
+        "wind_speed": current["wind_speed"],
+        "clouds": current["clouds"],
+        "rain_1h": current.get("rain", {}).get("1h", 0),
+        "rain_3h": 0,
+        "timestamp": datetime.now().isoformat(),
+        "is_mock": False
+    }
+    forecast_list = [
+        {
+            "date": datetime.fromtimestamp(day["dt"]).strftime("%Y-%m-%d"),
+            "temp_max": day["temp"]["max"],
+            "temp_min": day["temp"]["min"],
+            "description": day["weather"][0]["description"],
+            "rain_probability": round(day.get("pop", 0) * 100),
+            "rain_mm": day.get("rain", 0)
+        }
+        for day in data["daily"][:5]
+    ]
+    return weather_data, forecast_list
+
+
+class RatePacer:
+    """
+    Spaces calls evenly at `per_minute`. A 429 pushes the next slot back for
+    every caller and widens the spacing, so pacing settles under the
+    provider's actual limit even when the configured quota is too high.
+    Once the backoff window has passed, every `recover_after` successful
+    calls narrow the spacing again, down to the configured rate.
+    """
+
+    def __init__(self, per_minute: float, recover_after: int = 20):
+        self.base_interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self.interval = self.base_interval
+        self.recover_after = recover_after
+        self._next = 0.0
+        self._backoff_until = 0.0
+        self._successes = 0
+        # Slots are taken under a lock, so fetches on several event loops can share a pacer
+        self._lock = threading.Lock()
+        self.waited = 0.0
+
+    async def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+            if slot > now:
+                self.waited += slot - now
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._next = max(self._next, now + seconds)
+            self._successes = 0
+            # Calls already in flight also get 429s; widen once per pause
+            if now >= self._backoff_until:
+                self.interval = max(self.interval * 1.5, 0.01)
+                self._backoff_until = now + seconds
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.interval <= self.base_interval or time.monotonic() < self._backoff_until:
+                return
+            self._successes += 1
+            if self._successes >= self.recover_after:
+                self._successes = 0
+                self.interval /= 1.5
+                if self.interval < max(self.base_interval, 0.01):
+                    self.interval = self.base_interval
+
+
+# Shared by every BulkFetcher without its own rate, so pacing and 429 backoff
+# carry over from one fetch (prefetch pass, batch job) to the next
+RATE_PACER = RatePacer(WEATHER_RATE_LIMIT / max(1, WEATHER_WORKERS))
+
+
+class BulkFetcher:
+    """
+    Fetch many (grid cell, kind) cache entries over one pooled client.
+
+    Each fetch() opens its own client, so it can run on any event loop
+    (including asyncio.run in a background thread). Calls are paced by
+    RATE_PACER unless `per_minute` is given. `provider` defaults to the
+    configured one (weather_service.get_provider()).
+    """
+
+    def __init__(
+        self,
+        concurrency: int = WEATHER_BULK_CONCURRENCY,
+        per_minute: Optional[float] = None,
+        provider: WeatherProvider = None
+    ):
+        self.concurrency = max(1, concurrency)
+        self.pacer = RATE_PACER if per_minute is None else RatePacer(per_minute)
+        self.provider = provider
+        self.calls = 0
+        self.throttled = 0
+        self.failed = 0
+
+    async def _get(self, provider: WeatherProvider, client: httpx.AsyncClient, semaphore: asyncio.Semaphore,
+                   endpoint: str, coords: Dict[str, float]) -> Optional[Dict]:
+        """Fetch a payload, waiting out 429s; None on failure or while the breaker is open"""
+        for attempt in range(WEATHER_BULK_RETRIES + 1):
+            await self.pacer.wait()
+            async with semaphore:
+                if not WEATHER_BREAKER.allow():
+                    self.failed += 1
+                    BULK_CALLS.inc(endpoint, "rejected")
+                    return None
+                self.calls += 1
+                try:
+                    data = await provider.async_fetch(endpoint, coords, REQUEST_TIMEOUT, client)
+                except Exception as e:
+                    if isinstance(e, WeatherThrottled) and attempt < WEATHER_BULK_RETRIES:
+                        # Throttled, but the provider is up
+                        WEATHER_BREAKER.record_success()
+                        self.throttled += 1
+                        BULK_CALLS.inc(endpoint, "throttled")
+                        self.pacer.pause(e.retry_after)
+                        continue
+                    WEATHER_BREAKER.record_failure(e)
+                    self.failed += 1
+                    BULK_CALLS.inc(endpoint, "error")
+                    UPSTREAM_ERRORS.inc("openweathermap", endpoint)
+                    print(f"Error fetching {endpoint} data: {e}")
+                    return None
+            WEATHER_BREAKER.record_success()
+            self.pacer.record_success()
+            BULK_CALLS.inc(endpoint, "ok")
+            return data
+        return None
+
+    async def _fetch_onecall(self, provider, client, semaphore, cell: Tuple) -> Tuple:
+        data = await self._get(provider, client, semaphore, "onecall", grid_coordinates(cell))
+        try:
+            weather_data, forecast_list = parse_onecall(data) if data is not None else (None, None)
+        except (KeyError, IndexError, TypeError) as e:
+            print(f"Error parsing onecall data: {e!r}")
+            return None, None
+        if weather_data is not None:
+            await async_set_cached((cell, "current"), weather_data)
+            await async_set_cached((cell, "forecast"), forecast_list)
+        return weather_data, forecast_list
+
+    async def _fetch_kind(self, provider, client, semaphore, cell: Tuple, kind: str):
+        data = await self._get(provider, client, semaphore, ENDPOINTS[kind], grid_coordinates(cell))
+        if data is None:
+            return None
+        try:
+            parsed = parse_current_weather(data, "", "") if kind == "current" else parse_forecast(data)
+        except (KeyError, IndexError, TypeError) as e:
+            print(f"Error parsing {kind} data: {e!r}")
+            return None
+        await async_set_cached((cell, kind), parsed)
+        return parsed
+
+    async def _fetch_cell(self, provider, client, semaphore, cell: Tuple, kinds: set) -> Dict[Tuple, bool]:
+        onecall = None
+
+        def fetch(kind: str):
+            nonlocal onecall
+            if not provider.supports_onecall:
+                return self._fetch_kind(provider, client, semaphore, cell, kind)
+            # Both kinds come with the one call, made once for whichever kinds are not in flight already
+            if onecall is None:
+                onecall = asyncio.ensure_future(self._fetch_onecall(provider, client, semaphore, cell))
+
+            async def pick():
+                return (await asyncio.shield(onecall))[WEATHER_KINDS.index(kind)]
+            return pick()
+
+        kinds = sorted(kinds)
+        payloads = await asyncio.gather(*(
+            WEATHER_FLIGHTS.do_async((cell, kind), lambda kind=kind: fetch(kind)) for kind in kinds
+        ))
+        return {(cell, kind): data is not None for kind, data in zip(kinds, payloads)}
+
+    async def fetch(self, cache_keys: Iterable[Tuple], force: bool = False) -> Dict[Tuple, bool]:
+        """
+        Make sure the given (cell, kind) entries are cached.
+
+        Args:
+            cache_keys: (grid cell, "current"/"forecast") keys; duplicates are fetched once
+            force: refetch entries that are still cached
+
+        Returns:
+            True per key that is cached afterwards, False where the fetch failed
+        """
+        results = {}
+        kinds_by_cell: Dict[Tuple, set] = {}
+        for cache_key in set(cache_keys):
+            if not force and await async_get_cached(cache_key) is not None:
+                results[cache_key] = True
+            else:
+                kinds_by_cell.setdefault(cache_key[0], set()).add(cache_key[1])
+        if not kinds_by_cell:
+            return results
+
+        provider = self.provider or get_provider()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT, limits=limits) as client:
+            for part in await asyncio.gather(*(
+                self._fetch_cell(provider, client, semaphore, cell, kinds) for cell, kinds in kinds_by_cell.items()
+            )):
+                results.update(part)
+        return results
+
+    def stats(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "throttled": self.throttled,
+            "failed": self.failed,
+            "paced_seconds": round(self.pacer.waited, 3),
+            "pace_interval": round(self.pacer.interval, 3)
+        }
+
+
+async def async_fetch_locations(
+    locations: Iterable[Tuple[str, str]],
+    force: bool = False,
+    fetcher: BulkFetcher = None
+) -> Dict[Tuple[str, str], Tuple[Dict, List[Dict]]]:
+    """
+    Current weather and forecast for many (district, mandal) pairs.
+
+    Locations sharing a grid cell cost one fetch; failures fall back to the
+    same mock data / empty forecast as get_current_weather and get_weather_forecast.
+    """
+    locations = list(dict.fromkeys(locations))
+    if not upstream_available():
+        return {(d, m): (get_mock_weather_data(d, m), get_mock_forecast()) for d, m in locations}
+
+    cells = {location: get_cache_key(get_coordinates(*location), "current")[0] for location in locations}
+    await (fetcher or BulkFetcher()).fetch(
+        [(cell, kind) for cell in set(cells.values()) for kind in WEATHER_KINDS], force=force
+    )
+
+    results = {}
+    for (district, mandal), cell in cells.items():
+        weather_data = WEATHER_CACHE.peek((cell, "current"))
+        forecast_list = WEATHER_CACHE.peek((cell, "forecast"))
+        results[(district, mandal)] = (
+            with_location(weather_data, district, mandal) if weather_data is not MISSING
+            else get_mock_weather_data(district, mandal),
+            forecast_list if forecast_list is not MISSING else []
+        )
+    return results
+
+
+def fetch_locations(
+    locations: Iterable[Tuple[str, str]],
+    force: bool = False,
+    fetcher: BulkFetcher = None
+) -> Dict[Tuple[str, str], Tuple[Dict, List[Dict]]]:
+    """Blocking async_fetch_locations for scripts and batch jobs (not inside a running event loop)"""
+    return asyncio.run(async_fetch_locations(locations, force, fetcher))
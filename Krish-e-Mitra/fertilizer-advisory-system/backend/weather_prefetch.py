@@ -0,0 +1,229 @@
+"""
+Background weather prefetch.
+Every location we serve is known ahead of time (LOCATION_COORDS and the
+district/mandal pairs in farmer_records), so a scheduler thread refreshes
+current weather and forecast for their grid cells shortly before the cached
+entries expire, and recomputes each location's weather section (including
+analyze_weather_for_fertilizer) into the rules engine cache. Recommendation
+requests then find weather in memory instead of waiting on OpenWeatherMap.
+"""
+
+import asyncio
+import os
+import random
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from database import SessionLocal, FarmerRecord
+from metrics import register, Counter
+from rules_engine import WEATHER_CONTEXT_CACHE, weather_context_key, prime_weather_context
+from weather_bulk import BulkFetcher, WEATHER_KINDS
+from weather_service import (
+    LOCATION_COORDS, WEATHER_CACHE, CACHE_DURATION, get_coordinates, get_cache_key, provider_store,
+    upstream_available
+)
+from weather_store import STORE_ERRORS
+
+# Seconds between scheduler passes; 0 disables prefetching
+WEATHER_PREFETCH_TICK = float(os.getenv("WEATHER_PREFETCH_TICK", "30"))
+# Refresh an entry when it has less than this many seconds left, plus a
+# per-cell random offset of up to WEATHER_PREFETCH_JITTER so refreshes spread out
+WEATHER_PREFETCH_LEAD = float(os.getenv("WEATHER_PREFETCH_LEAD", "300"))
+WEATHER_PREFETCH_JITTER = float(os.getenv("WEATHER_PREFETCH_JITTER", "120"))
+# Upstream calls in flight at once (calls are also paced to this worker's
+# share of WEATHER_RATE_LIMIT, see weather_bulk.RATE_PACER)
+WEATHER_PREFETCH_CONCURRENCY = int(os.getenv("WEATHER_PREFETCH_CONCURRENCY", "4"))
+# Wait this long before retrying a cell whose refresh failed
+WEATHER_PREFETCH_RETRY = float(os.getenv("WEATHER_PREFETCH_RETRY", "120"))
+# Re-read the active locations from farmer_records this often
+WEATHER_PREFETCH_LOCATIONS_TTL = float(os.getenv("WEATHER_PREFETCH_LOCATIONS_TTL", "900"))
+
+PREFETCHES = register(Counter(
+    "advisory_weather_prefetch_total",
+    "Background weather refreshes by data type and result",
+    ("kind", "result")
+))
+
+
+def active_locations(db) -> List[Tuple[str, str]]:
+    """(district, mandal) for the known mandals and every location with farmer records"""
+    locations = {
+        (district, mandal)
+        for district, mandals in LOCATION_COORDS.items()
+        for mandal in mandals
+    }
+    rows = db.query(FarmerRecord.district, FarmerRecord.mandal).filter(
+        FarmerRecord.district.isnot(None), FarmerRecord.mandal.isnot(None)
+    ).distinct()
+    for district, mandal in rows:
+        if district.strip() and mandal.strip():
+            locations.add((district, mandal))
+    return sorted(locations)
+
+
+def group_by_cell(locations: List[Tuple[str, str]]) -> Dict[Tuple, List[Tuple[str, str]]]:
+    """Locations keyed by the grid cell their weather is fetched for"""
+    cells: Dict[Tuple, List[Tuple[str, str]]] = {}
+    for district, mandal in locations:
+        cell = get_cache_key(get_coordinates(district, mandal), "current")[0]
+        cells.setdefault(cell, []).append((district, mandal))
+    return cells
+
+
+def load_from_store(cache_key: Tuple, lead: float) -> bool:
+    """Adopt an entry another worker refreshed recently; True if one was found"""
+    store = provider_store()
+    try:
+        entry = store.get(cache_key) if store is not None else None
+    except sqlite3.Error as e:
+        STORE_ERRORS.inc("read")
+        print(f"Error reading weather store: {e}")
+        return False
+    if entry is None:
+        return False
+    data, fetched_at = entry
+    remaining = CACHE_DURATION - (time.time() - fetched_at)
+    if remaining <= lead:
+        return False
+    WEATHER_CACHE.set(cache_key, data, ttl=remaining)
+    return True
+
+
+class WeatherPrefetcher:
+    """Background thread that keeps weather for all active locations fresh"""
+
+    def __init__(
+        self,
+        tick: float = WEATHER_PREFETCH_TICK,
+        lead: float = WEATHER_PREFETCH_LEAD,
+        jitter: float = WEATHER_PREFETCH_JITTER,
+        concurrency: int = WEATHER_PREFETCH_CONCURRENCY
+    ):
+        self.tick = tick
+        self.lead = lead
+        self.jitter = jitter
+        self.concurrency = concurrency
+        # One fetcher for every pass, so its counters add up
+        self.fetcher = BulkFetcher(concurrency=concurrency)
+        self._cells: Dict[Tuple, List[Tuple[str, str]]] = {}
+        self._offsets: Dict[Tuple, float] = {}
+        self._retry_at: Dict[Tuple, float] = {}
+        self._locations_loaded_at = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_run: Optional[datetime] = None
+        self.last_refreshed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running or self.tick <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="weather-prefetcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        if not self.running:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self) -> None:
+        # First pass right away, so a cold worker is filled in the background
+        delay = 0.0
+        while not self._stop.wait(delay):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Error prefetching weather: {e!r}")
+            delay = self.tick * random.uniform(0.8, 1.2)
+
+    def refresh_locations(self, force: bool = False) -> None:
+        if not force and time.monotonic() - self._locations_loaded_at < WEATHER_PREFETCH_LOCATIONS_TTL:
+            return
+        db = SessionLocal()
+        try:
+            self._cells = group_by_cell(active_locations(db))
+        finally:
+            db.close()
+        self._offsets = {cell: self._offsets.get(cell, random.uniform(0, self.jitter)) for cell in self._cells}
+        self._locations_loaded_at = time.monotonic()
+
+    def due(self, cache_key: Tuple, now: float) -> bool:
+        """Whether an entry expires within the lead time (plus the cell's jitter)"""
+        if self._retry_at.get(cache_key, 0) > now:
+            return False
+        remaining = WEATHER_CACHE.remaining(cache_key)
+        return remaining is None or remaining <= self.lead + self._offsets.get(cache_key[0], 0)
+
+    def refresh(self, cache_keys: List[Tuple]) -> List[Tuple]:
+        """Refetch due (cell, kind) entries in one bulk fetch; returns the keys refreshed"""
+        refreshed = []
+        pending = []
+        for cache_key in cache_keys:
+            if load_from_store(cache_key, self.lead + self._offsets.get(cache_key[0], 0)):
+                PREFETCHES.inc(cache_key[1], "store")
+                refreshed.append(cache_key)
+            else:
+                pending.append(cache_key)
+        if not pending:
+            return refreshed
+
+        results = asyncio.run(self.fetcher.fetch(pending, force=True))
+        for cache_key, ok in results.items():
+            if ok:
+                self._retry_at.pop(cache_key, None)
+                PREFETCHES.inc(cache_key[1], "ok")
+                refreshed.append(cache_key)
+            else:
+                self._retry_at[cache_key] = time.monotonic() + WEATHER_PREFETCH_RETRY
+                PREFETCHES.inc(cache_key[1], "error")
+        return refreshed
+
+    def run_once(self) -> int:
+        """
+        One scheduler pass: refresh due cells in a paced bulk fetch, then
+        recompute weather sections for their locations and for any location
+        whose section is about to expire. Returns the number of entries refreshed.
+        """
+        self.refresh_locations()
+        now = time.monotonic()
+        due = []
+        if upstream_available():
+            due = [
+                (cell, kind) for cell in self._cells for kind in WEATHER_KINDS
+                if self.due((cell, kind), now)
+            ]
+        refreshed = self.refresh(due) if due else []
+        refreshed_cells = {cell for cell, _ in refreshed}
+
+        for cell, locations in self._cells.items():
+            for district, mandal in locations:
+                remaining = WEATHER_CONTEXT_CACHE.remaining(weather_context_key(district, mandal))
+                if cell in refreshed_cells or remaining is None or remaining <= self.tick * 2:
+                    prime_weather_context(district, mandal)
+
+        self.last_run = datetime.now()
+        self.last_refreshed = len(refreshed)
+        return len(refreshed)
+
+    def stats(self) -> Dict:
+        return {
+            "running": self.running,
+            "locations": sum(len(locations) for locations in self._cells.values()),
+            "cells": len(self._cells),
+            "last_run": self.last_run.isoformat() if self.last_run else None,
+            "last_refreshed": self.last_refreshed,
+            "retrying": sum(1 for at in self._retry_at.values() if at > time.monotonic()),
+            "bulk": self.fetcher.stats()
+        }
+
+
+weather_prefetcher = WeatherPrefetcher()
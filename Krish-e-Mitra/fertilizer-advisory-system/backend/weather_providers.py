@@ -0,0 +1,433 @@
+"""
+Pluggable sources of OpenWeatherMap-shaped weather payloads.
+weather_service parses whatever the configured provider returns, so the
+whole weather path (caching, breaker, analyze_weather_for_fertilizer) runs
+the same against:
+
+- live: the OpenWeatherMap API (weather_service.LiveProvider)
+- replay: payloads recorded to a JSON fixture file, with timestamps shifted
+  to the present
+- synthetic: generated from monthly climate normals for coastal Andhra
+  Pradesh, deterministic per grid point, day and seed
+
+Replay and synthetic providers can inject latency, timeouts, errors and
+429 responses, so load tests see realistic upstream behaviour offline.
+
+Record fixtures from the live API (or the synthetic generator) with:
+
+    python -m weather_providers record --out fixtures.json [--source synthetic:2025-07-15]
+"""
+
+import abc
+import argparse
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+import zlib
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+ENDPOINTS = ("weather", "forecast", "onecall")
+
+
+class WeatherProviderError(Exception):
+    """A provider call failed (connection error, timeout, bad status)"""
+
+
+class WeatherTimeout(WeatherProviderError):
+    """A provider call ran out of time"""
+
+
+class WeatherThrottled(WeatherProviderError):
+    """The provider answered 429; retry after `retry_after` seconds"""
+
+    def __init__(self, retry_after: float = 1.0):
+        super().__init__(f"rate limited, retry after {retry_after:g}s")
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> float:
+    """Seconds from a Retry-After header, clamped to 1-60 s"""
+    try:
+        return min(60.0, max(1.0, float(value or "1")))
+    except ValueError:
+        return 1.0
+
+
+class WeatherProvider(abc.ABC):
+    """
+    Source of raw payloads for the "weather", "forecast" and "onecall"
+    endpoints at a coordinate pair ({"lat": ..., "lon": ...}).
+    """
+
+    name = "provider"
+    requires_api_key = False
+    supports_onecall = False
+    # Whether payloads may be written to the persistent store shared with other workers
+    persistent = True
+
+    @abc.abstractmethod
+    def fetch(self, endpoint: str, coords: Dict[str, float], timeout: float) -> Dict:
+        """Blocking fetch; raises on failure (WeatherThrottled for rate limiting)"""
+
+    @abc.abstractmethod
+    async def async_fetch(self, endpoint: str, coords: Dict[str, float], timeout: float, client=None) -> Dict:
+        """Non-blocking fetch; `client` is a pooled httpx.AsyncClient for providers that use one"""
+
+    def stats(self) -> Dict[str, Any]:
+        return {"name": self.name}
+
+
+class SimulatedProvider(WeatherProvider):
+    """
+    Base for offline providers: adds injected latency (base plus uniform
+    jitter), failures at `error_rate`, 429s at `throttle_rate`, and a
+    timeout error when the latency exceeds the caller's timeout. Offline
+    payloads are kept in memory only, never in the shared weather store.
+    """
+
+    persistent = False
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 throttle_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.seed = seed
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+
+    @abc.abstractmethod
+    def payload(self, endpoint: str, coords: Dict[str, float]) -> Dict:
+        """Successful response body for an endpoint at a coordinate pair"""
+
+    def _draw(self, timeout: float):
+        """(seconds to wait, exception to raise afterwards or None) for one call"""
+        with self._lock:
+            self.calls += 1
+            delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+            roll = self._rng.random()
+        if delay >= timeout:
+            error = WeatherTimeout(f"timed out after {timeout:g}s")
+            delay = timeout
+        elif roll < self.throttle_rate:
+            error = WeatherThrottled(1.0)
+        elif roll < self.throttle_rate + self.error_rate:
+            error = WeatherProviderError("injected upstream error")
+        else:
+            error = None
+        if error is not None:
+            with self._lock:
+                self.errors += 1
+        return delay, error
+
+    def fetch(self, endpoint: str, coords: Dict[str, float], timeout: float) -> Dict:
+        delay, error = self._draw(timeout)
+        if delay > 0:
+            time.sleep(delay)
+        if error is not None:
+            raise error
+        return self.payload(endpoint, coords)
+
+    async def async_fetch(self, endpoint: str, coords: Dict[str, float], timeout: float, client=None) -> Dict:
+        delay, error = self._draw(timeout)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return self.payload(endpoint, coords)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "latency_seconds": self.latency,
+            "jitter_seconds": self.jitter,
+            "error_rate": self.error_rate,
+            "throttle_rate": self.throttle_rate,
+            "calls": self.calls,
+            "injected_errors": self.errors
+        }
+
+
+def _point_index(coords: Dict[str, float], salt: str = "") -> int:
+    """Stable integer for a coordinate pair (same on every run and process)"""
+    return zlib.crc32(f"{salt}{coords['lat']:.4f},{coords['lon']:.4f}".encode())
+
+
+def _shift_times(value: Any, delta: int) -> Any:
+    """Copy of a payload with every "dt" timestamp moved by `delta` seconds"""
+    if isinstance(value, dict):
+        return {k: (v + delta if k == "dt" and isinstance(v, (int, float)) else _shift_times(v, delta))
+                for k, v in value.items()}
+    if isinstance(value, list):
+        return [_shift_times(item, delta) for item in value]
+    return value
+
+
+class ReplayProvider(SimulatedProvider):
+    """
+    Replays payloads from a fixture file:
+
+        {"recorded_at": <epoch>, "weather": [...], "forecast": [...], "onecall": [...]}
+
+    Each coordinate pair always gets the same recording (chosen by a stable
+    hash), and timestamps are shifted so the recording starts now.
+    """
+
+    name = "replay"
+
+    def __init__(self, path: str, **injection):
+        super().__init__(**injection)
+        self.path = path
+        with open(path, encoding="utf-8") as f:
+            fixtures = json.load(f)
+        self.recorded_at = int(fixtures.get("recorded_at", 0))
+        self.recordings: Dict[str, List[Dict]] = {
+            endpoint: fixtures[endpoint] for endpoint in ENDPOINTS if fixtures.get(endpoint)
+        }
+        if "weather" not in self.recordings or "forecast" not in self.recordings:
+            raise ValueError(f"{path}: fixtures need 'weather' and 'forecast' recordings")
+        self.supports_onecall = "onecall" in self.recordings
+
+    def payload(self, endpoint: str, coords: Dict[str, float]) -> Dict:
+        recordings = self.recordings.get(endpoint)
+        if not recordings:
+            raise WeatherProviderError(f"no '{endpoint}' recordings in {self.path}")
+        recording = recordings[_point_index(coords, endpoint) % len(recordings)]
+        return _shift_times(recording, int(time.time()) - self.recorded_at)
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(
+            super().stats(),
+            path=self.path,
+            recordings={endpoint: len(items) for endpoint, items in self.recordings.items()}
+        )
+
+
+# Monthly normals for coastal Andhra Pradesh (Vijayawada): mean daily max and
+# min temperature (C), chance of a rainy day, mean rain on a rainy day (mm),
+# relative humidity (%) and cloud cover (%)
+MONTHLY_NORMALS = {
+    1: (30, 19, 0.03, 5, 65, 20),
+    2: (33, 21, 0.03, 5, 60, 20),
+    3: (36, 24, 0.05, 6, 58, 25),
+    4: (38, 27, 0.08, 8, 58, 30),
+    5: (41, 29, 0.10, 10, 55, 30),
+    6: (37, 28, 0.35, 12, 65, 60),
+    7: (33, 26, 0.55, 15, 78, 80),
+    8: (33, 26, 0.55, 15, 78, 80),
+    9: (33, 26, 0.50, 15, 78, 75),
+    10: (32, 24, 0.40, 18, 75, 65),
+    11: (30, 21, 0.15, 12, 70, 45),
+    12: (29, 19, 0.05, 6, 68, 30),
+}
+
+
+def describe_sky(clouds: float, rain_3h: float):
+    """(main, description, icon) in OpenWeatherMap terms"""
+    if rain_3h >= 7.6:
+        return "Rain", "heavy intensity rain", "10d"
+    if rain_3h >= 2.5:
+        return "Rain", "moderate rain", "10d"
+    if rain_3h > 0:
+        return "Rain", "light rain", "10d"
+    if clouds < 20:
+        return "Clear", "clear sky", "01d"
+    if clouds < 50:
+        return "Clouds", "scattered clouds", "03d"
+    if clouds < 85:
+        return "Clouds", "broken clouds", "04d"
+    return "Clouds", "overcast clouds", "04d"
+
+
+class SyntheticProvider(SimulatedProvider):
+    """
+    Weather generated from MONTHLY_NORMALS with day-to-day variation.
+
+    Values depend only on (seed, grid point, day, hour), so a point gives
+    the same weather for the same simulated time in every process. With
+    `as_of`, the simulated clock starts on that date (e.g. mid-July for a
+    monsoon load test) and runs forward in real time.
+    """
+
+    name = "synthetic"
+    supports_onecall = True
+
+    def __init__(self, as_of: Optional[date] = None, **injection):
+        super().__init__(**injection)
+        self.as_of = as_of
+        self._started = time.time()
+
+    def now(self) -> datetime:
+        if self.as_of is None:
+            return datetime.now()
+        start = datetime.combine(self.as_of, datetime.fromtimestamp(self._started).time())
+        return start + timedelta(seconds=time.time() - self._started)
+
+    def day(self, coords: Dict[str, float], day: date) -> Dict[str, float]:
+        """Daily weather at a point: max/min temperature, rain (mm), humidity, clouds"""
+        rng = random.Random(f"{self.seed}:{_point_index(coords)}:{day.toordinal()}")
+        t_max, t_min, rain_chance, rain_mean, humidity, clouds = MONTHLY_NORMALS[day.month]
+        anomaly = rng.gauss(0, 1.5)
+        rainy = rng.random() < rain_chance
+        rain = rng.expovariate(1 / rain_mean) if rainy else 0.0
+        return {
+            "temp_max": t_max + anomaly - (2.5 if rainy else 0),
+            "temp_min": t_min + anomaly / 2,
+            "rain": round(rain, 1),
+            "humidity": min(100, humidity + (12 if rainy else 0) + rng.gauss(0, 5)),
+            "clouds": min(100, max(0, (90 if rainy else clouds) + rng.gauss(0, 15))),
+            "pop": min(1.0, rain_chance + (0.3 if rainy else 0))
+        }
+
+    def hour(self, coords: Dict[str, float], at: datetime) -> Dict[str, float]:
+        """Three-hourly conditions: diurnal temperature and the day's rain spread over a few slots"""
+        day = self.day(coords, at.date())
+        # Coolest near 05:00, warmest near 14:00
+        phase = (1 - math.cos(2 * math.pi * ((at.hour - 5) % 24) / 18)) / 2 if 5 <= at.hour <= 23 else 0.0
+        temp = day["temp_min"] + (day["temp_max"] - day["temp_min"]) * min(1.0, phase)
+        slot = at.hour // 3
+        rng = random.Random(f"{self.seed}:{_point_index(coords)}:{at.date().toordinal()}:slots")
+        wet_slots = set(rng.sample(range(8), 3)) if day["rain"] else set()
+        rain_3h = round(day["rain"] / 3, 1) if slot in wet_slots else 0.0
+        return {
+            "temp": round(temp, 1),
+            "feels_like": round(temp + max(0.0, day["humidity"] - 40) * 0.08, 1),
+            "humidity": round(day["humidity"]),
+            "clouds": round(day["clouds"]),
+            "wind_speed": round(2 + rng.random() * 3, 1),
+            "rain_3h": rain_3h
+        }
+
+    def payload(self, endpoint: str, coords: Dict[str, float]) -> Dict:
+        now = self.now().replace(minute=0, second=0, microsecond=0)
+        current = self.hour(coords, now)
+        main, description, icon = describe_sky(current["clouds"], current["rain_3h"])
+        if endpoint == "weather":
+            payload = {
+                "coord": {"lat": coords["lat"], "lon": coords["lon"]},
+                "weather": [{"main": main, "description": description, "icon": icon}],
+                "main": {"temp": current["temp"], "feels_like": current["feels_like"], "humidity": current["humidity"]},
+                "wind": {"speed": current["wind_speed"]},
+                "clouds": {"all": current["clouds"]},
+                "dt": int(now.timestamp())
+            }
+            if current["rain_3h"]:
+                payload["rain"] = {"1h": round(current["rain_3h"] / 3, 1), "3h": current["rain_3h"]}
+            return payload
+
+        if endpoint == "forecast":
+            start = now - timedelta(hours=now.hour % 3)
+            items = []
+            for step in range(1, 41):  # 5 days in 3-hour steps
+                at = start + timedelta(hours=3 * step)
+                slot = self.hour(coords, at)
+                slot_main, slot_description, _ = describe_sky(slot["clouds"], slot["rain_3h"])
+                item = {
+                    "dt": int(at.timestamp()),
+                    "main": {"temp": slot["temp"], "humidity": slot["humidity"]},
+                    "weather": [{"main": slot_main, "description": slot_description}],
+                    "clouds": {"all": slot["clouds"]}
+                }
+                if slot["rain_3h"]:
+                    item["rain"] = {"3h": slot["rain_3h"]}
+                items.append(item)
+            return {"city": {"coord": {"lat": coords["lat"], "lon": coords["lon"]}}, "list": items}
+
+        if endpoint == "onecall":
+            daily = []
+            for offset in range(8):
+                day_date = now.date() + timedelta(days=offset)
+                day = self.day(coords, day_date)
+                day_main, day_description, day_icon = describe_sky(day["clouds"], day["rain"] / 3)
+                item = {
+                    "dt": int(datetime.combine(day_date, datetime.min.time()).replace(hour=12).timestamp()),
+                    "temp": {"min": round(day["temp_min"], 1), "max": round(day["temp_max"], 1)},
+                    "weather": [{"main": day_main, "description": day_description, "icon": day_icon}],
+                    "pop": round(day["pop"], 2)
+                }
+                if day["rain"]:
+                    item["rain"] = day["rain"]
+                daily.append(item)
+            current_payload = {
+                "dt": int(now.timestamp()),
+                "temp": current["temp"],
+                "feels_like": current["feels_like"],
+                "humidity": current["humidity"],
+                "clouds": current["clouds"],
+                "wind_speed": current["wind_speed"],
+                "weather": [{"main": main, "description": description, "icon": icon}]
+            }
+            if current["rain_3h"]:
+                current_payload["rain"] = {"1h": round(current["rain_3h"] / 3, 1)}
+            return {"lat": coords["lat"], "lon": coords["lon"], "current": current_payload, "daily": daily}
+
+        raise WeatherProviderError(f"unknown endpoint '{endpoint}'")
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(super().stats(), as_of=self.as_of.isoformat() if self.as_of else None)
+
+
+def create_provider(spec: str, **injection) -> WeatherProvider:
+    """
+    Offline provider from a spec string: "synthetic", "synthetic:YYYY-MM-DD"
+    or "replay:<fixtures.json>". `injection` holds latency, jitter,
+    error_rate, throttle_rate and seed. (The live provider is built by
+    weather_service, which owns the HTTP clients.)
+    """
+    kind, _, argument = spec.partition(":")
+    if kind == "synthetic":
+        return SyntheticProvider(as_of=date.fromisoformat(argument) if argument else None, **injection)
+    if kind == "replay":
+        if not argument:
+            raise ValueError("replay provider needs a fixture path: replay:<fixtures.json>")
+        return ReplayProvider(argument, **injection)
+    raise ValueError(f"unknown weather provider '{spec}'")
+
+
+def record_fixtures(provider: WeatherProvider, points: List[Dict[str, float]], path: str,
+                    timeout: float = 10.0) -> Dict[str, int]:
+    """Fetch every endpoint the provider supports at each point and write a replay fixture file"""
+    fixtures: Dict[str, Any] = {"recorded_at": int(time.time()), "source": provider.name}
+    endpoints = ENDPOINTS if provider.supports_onecall else ENDPOINTS[:2]
+    for endpoint in endpoints:
+        recordings = []
+        for coords in points:
+            try:
+                recordings.append(provider.fetch(endpoint, coords, timeout))
+            except Exception as e:
+                print(f"Skipping {endpoint} at {coords}: {e}")
+        fixtures[endpoint] = recordings
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(fixtures, f, ensure_ascii=False, indent=1)
+    return {endpoint: len(fixtures[endpoint]) for endpoint in endpoints}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record weather fixtures for the replay provider")
+    parser.add_argument("command", choices=["record"])
+    parser.add_argument("--out", required=True, help="Fixture file to write")
+    parser.add_argument("--source", default="live", help="live, synthetic or synthetic:YYYY-MM-DD")
+    args = parser.parse_args()
+
+    # Imported here: weather_service imports this module
+    from weather_service import LOCATION_COORDS, LiveProvider, has_api_key
+    if args.source == "live":
+        if not has_api_key():
+            parser.error("recording from the live API needs OPENWEATHER_API_KEY")
+        provider = LiveProvider()
+    else:
+        provider = create_provider(args.source)
+    points = [coords for mandals in LOCATION_COORDS.values() for coords in mandals.values()]
+    counts = record_fixtures(provider, points, args.out)
+    print(f"Recorded {counts} from {provider.name} to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,93 @@
 import os
+import time
+import asyncio
+import sqlite3
+import threading
+import httpx
 import requests
 from datetime import datetime, timedelta
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Tuple
 from dotenv import load_dotenv
+from cache import TTLCache, SingleFlight, MISSING
+from circuit_breaker import CircuitBreaker, STATE_VALUES
+from metrics import register, Counter, Gauge, WEATHER_CACHE_LOOKUPS, UPSTREAM_ERRORS
+from weather_store import get_weather_store, STORE_ERRORS
+from weather_providers import (
+    WeatherProvider, WeatherThrottled, WeatherTimeout, create_provider, parse_retry_after
+)
 
 # Load environment variables
 load_dotenv()
 
 # OpenWeatherMap API configuration
 API_KEY = os.getenv("OPENWEATHER_API_KEY", "")
-BASE_URL = "https://api.openweathermap.org/data/2.5"
+BASE_URL = os.getenv("OPENWEATHER_BASE_URL", "https://api.openweathermap.org/data/2.5")
+# One Call API base (e.g. https://api.openweathermap.org/data/3.0); empty uses /weather and /forecast
+ONECALL_URL = os.getenv("OPENWEATHER_ONECALL_URL", "")
 CACHE_DURATION = int(os.getenv("WEATHER_CACHE_DURATION", "3600"))
+REQUEST_TIMEOUT = 5
 
-# Simple in-memory cache
-weather_cache = {}
+# Where weather comes from: "live" (OpenWeatherMap), or for load tests without
+# network access "replay:<fixtures.json>" or "synthetic[:YYYY-MM-DD]" (see
+# weather_providers). Offline providers inject latency (base plus uniform
+# jitter, seconds), errors and 429s at the given rates
+WEATHER_PROVIDER = os.getenv("WEATHER_PROVIDER", "live")
+WEATHER_PROVIDER_INJECTION = {
+    "latency": float(os.getenv("WEATHER_PROVIDER_LATENCY", "0")),
+    "jitter": float(os.getenv("WEATHER_PROVIDER_JITTER", "0")),
+    "error_rate": float(os.getenv("WEATHER_PROVIDER_ERROR_RATE", "0")),
+    "throttle_rate": float(os.getenv("WEATHER_PROVIDER_THROTTLE_RATE", "0")),
+    "seed": int(os.getenv("WEATHER_PROVIDER_SEED", "0"))
+}
+# Size of a weather grid cell in degrees (0.1 is about 11 km); mandals in the
+# same cell share one upstream call and cache entry. 0 keys by exact coordinates
+WEATHER_GRID_DEGREES = float(os.getenv("WEATHER_GRID_DEGREES", "0.1"))
+
+# Parsed upstream responses keyed by (grid cell, "current"/"forecast"), so
+# upstream calls per TTL are bounded by the number of cells in use. Misses
+# read through to the persistent store shared by all workers (weather_store)
+WEATHER_CACHE = TTLCache(
+    maxsize=int(os.getenv("WEATHER_CACHE_SIZE", "2048")),
+    ttl=CACHE_DURATION,
+    name="weather_upstream"
+)
+# Concurrent misses for the same cell wait for one upstream call
+WEATHER_FLIGHTS = SingleFlight("weather_upstream")
+
+# Seconds a request may wait on OpenWeatherMap for its weather (current and
+# forecast together); upstream timeouts are cut to what is left of it
+WEATHER_LATENCY_BUDGET = float(os.getenv("WEATHER_LATENCY_BUDGET", "2.0"))
+# Consecutive upstream failures that open the breaker, and seconds before it
+# lets a probe through; while open, calls fail fast to last-known-good data
+WEATHER_BREAKER = CircuitBreaker(
+    "openweathermap",
+    failure_threshold=int(os.getenv("WEATHER_BREAKER_FAILURES", "5")),
+    reset_timeout=float(os.getenv("WEATHER_BREAKER_RESET", "30"))
+)
+# Last successful payload per cell, served (marked stale) when a fetch fails
+WEATHER_STALE_MAX_AGE = int(os.getenv("WEATHER_STALE_MAX_AGE", "86400"))
+LAST_GOOD = TTLCache(
+    maxsize=WEATHER_CACHE.maxsize,
+    ttl=WEATHER_STALE_MAX_AGE,
+    name="weather_last_good"
+)
+# Timeouts of calls cut short by the latency budget are the request running
+# out of time, not the provider failing, so they do not count toward the breaker
+BUDGET_TIMEOUTS = register(Counter(
+    "advisory_weather_budget_timeouts_total",
+    "Upstream weather calls that timed out on the remaining latency budget",
+    ("endpoint",)
+))
+register(Gauge(
+    "advisory_circuit_breaker_state",
+    "Upstream circuit breaker state (0 closed, 1 half-open, 2 open)",
+    ("breaker",),
+    lambda: {(WEATHER_BREAKER.name,): STATE_VALUES[WEATHER_BREAKER.state]}
+))
+
+# Shared keep-alive connection pools (sync callers and async handlers)
+http_session = requests.Session()
+_async_client: Optional[httpx.AsyncClient] = None
 
 # District/Mandal to coordinates mapping (for NTR district)
 # In production, this would be a comprehensive database
@@ -41,21 +115,30 @@ def get_coordinates(district: str, mandal: str) -> Optional[Dict[str, float]]:
     # Default to NTR district center if not found
     return {"lat": 16.5062, "lon": 80.6480}
 
-def get_cache_key(district: str, mandal: str, weather_type: str) -> str:
-    """Generate cache key for weather data"""
-    return f"{district}_{mandal}_{weather_type}"
+def grid_cell(coords: Dict[str, float]) -> Tuple:
+    """
+    Grid cell containing a coordinate pair, as (grid size, row, column), or
+    (0, lat, lon) if the grid is disabled. The grid size is part of the cell so
+    entries cached or stored under another WEATHER_GRID_DEGREES never match.
+    """
+    if WEATHER_GRID_DEGREES <= 0:
+        return (0.0, coords["lat"], coords["lon"])
+    return (
+        WEATHER_GRID_DEGREES,
+        round(coords["lat"] / WEATHER_GRID_DEGREES),
+        round(coords["lon"] / WEATHER_GRID_DEGREES)
+    )
 
-def is_cache_valid(cache_entry: Dict) -> bool:
-    """Check if cached data is still valid"""
-    if not cache_entry:
-        return False
-    
-    cached_time = cache_entry.get("cached_at")
-    if not cached_time:
-        return False
-    
-    age = (datetime.now() - cached_time).total_seconds()
-    return age < CACHE_DURATION
+def grid_coordinates(cell: Tuple) -> Dict[str, float]:
+    """Point that weather is fetched for on behalf of every location in a cell"""
+    grid, row, column = cell
+    if grid <= 0:
+        return {"lat": row, "lon": column}
+    return {"lat": round(row * grid, 4), "lon": round(column * grid, 4)}
+
+def get_cache_key(coords: Dict[str, float], weather_type: str) -> Tuple:
+    """Generate cache key for weather data"""
+    return (grid_cell(coords), weather_type)
 
 def get_mock_weather_data(district: str, mandal: str) -> Dict:
     """Generate mock weather data as fallback"""
@@ -75,24 +158,377 @@ def get_mock_weather_data(district: str, mandal: str) -> Dict:
         "is_mock": True
     }
 
-def get_current_weather(district: str, mandal: str) -> Dict:
+def has_api_key() -> bool:
+    """Check whether a real OpenWeatherMap API key is configured"""
+    return bool(API_KEY) and API_KEY != "your_api_key_here"
+
+def get_mock_forecast() -> List[Dict]:
+    """Generate mock 5-day forecast as fallback"""
+    return [
+        {
+            "date": (datetime.now() + timedelta(days=i)).strftime("%Y-%m-%d"),
+            "temp_max": 32 + i,
+            "temp_min": 22 + i,
+            "description": "Partly cloudy",
+            "rain_probability": 20 if i < 2 else 60,
+            "rain_mm": 0 if i < 2 else 5.0
+        }
+        for i in range(5)
+    ]
+
+def get_request_params(coords: Dict[str, float]) -> Dict:
+    """Build OpenWeatherMap query parameters for a coordinate pair"""
+    return {
+        "lat": coords["lat"],
+        "lon": coords["lon"],
+        "appid": API_KEY,
+        "units": "metric"
+    }
+
+class LiveProvider(WeatherProvider):
+    """OpenWeatherMap over the shared connection pools (BASE_URL and API_KEY are read per call)"""
+
+    name = "live"
+    requires_api_key = True
+
+    def __init__(self, onecall_url: str = None):
+        self.onecall_url = ONECALL_URL if onecall_url is None else onecall_url
+        self.supports_onecall = bool(self.onecall_url)
+
+    def request(self, endpoint: str, coords: Dict[str, float]) -> Tuple[str, Dict]:
+        params = get_request_params(coords)
+        if endpoint == "onecall":
+            return f"{self.onecall_url}/onecall", dict(params, exclude="minutely,hourly,alerts")
+        return f"{BASE_URL}/{endpoint}", params
+
+    def fetch(self, endpoint: str, coords: Dict[str, float], timeout: float) -> Dict:
+        url, params = self.request(endpoint, coords)
+        response = http_session.get(url, params=params, timeout=timeout)
+        if response.status_code == 429:
+            raise WeatherThrottled(parse_retry_after(response.headers.get("Retry-After")))
+        response.raise_for_status()
+        return response.json()
+
+    async def async_fetch(self, endpoint: str, coords: Dict[str, float], timeout: float, client=None) -> Dict:
+        url, params = self.request(endpoint, coords)
+        response = await (client or get_async_client()).get(url, params=params, timeout=timeout)
+        if response.status_code == 429:
+            raise WeatherThrottled(parse_retry_after(response.headers.get("Retry-After")))
+        response.raise_for_status()
+        return response.json()
+
+    def stats(self) -> Dict:
+        return {"name": self.name, "base_url": BASE_URL, "onecall": self.supports_onecall}
+
+_provider: Optional[WeatherProvider] = None
+_provider_lock = threading.Lock()
+
+def get_provider() -> WeatherProvider:
+    """The configured weather provider (WEATHER_PROVIDER), created on first use"""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                if WEATHER_PROVIDER == "live":
+                    _provider = LiveProvider()
+                else:
+                    _provider = create_provider(WEATHER_PROVIDER, **WEATHER_PROVIDER_INJECTION)
+                    print(f"Weather provider: {WEATHER_PROVIDER}")
+    return _provider
+
+def set_provider(provider: Optional[WeatherProvider]) -> None:
+    """
+    Replace the weather provider (load tests); None goes back to WEATHER_PROVIDER.
+    Cached and last-known-good weather is dropped, so payloads from one
+    provider are never served as another's.
+    """
+    global _provider
+    with _provider_lock:
+        _provider = provider
+    WEATHER_CACHE.clear()
+    LAST_GOOD.clear()
+
+def provider_store():
+    """The persistent store, or None while an offline provider (replay, synthetic) is in use"""
+    return get_weather_store() if get_provider().persistent else None
+
+def upstream_available() -> bool:
+    """Whether the provider can be called (live needs an API key, offline providers do not)"""
+    return not get_provider().requires_api_key or has_api_key()
+
+def parse_current_weather(data: Dict, district: str, mandal: str) -> Dict:
+    """Extract relevant weather information from an OpenWeatherMap /weather payload"""
+    return {
+        "location": f"{mandal}, {district}",
+        "temperature": data["main"]["temp"],
+        "feels_like": data["main"]["feels_like"],
+        "humidity": data["main"]["humidity"],
+        "description": data["weather"][0]["description"],
+        "main": data["weather"][0]["main"],
+        "icon": data["weather"][0]["icon"],
+        "wind_speed": data["wind"]["speed"],
+        "clouds": data["clouds"]["all"],
+        "rain_1h": data.get("rain", {}).get("1h", 0),
+        "rain_3h": data.get("rain", {}).get("3h", 0),
+        "timestamp": datetime.now().isoformat(),
+        "is_mock": False
+    }
+
+def parse_forecast(data: Dict) -> List[Dict]:
+    """Group an OpenWeatherMap /forecast payload into daily summaries"""
+    daily_forecast = {}
+    for item in data["list"]:
+        date = datetime.fromtimestamp(item["dt"]).strftime("%Y-%m-%d")
+        
+        if date not in daily_forecast:
+            daily_forecast[date] = {
+                "date": date,
+                "temps": [],
+                "descriptions": [],
+                "rain": []
+            }
+        
+        daily_forecast[date]["temps"].append(item["main"]["temp"])
+        daily_forecast[date]["descriptions"].append(item["weather"][0]["description"])
+        daily_forecast[date]["rain"].append(item.get("rain", {}).get("3h", 0))
+    
+    # Aggregate daily data
+    forecast_list = []
+    for date, day_data in sorted(daily_forecast.items())[:5]:
+        forecast_list.append({
+            "date": date,
+            "temp_max": max(day_data["temps"]),
+            "temp_min": min(day_data["temps"]),
+            "description": max(set(day_data["descriptions"]), key=day_data["descriptions"].count),
+            "rain_probability": 100 if sum(day_data["rain"]) > 0 else 20,
+            "rain_mm": sum(day_data["rain"])
+        })
+    
+    return forecast_list
+
+def get_memory_cached(cache_key: Tuple):
+    """Cached data for a key from memory only, or None"""
+    data = WEATHER_CACHE.get(cache_key, None)
+    if data is not None:
+        WEATHER_CACHE_LOOKUPS.inc(cache_key[1], "hit")
+    return data
+
+def load_stored(cache_key: Tuple):
+    """Unexpired data for a key from the persistent store (copied into memory), or None"""
+    store = provider_store()
+    if store is not None:
+        try:
+            entry = store.get(cache_key)
+        except sqlite3.Error as e:
+            STORE_ERRORS.inc("read")
+            print(f"Error reading weather store: {e}")
+            entry = None
+        if entry is not None:
+            data, fetched_at = entry
+            remaining = CACHE_DURATION - (time.time() - fetched_at)
+            if remaining > 0:
+                WEATHER_CACHE.set(cache_key, data, ttl=remaining)
+                WEATHER_CACHE_LOOKUPS.inc(cache_key[1], "store_hit")
+                return data
+    
+    WEATHER_CACHE_LOOKUPS.inc(cache_key[1], "miss")
+    return None
+
+def get_cached(cache_key: Tuple):
+    """Return cached data for a key from memory or the persistent store, or None if missing or expired"""
+    data = get_memory_cached(cache_key)
+    return data if data is not None else load_stored(cache_key)
+
+async def async_get_cached(cache_key: Tuple):
+    """get_cached with the store read (SQLite, up to its busy timeout) in a worker thread"""
+    data = get_memory_cached(cache_key)
+    return data if data is not None else await asyncio.to_thread(load_stored, cache_key)
+
+def remember(cache_key: Tuple, data) -> None:
+    """Cache freshly fetched data in memory, also as last-known-good"""
+    WEATHER_CACHE.set(cache_key, data)
+    LAST_GOOD.set(cache_key, (data, time.time()))
+
+def store_payload(cache_key: Tuple, data) -> None:
+    store = provider_store()
+    if store is not None:
+        try:
+            store.put(cache_key, data)
+        except sqlite3.Error as e:
+            STORE_ERRORS.inc("write")
+            print(f"Error writing weather store: {e}")
+
+def set_cached(cache_key: Tuple, data) -> None:
+    remember(cache_key, data)
+    store_payload(cache_key, data)
+
+async def async_set_cached(cache_key: Tuple, data) -> None:
+    """set_cached with the store write in a worker thread"""
+    remember(cache_key, data)
+    await asyncio.to_thread(store_payload, cache_key, data)
+
+def warm_weather_cache() -> int:
+    """Load unexpired entries from the persistent store into memory; returns the count"""
+    store = provider_store()
+    if store is None:
+        return 0
+    loaded = 0
+    try:
+        for cache_key, data, fetched_at in store.fresh_entries(CACHE_DURATION):
+            WEATHER_CACHE.set(cache_key, data, ttl=CACHE_DURATION - (time.time() - fetched_at))
+            loaded += 1
+    except sqlite3.Error as e:
+        STORE_ERRORS.inc("read")
+        print(f"Error reading weather store: {e}")
+    return loaded
+
+def load_stored_stale(cache_key: Tuple) -> Optional[Tuple]:
+    """(data, fetched_at) from the persistent store if fetched within WEATHER_STALE_MAX_AGE, or None"""
+    store = provider_store()
+    try:
+        entry = store.get(cache_key) if store is not None else None
+    except sqlite3.Error as e:
+        STORE_ERRORS.inc("read")
+        print(f"Error reading weather store: {e}")
+        return None
+    if entry is not None and time.time() - entry[1] > WEATHER_STALE_MAX_AGE:
+        return None
+    return entry
+
+def get_stale(cache_key: Tuple):
     """
-    Get current weather for a location
+    Last-known-good data for a key after a failed fetch, or None.
+
+    Current weather is marked with is_stale and its age; stale forecasts
+    lose days that are already past and mark each remaining day.
+    """
+    entry = LAST_GOOD.get(cache_key, None)
+    if entry is None:
+        entry = load_stored_stale(cache_key)
+    return mark_stale(cache_key, entry)
+
+async def async_get_stale(cache_key: Tuple):
+    """get_stale with the store read in a worker thread"""
+    entry = LAST_GOOD.get(cache_key, None)
+    if entry is None:
+        entry = await asyncio.to_thread(load_stored_stale, cache_key)
+    return mark_stale(cache_key, entry)
+
+def mark_stale(cache_key: Tuple, entry: Optional[Tuple]):
+    if entry is None:
+        return None
+    
+    data, fetched_at = entry
+    WEATHER_CACHE_LOOKUPS.inc(cache_key[1], "stale")
+    age_seconds = round(time.time() - fetched_at)
+    if cache_key[1] == "current":
+        return dict(data, is_stale=True, age_seconds=age_seconds)
+    today = datetime.now().strftime("%Y-%m-%d")
+    return [dict(day, is_stale=True, age_seconds=age_seconds) for day in data if day["date"] >= today]
+
+def weather_deadline() -> float:
+    """Deadline (time.monotonic) for the upstream calls of one request"""
+    return time.monotonic() + WEATHER_LATENCY_BUDGET
+
+def budget_timeout(deadline: Optional[float]) -> float:
+    """Timeout for an upstream call that must finish by `deadline`; 0 if it has passed"""
+    if deadline is None:
+        return REQUEST_TIMEOUT
+    return max(0.0, min(REQUEST_TIMEOUT, deadline - time.monotonic()))
+
+def record_fetch_error(error: Exception, endpoint: str, timeout: float) -> None:
+    """Count a failed upstream call toward the breaker, unless it only ran out of budget"""
+    if timeout < REQUEST_TIMEOUT and isinstance(error, (requests.Timeout, httpx.TimeoutException, WeatherTimeout)):
+        WEATHER_BREAKER.record_abandoned()
+        BUDGET_TIMEOUTS.inc(endpoint)
+        return
+    WEATHER_BREAKER.record_failure(error)
+    UPSTREAM_ERRORS.inc("openweathermap", endpoint)
+
+def is_degraded(weather_data: Dict) -> bool:
+    """Whether weather is a fallback (stale, or mock although the provider could be called)"""
+    return bool(weather_data.get("is_stale")) or (bool(weather_data.get("is_mock")) and upstream_available())
+
+def with_location(weather_data: Dict, district: str, mandal: str) -> Dict:
+    """Cell-level current weather labelled with the requested location"""
+    return dict(weather_data, location=f"{mandal}, {district}")
+
+def weather_cache_stats() -> Dict:
+    """Upstream weather cache and single-flight counters"""
+    store = provider_store()
+    return dict(
+        WEATHER_CACHE.stats(),
+        grid_degrees=WEATHER_GRID_DEGREES,
+        single_flight=WEATHER_FLIGHTS.stats(),
+        store=store.stats() if store is not None else None,
+        last_good=len(LAST_GOOD),
+        breaker=WEATHER_BREAKER.stats(),
+        provider=get_provider().stats()
+    )
+
+def fetch_current_weather(cache_key: Tuple, timeout: float = REQUEST_TIMEOUT) -> Optional[Dict]:
+    """
+    Call /weather for a grid cell and cache the result; None on failure, when
+    the breaker is open or when no time is left (timeout 0)
+    """
+    # A call for the cell that finished just before this one may have filled the cache
+    cached = WEATHER_CACHE.peek(cache_key)
+    if cached is not MISSING:
+        return cached
+    if timeout <= 0 or not WEATHER_BREAKER.allow():
+        return None
+    try:
+        # Call the provider (OpenWeatherMap over the shared session when live)
+        data = get_provider().fetch("weather", grid_coordinates(cache_key[0]), timeout)
+        weather_data = parse_current_weather(data, "", "")
+        WEATHER_BREAKER.record_success()
+        set_cached(cache_key, weather_data)
+        return weather_data
+        
+    except Exception as e:
+        record_fetch_error(e, "weather", timeout)
+        print(f"Error fetching weather data: {e}")
+        return None
+
+def fetch_forecast(cache_key: Tuple, timeout: float = REQUEST_TIMEOUT) -> Optional[List[Dict]]:
+    """
+    Call /forecast for a grid cell and cache the result; None on failure, when
+    the breaker is open or when no time is left (timeout 0)
+    """
+    # A call for the cell that finished just before this one may have filled the cache
+    cached = WEATHER_CACHE.peek(cache_key)
+    if cached is not MISSING:
+        return cached
+    if timeout <= 0 or not WEATHER_BREAKER.allow():
+        return None
+    try:
+        data = get_provider().fetch("forecast", grid_coordinates(cache_key[0]), timeout)
+        forecast_list = parse_forecast(data)
+        WEATHER_BREAKER.record_success()
+        set_cached(cache_key, forecast_list)
+        return forecast_list
+        
+    except Exception as e:
+        record_fetch_error(e, "forecast", timeout)
+        print(f"Error fetching forecast data: {e}")
+        return None
+
+def get_current_weather(district: str, mandal: str, deadline: Optional[float] = None) -> Dict:
+    """
+    Get current weather for a location (blocking; prefer async_get_current_weather
+    inside async handlers)
     
     Args:
         district: District name
         mandal: Mandal name
+        deadline: time.monotonic() by which upstream calls must finish
+            (default: WEATHER_LATENCY_BUDGET from now)
     
     Returns:
         Dictionary with current weather data
     """
-    # Check cache first
-    cache_key = get_cache_key(district, mandal, "current")
-    if cache_key in weather_cache and is_cache_valid(weather_cache[cache_key]):
-        return weather_cache[cache_key]["data"]
-    
-    # If no API key, return mock data
-    if not API_KEY or API_KEY == "your_api_key_here":
+    # If the provider cannot be called (no API key), return mock data
+    if not upstream_available():
         return get_mock_weather_data(district, mandal)
     
     # Get coordinates
@@ -100,140 +536,185 @@ def get_current_weather(district: str, mandal: str) -> Dict:
     if not coords:
         return get_mock_weather_data(district, mandal)
     
-    try:
-        # Call OpenWeatherMap API
-        url = f"{BASE_URL}/weather"
-        params = {
-            "lat": coords["lat"],
-            "lon": coords["lon"],
-            "appid": API_KEY,
-            "units": "metric"
-        }
-        
-        response = requests.get(url, params=params, timeout=5)
-        response.raise_for_status()
-        
-        data = response.json()
-        
-        # Extract relevant weather information
-        weather_data = {
-            "location": f"{mandal}, {district}",
-            "temperature": data["main"]["temp"],
-            "feels_like": data["main"]["feels_like"],
-            "humidity": data["main"]["humidity"],
-            "description": data["weather"][0]["description"],
-            "main": data["weather"][0]["main"],
-            "icon": data["weather"][0]["icon"],
-            "wind_speed": data["wind"]["speed"],
-            "clouds": data["clouds"]["all"],
-            "rain_1h": data.get("rain", {}).get("1h", 0),
-            "rain_3h": data.get("rain", {}).get("3h", 0),
-            "timestamp": datetime.now().isoformat(),
-            "is_mock": False
-        }
-        
-        # Cache the data
-        weather_cache[cache_key] = {
-            "data": weather_data,
-            "cached_at": datetime.now()
-        }
-        
-        return weather_data
-        
-    except Exception as e:
-        print(f"Error fetching weather data: {e}")
+    # Check cache first, then fetch once for all concurrent misses in the cell
+    cache_key = get_cache_key(coords, "current")
+    weather_data = get_cached(cache_key)
+    if weather_data is None:
+        deadline = deadline or weather_deadline()
+        weather_data = WEATHER_FLIGHTS.do(
+            cache_key, lambda: fetch_current_weather(cache_key, budget_timeout(deadline))
+        )
+    if weather_data is None:
+        # Upstream failed, too slow or shed by the breaker: last-known-good, then mock
+        weather_data = get_stale(cache_key)
+    if weather_data is None:
         return get_mock_weather_data(district, mandal)
+    return with_location(weather_data, district, mandal)
 
-def get_weather_forecast(district: str, mandal: str) -> List[Dict]:
+def get_weather_forecast(district: str, mandal: str, deadline: Optional[float] = None) -> List[Dict]:
     """
-    Get 5-day weather forecast for a location
+    Get 5-day weather forecast for a location (blocking; prefer
+    async_get_weather_forecast inside async handlers)
     
     Args:
         district: District name
         mandal: Mandal name
+        deadline: time.monotonic() by which upstream calls must finish
+            (default: WEATHER_LATENCY_BUDGET from now)
     
     Returns:
         List of forecast data for next 5 days
     """
-    # Check cache first
-    cache_key = get_cache_key(district, mandal, "forecast")
-    if cache_key in weather_cache and is_cache_valid(weather_cache[cache_key]):
-        return weather_cache[cache_key]["data"]
-    
-    # If no API key, return mock forecast
-    if not API_KEY or API_KEY == "your_api_key_here":
-        return [
-            {
-                "date": (datetime.now() + timedelta(days=i)).strftime("%Y-%m-%d"),
-                "temp_max": 32 + i,
-                "temp_min": 22 + i,
-                "description": "Partly cloudy",
-                "rain_probability": 20 if i < 2 else 60,
-                "rain_mm": 0 if i < 2 else 5.0
-            }
-            for i in range(5)
-        ]
+    # If the provider cannot be called (no API key), return mock forecast
+    if not upstream_available():
+        return get_mock_forecast()
     
     # Get coordinates
     coords = get_coordinates(district, mandal)
     if not coords:
         return []
     
+    # Check cache first, then fetch once for all concurrent misses in the cell
+    cache_key = get_cache_key(coords, "forecast")
+    forecast_list = get_cached(cache_key)
+    if forecast_list is None:
+        deadline = deadline or weather_deadline()
+        forecast_list = WEATHER_FLIGHTS.do(
+            cache_key, lambda: fetch_forecast(cache_key, budget_timeout(deadline))
+        )
+    if forecast_list is None:
+        forecast_list = get_stale(cache_key)
+    return forecast_list if forecast_list is not None else []
+
+def get_known_weather(district: str, mandal: str) -> Tuple[Dict, List[Dict]]:
+    """
+    Current weather and forecast for a location from memory, else
+    last-known-good data, else mock data / empty forecast. Never calls the
+    provider (the prefetcher builds weather sections with this after its
+    bulk refresh, so a failed refresh is not retried cell by cell).
+    """
+    if not upstream_available():
+        return get_mock_weather_data(district, mandal), get_mock_forecast()
+    
+    coords = get_coordinates(district, mandal)
+    known = []
+    for weather_type in ("current", "forecast"):
+        cache_key = get_cache_key(coords, weather_type)
+        data = WEATHER_CACHE.peek(cache_key)
+        known.append(data if data is not MISSING else get_stale(cache_key))
+    weather_data, forecast_list = known
+    return (
+        with_location(weather_data, district, mandal) if weather_data is not None
+        else get_mock_weather_data(district, mandal),
+        forecast_list if forecast_list is not None else []
+    )
+
+def get_async_client() -> httpx.AsyncClient:
+    """Get the shared async HTTP client, creating it on first use"""
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(
+            timeout=REQUEST_TIMEOUT,
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20)
+        )
+    return _async_client
+
+async def close_async_client() -> None:
+    """Close the shared async HTTP client (call on application shutdown)"""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+async def async_fetch_current_weather(cache_key: Tuple, timeout: float = REQUEST_TIMEOUT) -> Optional[Dict]:
+    """Non-blocking fetch_current_weather using the pooled async client"""
+    # A call for the cell that finished just before this one may have filled the cache
+    cached = WEATHER_CACHE.peek(cache_key)
+    if cached is not MISSING:
+        return cached
+    if timeout <= 0 or not WEATHER_BREAKER.allow():
+        return None
     try:
-        # Call OpenWeatherMap API
-        url = f"{BASE_URL}/forecast"
-        params = {
-            "lat": coords["lat"],
-            "lon": coords["lon"],
-            "appid": API_KEY,
-            "units": "metric"
-        }
-        
-        response = requests.get(url, params=params, timeout=5)
-        response.raise_for_status()
-        
-        data = response.json()
-        
-        # Process forecast data (group by day)
-        daily_forecast = {}
-        for item in data["list"]:
-            date = datetime.fromtimestamp(item["dt"]).strftime("%Y-%m-%d")
-            
-            if date not in daily_forecast:
-                daily_forecast[date] = {
-                    "date": date,
-                    "temps": [],
-                    "descriptions": [],
-                    "rain": []
-                }
-            
-            daily_forecast[date]["temps"].append(item["main"]["temp"])
-            daily_forecast[date]["descriptions"].append(item["weather"][0]["description"])
-            daily_forecast[date]["rain"].append(item.get("rain", {}).get("3h", 0))
-        
-        # Aggregate daily data
-        forecast_list = []
-        for date, day_data in sorted(daily_forecast.items())[:5]:
-            forecast_list.append({
-                "date": date,
-                "temp_max": max(day_data["temps"]),
-                "temp_min": min(day_data["temps"]),
-                "description": max(set(day_data["descriptions"]), key=day_data["descriptions"].count),
-                "rain_probability": 100 if sum(day_data["rain"]) > 0 else 20,
-                "rain_mm": sum(day_data["rain"])
-            })
-        
-        # Cache the data
-        weather_cache[cache_key] = {
-            "data": forecast_list,
-            "cached_at": datetime.now()
-        }
+        data = await get_provider().async_fetch("weather", grid_coordinates(cache_key[0]), timeout)
+        weather_data = parse_current_weather(data, "", "")
+        WEATHER_BREAKER.record_success()
+        await async_set_cached(cache_key, weather_data)
+        return weather_data
         
+    except Exception as e:
+        record_fetch_error(e, "weather", timeout)
+        print(f"Error fetching weather data: {e}")
+        return None
+
+async def async_fetch_forecast(cache_key: Tuple, timeout: float = REQUEST_TIMEOUT) -> Optional[List[Dict]]:
+    """Non-blocking fetch_forecast using the pooled async client"""
+    # A call for the cell that finished just before this one may have filled the cache
+    cached = WEATHER_CACHE.peek(cache_key)
+    if cached is not MISSING:
+        return cached
+    if timeout <= 0 or not WEATHER_BREAKER.allow():
+        return None
+    try:
+        data = await get_provider().async_fetch("forecast", grid_coordinates(cache_key[0]), timeout)
+        forecast_list = parse_forecast(data)
+        WEATHER_BREAKER.record_success()
+        await async_set_cached(cache_key, forecast_list)
         return forecast_list
         
     except Exception as e:
+        record_fetch_error(e, "forecast", timeout)
         print(f"Error fetching forecast data: {e}")
+        return None
+
+async def async_get_current_weather(district: str, mandal: str, deadline: Optional[float] = None) -> Dict:
+    """Non-blocking variant of get_current_weather using the pooled async client"""
+    if not upstream_available():
+        return get_mock_weather_data(district, mandal)
+    
+    coords = get_coordinates(district, mandal)
+    if not coords:
+        return get_mock_weather_data(district, mandal)
+    
+    cache_key = get_cache_key(coords, "current")
+    weather_data = await async_get_cached(cache_key)
+    if weather_data is None:
+        deadline = deadline or weather_deadline()
+        weather_data = await WEATHER_FLIGHTS.do_async(
+            cache_key, lambda: async_fetch_current_weather(cache_key, budget_timeout(deadline))
+        )
+    if weather_data is None:
+        weather_data = await async_get_stale(cache_key)
+    if weather_data is None:
+        return get_mock_weather_data(district, mandal)
+    return with_location(weather_data, district, mandal)
+
+async def async_get_weather_forecast(district: str, mandal: str, deadline: Optional[float] = None) -> List[Dict]:
+    """Non-blocking variant of get_weather_forecast using the pooled async client"""
+    if not upstream_available():
+        return get_mock_forecast()
+    
+    coords = get_coordinates(district, mandal)
+    if not coords:
         return []
+    
+    cache_key = get_cache_key(coords, "forecast")
+    forecast_list = await async_get_cached(cache_key)
+    if forecast_list is None:
+        deadline = deadline or weather_deadline()
+        forecast_list = await WEATHER_FLIGHTS.do_async(
+            cache_key, lambda: async_fetch_forecast(cache_key, budget_timeout(deadline))
+        )
+    if forecast_list is None:
+        forecast_list = await async_get_stale(cache_key)
+    return forecast_list if forecast_list is not None else []
+
+async def async_get_weather_bundle(district: str, mandal: str) -> Tuple[Dict, List[Dict]]:
+    """Fetch current weather and forecast for a location concurrently, within one latency budget"""
+    deadline = weather_deadline()
+    return await asyncio.gather(
+        async_get_current_weather(district, mandal, deadline),
+        async_get_weather_forecast(district, mandal, deadline)
+    )
 
 def get_weather_condition(weather_data: Dict) -> str:
     """
@@ -0,0 +1,184 @@
+"""
+Persistent second-tier weather cache.
+Parsed current-weather and forecast payloads are stored per grid cell in a
+small SQLite file with their fetch time, so a restarted or recycled worker
+(and every other uvicorn worker on the host) starts warm instead of calling
+OpenWeatherMap. WAL mode lets workers read while another one writes; rows
+older than the retention window are deleted by a background compactor.
+Cells carry the grid size (weather_service.grid_cell), so rows written under
+another WEATHER_GRID_DEGREES are never read back as a different location.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from metrics import register, Counter
+
+# SQLite file shared by the workers on a host; empty disables the store
+WEATHER_STORE_PATH = os.getenv("WEATHER_STORE_PATH", "./weather_cache.db")
+# Rows are kept this long after their fetch (longer than the cache TTL, so
+# old payloads remain available as last-known-good data)
+WEATHER_STORE_RETENTION = int(os.getenv("WEATHER_STORE_RETENTION", "86400"))
+# Seconds between compactions; 0 disables the background compactor
+WEATHER_STORE_COMPACT_INTERVAL = float(os.getenv("WEATHER_STORE_COMPACT_INTERVAL", "600"))
+
+STORE_ERRORS = register(Counter(
+    "advisory_weather_store_errors_total",
+    "Failed reads and writes of the persistent weather cache",
+    ("operation",)
+))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS weather_payloads (
+    cell TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (cell, kind)
+) WITHOUT ROWID
+"""
+
+
+def encode_cell(cell: Tuple) -> str:
+    return json.dumps(list(cell))
+
+
+def decode_cell(text: str) -> Tuple:
+    return tuple(json.loads(text))
+
+
+class WeatherStore:
+    """SQLite table of (grid cell, kind) -> payload with one connection per thread"""
+
+    def __init__(self, path: str, retention: float = WEATHER_STORE_RETENTION):
+        self.path = path
+        self.retention = retention
+        self._local = threading.local()
+        self.reads = 0
+        self.writes = 0
+        self.compacted = 0
+        self._connection().execute(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: Tuple[Tuple, str]) -> Optional[Tuple[Any, float]]:
+        """(payload, fetched_at epoch seconds) for a (cell, kind) key, or None"""
+        self.reads += 1
+        row = self._connection().execute(
+            "SELECT payload, fetched_at FROM weather_payloads WHERE cell = ? AND kind = ?",
+            (encode_cell(key[0]), key[1])
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def put(self, key: Tuple[Tuple, str], payload: Any, fetched_at: Optional[float] = None) -> None:
+        self.writes += 1
+        self._connection().execute(
+            "INSERT OR REPLACE INTO weather_payloads (cell, kind, payload, fetched_at) VALUES (?, ?, ?, ?)",
+            (encode_cell(key[0]), key[1], json.dumps(payload), time.time() if fetched_at is None else fetched_at)
+        )
+
+    def fresh_entries(self, max_age: float) -> Iterator[Tuple[Tuple[Tuple, str], Any, float]]:
+        """((cell, kind), payload, fetched_at) for rows fetched within max_age seconds"""
+        rows = self._connection().execute(
+            "SELECT cell, kind, payload, fetched_at FROM weather_payloads WHERE fetched_at > ?",
+            (time.time() - max_age,)
+        ).fetchall()
+        for cell, kind, payload, fetched_at in rows:
+            yield (decode_cell(cell), kind), json.loads(payload), fetched_at
+
+    def clear(self) -> None:
+        self._connection().execute("DELETE FROM weather_payloads")
+
+    def compact(self) -> int:
+        """Delete rows older than the retention window; returns the number removed"""
+        removed = self._connection().execute(
+            "DELETE FROM weather_payloads WHERE fetched_at <= ?", (time.time() - self.retention,)
+        ).rowcount
+        self.compacted += removed
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "rows": self._connection().execute("SELECT COUNT(*) FROM weather_payloads").fetchone()[0],
+            "retention_seconds": self.retention,
+            "reads": self.reads,
+            "writes": self.writes,
+            "compacted": self.compacted
+        }
+
+
+_store: Optional[WeatherStore] = None
+_store_opened = False
+_store_lock = threading.Lock()
+
+
+def get_weather_store() -> Optional[WeatherStore]:
+    """
+    The shared store, opened on first use; None (memory-only caching) if
+    WEATHER_STORE_PATH is empty or the file cannot be opened.
+    """
+    global _store, _store_opened
+    if _store_opened:
+        return _store
+    with _store_lock:
+        if not _store_opened:
+            if WEATHER_STORE_PATH:
+                try:
+                    _store = WeatherStore(WEATHER_STORE_PATH)
+                except sqlite3.Error as e:
+                    STORE_ERRORS.inc("open")
+                    print(f"Weather store disabled ({WEATHER_STORE_PATH}): {e}")
+            _store_opened = True
+    return _store
+
+
+class WeatherStoreCompactor:
+    """Background thread that deletes expired rows from the weather store"""
+
+    def __init__(self, interval: float = WEATHER_STORE_COMPACT_INTERVAL):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running or self.interval <= 0 or get_weather_store() is None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="weather-store-compactor", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        if not self.running:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                get_weather_store().compact()
+            except sqlite3.Error as e:
+                STORE_ERRORS.inc("compact")
+                print(f"Error compacting weather store: {e!r}")
+
+
+weather_store_compactor = WeatherStoreCompactor()
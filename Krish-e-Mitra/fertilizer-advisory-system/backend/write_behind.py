@@ -0,0 +1,493 @@
+"""
+Group-commit write-behind for advisory results.
+Field and Recommendation ids are allocated up front from the id_sequences
+table, so a request can queue its rows and return without waiting for a
+commit. A background thread drains the queue and writes each batch in a
+single transaction once it reaches `batch_size` rows or `flush_interval`
+seconds have passed; stop() drains whatever is left at shutdown.
+
+A batch that fails is retried with backoff, then written row by row; rows
+that still fail are appended to a dead-letter file (JSON lines) and can be
+written later with `python -m write_behind replay`.
+
+Rows still queued when the process dies abruptly are lost, so the window is
+bounded by `flush_interval`.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from database import engine, Field, Recommendation, IdSequence, recommendation_summary
+from metrics import register, Counter, Gauge
+
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "256"))
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "0.05"))
+# Retries of a failed batch (backoff doubles from WRITE_BEHIND_RETRY_BACKOFF seconds)
+WRITE_BEHIND_RETRIES = int(os.getenv("WRITE_BEHIND_RETRIES", "3"))
+WRITE_BEHIND_RETRY_BACKOFF = float(os.getenv("WRITE_BEHIND_RETRY_BACKOFF", "0.2"))
+# Rows that could not be written after the retries
+WRITE_BEHIND_DEAD_LETTER_PATH = os.getenv("WRITE_BEHIND_DEAD_LETTER_PATH", "./write_behind_dead_letter.jsonl")
+
+# Ids reserved from the database per round trip; unused ids are simply skipped
+ID_BLOCK_SIZE = 1000
+
+_STOP = object()
+_REFILL = object()
+
+WRITE_FAILURES = register(Counter(
+    "advisory_write_behind_failures_total",
+    "Failed write-behind batch attempts and rows dead-lettered, by outcome",
+    ("outcome",)
+))
+
+
+class IdAllocator:
+    """
+    Hands out primary keys for tables whose rows are written later.
+
+    Blocks of ids are reserved in id_sequences with a single UPDATE, so several
+    processes (API workers, the batch CLI) never hand out the same id. Every
+    writer of fields/recommendations must take its ids from here.
+
+    Once a block is half used, claim_refill() returns True once and refill()
+    (called off the event loop, by the writer thread) reserves the next block
+    as a spare, so allocate() normally never touches the database. When no
+    spare was reserved in time, allocate() reserves in the caller and
+    async_allocate() in a worker thread; the lock is never held across the
+    database round trip.
+    """
+
+    def __init__(self, bind=engine, block_size: int = ID_BLOCK_SIZE):
+        self.bind = bind
+        self.block_size = block_size
+        self._blocks: Dict[str, list] = {}  # table -> [next_id, end_exclusive]
+        self._spares: Dict[str, Tuple[int, int]] = {}
+        self._wanted: Dict[str, Any] = {}  # tables running low on ids
+        self._refill_claimed = False
+        self._lock = threading.Lock()
+        self.sync_reservations = 0
+
+    def try_allocate(self, table, count: int = 1) -> Optional[int]:
+        """First id of `count` consecutive ids for `table` from reserved blocks, or None if they ran out"""
+        name = table.__tablename__
+        with self._lock:
+            block = self._blocks.get(name)
+            if block is None or block[1] - block[0] < count:
+                spare = self._spares.pop(name, None)
+                if spare is None or spare[1] - spare[0] < count:
+                    if spare is not None:
+                        self._spares[name] = spare
+                    self._wanted[name] = table
+                    return None
+                block = self._blocks[name] = list(spare)
+            return self._take(name, table, block, count)
+
+    def allocate(self, table, count: int = 1) -> int:
+        """First id of `count` consecutive ids for `table` (blocking if no spare block was reserved)"""
+        first = self.try_allocate(table, count)
+        if first is None:
+            first = self._allocate_reserved(table, count)
+        return first
+
+    async def async_allocate(self, table, count: int = 1) -> int:
+        """allocate() with any reservation made in a worker thread"""
+        first = self.try_allocate(table, count)
+        if first is None:
+            first = await asyncio.to_thread(self._allocate_reserved, table, count)
+        return first
+
+    def _allocate_reserved(self, table, count: int) -> int:
+        # No spare reserved in time: reserve a block for this call, outside the lock
+        name = table.__tablename__
+        size = max(count, self.block_size)
+        start = self._reserve(table, size)
+        with self._lock:
+            self.sync_reservations += 1
+            block = self._blocks.get(name)
+            if block is not None and block[1] - block[0] >= count:
+                # Another caller installed a block meanwhile; keep ours as the spare
+                if name not in self._spares:
+                    self._spares[name] = (start, start + size)
+                return self._take(name, table, block, count)
+            block = self._blocks[name] = [start, start + size]
+            return self._take(name, table, block, count)
+
+    def _take(self, name: str, table, block: list, count: int) -> int:
+        first = block[0]
+        block[0] += count
+        if name not in self._spares and block[1] - block[0] < self.block_size // 2:
+            self._wanted[name] = table
+        return first
+
+    def claim_refill(self) -> bool:
+        """True once each time a table runs low, for the caller to schedule refill()"""
+        with self._lock:
+            if not self._wanted or self._refill_claimed:
+                return False
+            self._refill_claimed = True
+            return True
+
+    def refill(self, tables=()) -> None:
+        """Reserve spare blocks for tables running low, plus `tables` (blocking; keep off the event loop)"""
+        with self._lock:
+            wanted = dict(self._wanted)
+            self._wanted.clear()
+            self._refill_claimed = False
+        for table in tables:
+            wanted.setdefault(table.__tablename__, table)
+        for name, table in wanted.items():
+            with self._lock:
+                if name in self._spares:
+                    continue
+            start = self._reserve(table, self.block_size)
+            with self._lock:
+                self._spares[name] = (start, start + self.block_size)
+
+    def _reserve(self, table, count: int) -> int:
+        name = table.__tablename__
+        for _ in range(3):
+            try:
+                with self.bind.begin() as conn:
+                    reserved = conn.execute(
+                        update(IdSequence)
+                        .where(IdSequence.name == name)
+                        .values(next_id=IdSequence.next_id + count)
+                    ).rowcount
+                    if reserved:
+                        return conn.scalar(select(IdSequence.next_id).where(IdSequence.name == name)) - count
+
+                    # First reservation: start after the rows already in the table
+                    start = (conn.scalar(select(func.max(table.id))) or 0) + 1
+                    conn.execute(insert(IdSequence).values(name=name, next_id=start + count))
+                    return start
+            except IntegrityError:
+                continue  # another process created the sequence row first
+        raise RuntimeError(f"Could not reserve ids for {name}")
+
+
+ID_ALLOCATOR = IdAllocator()
+
+
+class RecommendationWriter:
+    """Queues Field/Recommendation rows and writes them in batches on a background thread"""
+
+    def __init__(
+        self,
+        batch_size: int = WRITE_BEHIND_BATCH_SIZE,
+        flush_interval: float = WRITE_BEHIND_FLUSH_INTERVAL,
+        bind=engine,
+        allocator: IdAllocator = ID_ALLOCATOR
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.bind = bind
+        self.allocator = allocator
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        # farmer_id -> {recommendation_id: entry} for rows queued but not yet committed
+        self._pending: Dict[Optional[int], Dict[int, tuple]] = {}
+        self._pending_lock = threading.Lock()
+        self.batches = 0
+        self.rows_written = 0
+        self.failed_batches = 0
+        self.dead_lettered = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._thread = threading.Thread(target=self._run, name="recommendation-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 30.0) -> None:
+        """Flush every queued row and stop the writer thread"""
+        if not self.running:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(
+        self,
+        farmer_id: Optional[int],
+        field_values: Dict[str, Any],
+        recommendation_data: Dict[str, Any]
+    ) -> Tuple[int, int]:
+        """
+        Queue a field and its recommendation for writing.
+
+        Args:
+            farmer_id: Owner of both rows
+            field_values: Field columns (location, crop_type, variety, sowing_date, area_sown)
+            recommendation_data: Recommendation payload; must not be mutated afterwards
+
+        Returns:
+            Tuple of (field_id, recommendation_id) the rows will be stored under
+        """
+        field_id = self.allocator.allocate(Field)
+        recommendation_id = self.allocator.allocate(Recommendation)
+        entry = (farmer_id, field_id, recommendation_id, field_values, recommendation_data, datetime.utcnow())
+
+        if not self._enqueue(entry):
+            self._write([entry])  # not started (scripts, tests): write through
+        return field_id, recommendation_id
+
+    async def async_submit(
+        self,
+        farmer_id: Optional[int],
+        field_values: Dict[str, Any],
+        recommendation_data: Dict[str, Any]
+    ) -> Tuple[int, int]:
+        """submit() for request handlers: id reservations and write-through run in worker threads"""
+        field_id = await self.allocator.async_allocate(Field)
+        recommendation_id = await self.allocator.async_allocate(Recommendation)
+        entry = (farmer_id, field_id, recommendation_id, field_values, recommendation_data, datetime.utcnow())
+
+        if not self._enqueue(entry):
+            await asyncio.to_thread(self._write, [entry])
+        return field_id, recommendation_id
+
+    def _enqueue(self, entry: tuple) -> bool:
+        """Queue an entry for the writer thread; False if it is not running (the caller writes it)"""
+        if not self.running:
+            return False
+        farmer_id, recommendation_id = entry[0], entry[2]
+        with self._pending_lock:
+            self._pending.setdefault(farmer_id, {})[recommendation_id] = entry
+        self._queue.put(entry)
+        if self.allocator.claim_refill():
+            self._queue.put(_REFILL)
+        return True
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def pending_for(self, farmer_id: int) -> List[tuple]:
+        """
+        Entries of a farmer queued in this process but not yet committed
+        (farmer_id, field_id, recommendation_id, field_values, data, created_at)
+        """
+        with self._pending_lock:
+            return list(self._pending.get(farmer_id, {}).values())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "pending": self.pending(),
+            "batch_size": self.batch_size,
+            "flush_interval_seconds": self.flush_interval,
+            "batches": self.batches,
+            "rows_written": self.rows_written,
+            "failed_batches": self.failed_batches,
+            "dead_lettered": self.dead_lettered,
+            "dead_letter_path": WRITE_BEHIND_DEAD_LETTER_PATH,
+            "id_sync_reservations": self.allocator.sync_reservations
+        }
+
+    def _refill_ids(self, tables=()) -> None:
+        try:
+            self.allocator.refill(tables)
+        except Exception as e:
+            # allocate() falls back to reserving in the caller
+            print(f"Error reserving ids: {e}")
+
+    def _run(self) -> None:
+        self._refill_ids((Field, Recommendation))
+        stopping = False
+        while not stopping:
+            batch = []
+            refill = False
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            if item is _REFILL:
+                self._refill_ids()
+                continue
+            batch.append(item)
+
+            # Collect until the batch is full or the oldest row has waited flush_interval
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                if item is _REFILL:
+                    refill = True
+                    continue
+                batch.append(item)
+
+            self._write_safely(batch)
+            if refill:
+                self._refill_ids()
+
+        # Drain anything submitted concurrently with stop()
+        leftover = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP and item is not _REFILL:
+                leftover.append(item)
+        for start in range(0, len(leftover), self.batch_size):
+            self._write_safely(leftover[start:start + self.batch_size])
+
+    def _write_safely(self, batch) -> None:
+        """Write a batch, retrying with backoff; rows that keep failing go to the dead-letter file"""
+        delay = WRITE_BEHIND_RETRY_BACKOFF
+        for attempt in range(WRITE_BEHIND_RETRIES + 1):
+            try:
+                self._write(batch)
+                self._forget(batch)
+                return
+            except Exception as e:
+                WRITE_FAILURES.inc("batch_error")
+                print(f"Error writing {len(batch)} recommendations (attempt {attempt + 1}): {e}")
+                if attempt < WRITE_BEHIND_RETRIES:
+                    time.sleep(delay)
+                    delay *= 2
+        self.failed_batches += 1
+
+        # One bad row should not take the whole batch with it
+        failed = []
+        for entry in batch:
+            try:
+                self._write([entry])
+            except Exception as e:
+                print(f"Error writing recommendation {entry[2]}: {e}")
+                failed.append(entry)
+        if failed:
+            self._dead_letter(failed)
+        self._forget(batch)
+
+    def _forget(self, batch) -> None:
+        with self._pending_lock:
+            for entry in batch:
+                entries = self._pending.get(entry[0])
+                if entries is not None:
+                    entries.pop(entry[2], None)
+                    if not entries:
+                        del self._pending[entry[0]]
+
+    def _dead_letter(self, entries) -> None:
+        try:
+            with open(WRITE_BEHIND_DEAD_LETTER_PATH, "a", encoding="utf-8") as f:
+                for entry in entries:
+                    f.write(encode_entry(entry) + "\n")
+        except OSError as e:
+            WRITE_FAILURES.inc("lost", amount=len(entries))
+            print(f"Error writing dead letters, {len(entries)} recommendations lost: {e}")
+            return
+        self.dead_lettered += len(entries)
+        WRITE_FAILURES.inc("dead_lettered", amount=len(entries))
+        print(f"Dead-lettered {len(entries)} recommendations to {WRITE_BEHIND_DEAD_LETTER_PATH}")
+
+    def _write(self, batch) -> None:
+        field_rows = []
+        recommendation_rows = []
+        for farmer_id, field_id, recommendation_id, field_values, data, created_at in batch:
+            field_rows.append(dict(field_values, id=field_id, farmer_id=farmer_id, created_at=created_at))
+            recommendation_rows.append({
+                "id": recommendation_id,
+                "farmer_id": farmer_id,
+                "field_id": field_id,
+                "recommendation_json": json.dumps(data, ensure_ascii=False),
+                "created_at": created_at,
+                **recommendation_summary(data)
+            })
+
+        with self.bind.begin() as conn:
+            conn.execute(insert(Field), field_rows)
+            conn.execute(insert(Recommendation), recommendation_rows)
+        self.batches += 1
+        self.rows_written += len(batch)
+
+
+def encode_entry(entry: tuple) -> str:
+    """One queued entry as a dead-letter JSON line"""
+    farmer_id, field_id, recommendation_id, field_values, data, created_at = entry
+    return json.dumps({
+        "farmer_id": farmer_id,
+        "field_id": field_id,
+        "recommendation_id": recommendation_id,
+        "field": dict(field_values, sowing_date=field_values["sowing_date"].isoformat()),
+        "recommendation": data,
+        "created_at": created_at.isoformat()
+    }, ensure_ascii=False, default=str)
+
+
+def decode_entry(line: str) -> tuple:
+    """Inverse of encode_entry"""
+    item = json.loads(line)
+    field_values = dict(item["field"], sowing_date=datetime.fromisoformat(item["field"]["sowing_date"]))
+    return (
+        item["farmer_id"], item["field_id"], item["recommendation_id"],
+        field_values, item["recommendation"], datetime.fromisoformat(item["created_at"])
+    )
+
+
+def replay_dead_letters(path: str = WRITE_BEHIND_DEAD_LETTER_PATH, bind=engine) -> Tuple[int, int]:
+    """
+    Write dead-lettered rows under their original ids. Rows that fail again
+    (or were written meanwhile) are kept in the file; returns (written, kept).
+    """
+    if not os.path.exists(path):
+        return 0, 0
+    with open(path, encoding="utf-8") as f:
+        lines = [line for line in f if line.strip()]
+
+    writer = RecommendationWriter(bind=bind)
+    kept = []
+    for line in lines:
+        try:
+            writer._write([decode_entry(line)])
+        except Exception as e:
+            print(f"Could not replay dead letter: {e}")
+            kept.append(line)
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(kept)
+    return len(lines) - len(kept), len(kept)
+
+
+recommendation_writer = RecommendationWriter()
+
+register(Gauge(
+    "advisory_write_behind_pending_rows",
+    "Recommendations queued but not yet committed",
+    (),
+    lambda: {(): recommendation_writer.pending()}
+))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write-behind maintenance")
+    parser.add_argument("command", choices=["replay"])
+    parser.add_argument("--path", default=WRITE_BEHIND_DEAD_LETTER_PATH, help="Dead-letter file")
+    args = parser.parse_args()
+
+    written, kept = replay_dead_letters(args.path)
+    print(f"Replayed {written} dead-lettered recommendations, {kept} left in {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 import { useState, useEffect } from 'react';
 import { getTranslation } from '../i18n/translations';
-import { getHistory, getWeather } from '../utils/api';
+import { getHistory, getHistoryDetail, getWeather } from '../utils/api';
 
 export default function Dashboard({ farmer, onNavigate }) {
     const [language, setLanguage] = useState(localStorage.getItem('language') || 'en');
@@ -33,6 +33,15 @@ export default function Dashboard({ farmer, onNavigate }) {
         loadData();
     }, [farmer]);
 
+    const openHistoryItem = async (rec) => {
+        try {
+            const detail = await getHistoryDetail(farmer.mobile, rec.id);
+            onNavigate('results', detail);
+        } catch (err) {
+            console.error('Failed to load recommendation:', err);
+        }
+    };
+
     const handleLogout = () => {
         localStorage.removeItem('farmer');
         window.location.reload();
@@ -165,8 +174,8 @@ export default function Dashboard({ farmer, onNavigate }) {
                             {/* Card Item */}
                             {history.map((rec, index) => (
                                 <div
-                                    key={index}
-                                    onClick={() => onNavigate('results', rec)}
+                                    key={rec.id ?? index}
+                                    onClick={() => openHistoryItem(rec)}
                                     className="group bg-white dark:bg-gray-800 rounded-xl p-5 border border-gray-100 dark:border-gray-700 shadow-sm hover:shadow-xl hover:border-primary-200 dark:hover:border-primary-700 transition-all cursor-pointer relative overflow-hidden"
                                 >
                                     <div className="absolute top-0 right-0 p-3 opacity-10 group-hover:opacity-20 transition-opacity">
@@ -33,6 +33,11 @@ export const getHistory = async (farmerMobile) => {
     return response.data;
 };
 
+export const getHistoryDetail = async (farmerMobile, recommendationId) => {
+    const response = await api.get(`/api/history/${recommendationId}?farmer_mobile=${farmerMobile}`);
+    return response.data;
+};
+
 export const getCrops = async () => {
     const response = await api.get('/api/crops');
     return response.data;